@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import AIJob
 
-# Register your models here.
+
+@admin.register(AIJob)
+class AIJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "endpoint", "status", "requested_by", "created_at", "finished_at")
+    list_filter = ("endpoint", "status")
+    readonly_fields = ("created_at", "finished_at")
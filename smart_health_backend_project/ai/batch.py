@@ -0,0 +1,115 @@
+# ai/batch.py
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .cache import prompt_cache
+from .gemini_utils import FALLBACK_MESSAGES, MODEL_NAME, call_gemini
+
+logger = logging.getLogger("ai")
+
+
+def summary_prompt(medical_history: str) -> str:
+    """Single-item prompt; shared with AIMedicalSummaryView so cache entries are reused."""
+    return f"Generate a professional medical summary: {medical_history}"
+
+
+def _pack_prompt(histories):
+    numbered = "\n".join(
+        f"{i}. {json.dumps(history)}" for i, history in enumerate(histories, start=1)
+    )
+    return (
+        f"Generate a professional medical summary for each of the following "
+        f"{len(histories)} patient medical histories. Respond only with a JSON "
+        f"array of {len(histories)} objects, one per history and in the same order, "
+        f'each of the form {{"id": <number of the history>, "summary": "<summary>"}}.\n'
+        f"{numbered}"
+    )
+
+
+def _parse_pack(text, expected):
+    """
+    Extracts the summaries from a packed answer, or None. Every item must
+    echo its history's number in order, so a reordered or merged answer is
+    rejected instead of handing one patient's summary to another.
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        return None
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(items, list) or len(items) != expected:
+        return None
+
+    summaries = []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or str(item.get("id")) != str(number):
+            return None
+        summary = item.get("summary")
+        if not isinstance(summary, str) or not summary.strip():
+            return None
+        summaries.append(summary.strip())
+    return summaries
+
+
+def _single(history, use_cache):
+    text = call_gemini(summary_prompt(history), use_cache=use_cache)
+    return text, text not in FALLBACK_MESSAGES
+
+
+def _summarize_pack(histories, use_cache):
+    if len(histories) == 1:
+        return [_single(histories[0], use_cache)]
+
+    answer = call_gemini(_pack_prompt(histories), use_cache=use_cache)
+    summaries = None if answer in FALLBACK_MESSAGES else _parse_pack(answer, len(histories))
+
+    if summaries is None:
+        # The model ignored the format (or the call failed): retry item by item
+        logger.info("Packed summary of %s items unusable, falling back to single calls", len(histories))
+        return [_single(history, use_cache) for history in histories]
+
+    # Not copied into the single-item cache: a packed answer is only as
+    # trustworthy as the model's numbering, and the pack prompt is cached as is
+    return [(summary, True) for summary in summaries]
+
+
+def summarize_batch(histories, use_cache=True):
+    """
+    Summarizes many medical histories with as few upstream calls as possible.
+
+    Items already in the prompt cache are answered locally; the rest are
+    packed ``AI_BATCH_PACK_SIZE`` per prompt and the packs run on a pool of
+    ``AI_BATCH_CONCURRENCY`` threads. Returns one ``(text, ok)`` tuple per
+    input, in order, where ``ok`` is False if that item could not be
+    summarized.
+    """
+    use_cache = use_cache and prompt_cache.enabled
+    pack_size = max(1, getattr(settings, "AI_BATCH_PACK_SIZE", 5))
+    concurrency = max(1, getattr(settings, "AI_BATCH_CONCURRENCY", 4))
+
+    results = [None] * len(histories)
+    pending = []
+    for index, history in enumerate(histories):
+        cached = prompt_cache.get(summary_prompt(history), MODEL_NAME) if use_cache else None
+        if cached is not None:
+            results[index] = (cached, True)
+        else:
+            pending.append(index)
+
+    packs = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+    if packs:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(packs))) as pool:
+            answers = pool.map(
+                lambda pack: _summarize_pack([histories[i] for i in pack], use_cache),
+                packs,
+            )
+            for pack, pack_results in zip(packs, answers):
+                for index, result in zip(pack, pack_results):
+                    results[index] = result
+
+    return results
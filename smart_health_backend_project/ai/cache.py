@@ -0,0 +1,142 @@
+# ai/cache.py
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+logger = logging.getLogger("ai")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Collapses whitespace and case so trivially different prompts
+    ("Fever,  Cough" vs "fever, cough") share one cache entry.
+    """
+    return " ".join((prompt or "").split()).casefold()
+
+
+class PromptCache:
+    """
+    Prompt -> response cache for AI calls.
+
+    Entries live in a bounded in-process LRU with a TTL. When a Django cache
+    alias is configured, entries are also written there so other workers can
+    reuse them; the local LRU is always consulted first.
+    """
+
+    KEY_PREFIX = "ai:prompt:"
+
+    def __init__(self, max_size=1024, ttl=3600, backend_alias=None, enabled=True):
+        self.max_size = max(int(max_size), 0)
+        self.ttl = int(ttl)
+        self.backend_alias = backend_alias
+        self.enabled = enabled and self.max_size > 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=getattr(settings, "GEMINI_CACHE_MAX_SIZE", 1024),
+            ttl=getattr(settings, "GEMINI_CACHE_TTL", 3600),
+            backend_alias=getattr(settings, "GEMINI_CACHE_BACKEND", None),
+            enabled=getattr(settings, "GEMINI_CACHE_ENABLED", True),
+        )
+
+    @classmethod
+    def make_key(cls, prompt: str, model: str) -> str:
+        digest = hashlib.sha256(
+            f"{model}\x00{normalize_prompt(prompt)}".encode("utf-8")
+        ).hexdigest()
+        return f"{cls.KEY_PREFIX}{digest}"
+
+    def _backend(self):
+        if not self.backend_alias:
+            return None
+        try:
+            return caches[self.backend_alias]
+        except InvalidCacheBackendError:
+            logger.warning("Unknown GEMINI_CACHE_BACKEND alias '%s'", self.backend_alias)
+            return None
+
+    def get(self, prompt: str, model: str):
+        """Returns the cached response or None."""
+        key = self.make_key(prompt, model)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        backend = self._backend()
+        if backend is not None:
+            try:
+                value = backend.get(key)
+            except Exception:
+                logger.exception("AI cache backend read failed")
+                value = None
+            if value is not None:
+                self._store_local(key, value, now)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, prompt: str, model: str, value: str):
+        key = self.make_key(prompt, model)
+        self._store_local(key, value, time.monotonic())
+
+        backend = self._backend()
+        if backend is not None:
+            try:
+                backend.set(key, value, timeout=self.ttl)
+            except Exception:
+                logger.exception("AI cache backend write failed")
+
+    def _store_local(self, key, value, now):
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+prompt_cache = PromptCache.from_settings()
@@ -0,0 +1,62 @@
+# ai/candidates.py
+import logging
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from doctors.models import Availability, DoctorProfile
+
+logger = logging.getLogger("ai")
+
+
+def _verified_in(location):
+    """Verified doctors whose location matches case-insensitively (uses doctor_location_ci_idx)."""
+    return DoctorProfile.objects.annotate(
+        location_key=Lower("location"),
+    ).filter(location_key=location.strip().lower(), is_verified=True)
+
+
+def select_doctor_candidates(location, specialization=None, limit=None):
+    """
+    Returns at most ``limit`` verified doctors for a recommendation prompt.
+
+    Doctors are narrowed with indexed, case-insensitive lookups on location
+    (and specialization when given) and ranked in the database: doctors with
+    availability today first, then by rating and years of experience. Only
+    if the exact location has no match does it fall back to the old
+    substring search, and a specialization with no match is ignored.
+    """
+    if limit is None:
+        limit = getattr(settings, "AI_DOCTOR_CANDIDATES_TOP_K", 10)
+
+    queryset = _verified_in(location)
+    if not queryset.exists():
+        # Free-text locations ("Kigali, Rwanda") only match by substring
+        queryset = DoctorProfile.objects.filter(location__icontains=location, is_verified=True)
+    if specialization:
+        by_specialization = queryset.annotate(
+            specialization_key=Lower("specialization"),
+        ).filter(specialization_key=specialization.strip().lower())
+        if by_specialization.exists():
+            queryset = by_specialization
+
+    today = timezone.localdate().strftime("%A")
+    queryset = queryset.annotate(
+        available_today=Exists(
+            Availability.objects.filter(doctor=OuterRef("pk"), day_of_week=today)
+        ),
+    ).select_related("user").order_by(
+        "-available_today", "-rating", "-years_of_experience", "pk"
+    )
+    return list(queryset[:limit])
+
+
+def describe_candidate(doctor):
+    """One prompt line per doctor: enough for the model to choose, nothing more."""
+    name = doctor.user.get_full_name() or doctor.user.username
+    return (
+        f"{name} ({doctor.specialization}, {doctor.years_of_experience} yrs, "
+        f"rating {doctor.rating}{', available today' if doctor.available_today else ''})"
+    )
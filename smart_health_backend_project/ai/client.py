@@ -0,0 +1,138 @@
+# ai/client.py
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+from django.conf import settings
+
+logger = logging.getLogger("ai")
+
+# Seconds; also caps each attempt in ai.resilience.CallPolicy
+DEFAULT_READ_TIMEOUT = 60.0
+
+_lock = threading.Lock()
+_clients = {}
+# Async clients are bound to the event loop that owns their connections
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _forget_clients_after_fork():
+    """
+    Drops clients inherited from the parent process without closing them.
+
+    Celery prefork and gunicorn workers fork after the parent may already
+    have opened connections; sharing those sockets across processes corrupts
+    TLS streams, so every child starts with an empty registry.
+    """
+    global _lock
+    _clients.clear()
+    _async_clients.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_clients_after_fork)
+
+
+def _http_client_kwargs():
+    import httpx
+
+    pool_size = getattr(settings, "GEMINI_HTTP_POOL_SIZE", 10)
+    return {
+        "limits": httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=getattr(settings, "GEMINI_HTTP_KEEPALIVE_EXPIRY", 30.0),
+        ),
+        "timeout": httpx.Timeout(
+            getattr(settings, "GEMINI_READ_TIMEOUT", DEFAULT_READ_TIMEOUT),
+            connect=getattr(settings, "GEMINI_CONNECT_TIMEOUT", 5.0),
+        ),
+    }
+
+
+def _http_options(**kwargs):
+    from google.genai import types
+
+    base_url = getattr(settings, "GEMINI_BASE_URL", None)
+    if base_url:
+        kwargs["base_url"] = base_url
+    return types.HttpOptions(**kwargs)
+
+
+def _build_client(api_key):
+    # Lazy import to avoid heavy imports during manage.py commands
+    import httpx
+    import google.genai as genai
+
+    http_options = _http_options(
+        httpx_client=httpx.Client(**_http_client_kwargs()),
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def _build_async_client(api_key):
+    import httpx
+    import google.genai as genai
+
+    http_options = _http_options(
+        httpx_async_client=httpx.AsyncClient(**_http_client_kwargs()),
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def get_client():
+    """
+    Returns the process-wide Gemini client for the configured API key,
+    creating it (and its keep-alive connection pool) on first use.
+    """
+    api_key = getattr(settings, "GEMINI_API_KEY", None)
+    key = (os.getpid(), api_key)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _build_client(api_key)
+            _clients[key] = client
+            logger.info("Created pooled Gemini client for pid %s", os.getpid())
+    return client
+
+
+def get_async_client():
+    """
+    Returns the ``client.aio`` namespace for the running event loop.
+
+    Under ASGI every worker runs a single loop, so this is effectively one
+    pooled async client per worker process.
+    """
+    api_key = getattr(settings, "GEMINI_API_KEY", None)
+    loop = asyncio.get_running_loop()
+
+    per_loop = _async_clients.get(loop)
+    if per_loop is None:
+        per_loop = _async_clients.setdefault(loop, {})
+
+    client = per_loop.get(api_key)
+    if client is None:
+        client = per_loop[api_key] = _build_async_client(api_key)
+        logger.info("Created pooled async Gemini client for pid %s", os.getpid())
+    return client.aio
+
+
+def close_clients():
+    """Closes and forgets every client owned by this process."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            logger.exception("Failed to close Gemini client")
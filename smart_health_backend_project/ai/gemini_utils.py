@@ -1,62 +1,261 @@
 # ai/gemini_utils.py
 import logging
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from .cache import prompt_cache
+from .client import get_async_client, get_client
+from .resilience import CircuitOpenError, counts_as_failure, gemini_policy
+from .singleflight import single_flight
+
 logger = logging.getLogger("ai")
 
 # Default model
 MODEL_NAME = getattr(settings, "GEMINI_MODEL", "gemini-1.5-flash")
 
+# Messages returned instead of model output when a call cannot complete
+NOT_CONFIGURED_MESSAGE = "GEMINI_API_KEY is not configured."
+SDK_MISSING_MESSAGE = "AI service is not available."
+UNAVAILABLE_MESSAGE = "AI service is temporarily unavailable."
+NO_RESPONSE_MESSAGE = "No response generated."
+
+FALLBACK_MESSAGES = frozenset({
+    NOT_CONFIGURED_MESSAGE,
+    SDK_MISSING_MESSAGE,
+    UNAVAILABLE_MESSAGE,
+    NO_RESPONSE_MESSAGE,
+})
+
+
+class GeminiCallError(Exception):
+    """
+    Raised by ``generate_text`` when a call produced no model output. The
+    message is the fallback text ``call_gemini`` returns instead.
+    """
+
+    retryable = False
+
+
+class GeminiUnavailableError(GeminiCallError):
+    """The upstream failed or the circuit breaker is open: worth trying again later."""
+
+    retryable = True
+
+
 # Make sure GEMINI_API_KEY is set (log at import time without importing heavy SDK)
 if not getattr(settings, "GEMINI_API_KEY", None):
     logger.warning("GEMINI_API_KEY is not set. AI features will not work.")
 
 
-def call_gemini(prompt: str) -> str:
+def _request_config(timeout):
+    """Per-attempt config carrying the time left on the call deadline."""
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        http_options=types.HttpOptions(timeout=int(timeout * 1000)),
+    )
+
+
+def _response_text(response):
+    text = getattr(response, "text", None)
+    if text:
+        return text.strip()
+    return None
+
+
+def _generate(prompt: str):
     """
-    Calls Google Gemini API with the provided prompt.
-    Returns the AI-generated text. Performs lazy import of the SDK so management
-    commands and tests don't import large optional dependencies at module import time.
+    Performs the actual SDK round-trip on the pooled client and returns the
+    generated text, or None when the model produced nothing. Raises on
+    SDK/API errors, after the retry policy has given up, or immediately
+    with CircuitOpenError while the breaker is open.
+    """
+    def attempt(timeout):
+        return _response_text(get_client().models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt,
+            config=_request_config(timeout),
+        ))
+
+    return gemini_policy.call(attempt)
+
+
+def _generate_stream(prompt: str):
+    """Yields text chunks from the streaming endpoint as the model emits them."""
+    def attempt(timeout):
+        for chunk in get_client().models.generate_content_stream(
+            model=MODEL_NAME,
+            contents=prompt,
+            config=_request_config(timeout),
+        ):
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
+
+    return gemini_policy.stream(attempt)
+
+
+async def _generate_async(prompt: str):
+    """Async counterpart of ``_generate`` using the per-loop pooled client."""
+    async def attempt(timeout):
+        return _response_text(await get_async_client().models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt,
+            config=_request_config(timeout),
+        ))
+
+    return await gemini_policy.call_async(attempt)
+
+
+def generate_text(prompt: str, use_cache: bool = True) -> str:
+    """
+    Calls Google Gemini API with the provided prompt and returns the
+    AI-generated text. Raises GeminiCallError (GeminiUnavailableError for
+    upstream failures worth retrying) when there is no model output.
+
+    Successful responses are memoized in ``prompt_cache`` keyed on the
+    normalized prompt and model; pass ``use_cache=False`` to bypass it,
+    which also skips sharing the upstream call with identical prompts.
     """
     api_key = getattr(settings, "GEMINI_API_KEY", None)
     if not api_key:
-        return "GEMINI_API_KEY is not configured."
+        raise GeminiCallError(NOT_CONFIGURED_MESSAGE)
+
+    use_cache = use_cache and prompt_cache.enabled
+    if use_cache:
+        cached = prompt_cache.get(prompt, MODEL_NAME)
+        if cached is not None:
+            return cached
 
     try:
-        # Lazy import to avoid heavy imports during manage.py commands
-        import google.genai as genai
-    except Exception:
+        if use_cache:
+            # Concurrent identical prompts share one upstream call
+            text = single_flight.do(
+                prompt_cache.make_key(prompt, MODEL_NAME),
+                lambda: _generate(prompt),
+            )
+        else:
+            text = _generate(prompt)
+    except ImportError as e:
         logger.exception("Failed to import google.genai SDK")
-        return "AI service is not available."
+        raise GeminiCallError(SDK_MISSING_MESSAGE) from e
+    except CircuitOpenError as e:
+        logger.warning("Gemini circuit breaker is open, failing fast")
+        raise GeminiUnavailableError(UNAVAILABLE_MESSAGE) from e
+    except Exception as e:
+        logger.exception("Gemini API failure")
+        # Client errors (400, 403...) fail the same way again
+        error = GeminiUnavailableError if counts_as_failure(e) else GeminiCallError
+        raise error(UNAVAILABLE_MESSAGE) from e
+
+    if text is None:
+        raise GeminiCallError(NO_RESPONSE_MESSAGE)
+
+    if use_cache:
+        prompt_cache.set(prompt, MODEL_NAME, text)
 
+    return text
+
+
+def call_gemini(prompt: str, use_cache: bool = True) -> str:
+    """
+    Calls Google Gemini API with the provided prompt.
+    Returns the AI-generated text, or one of the fallback messages when the
+    call cannot complete. Performs lazy import of the SDK so management
+    commands and tests don't import large optional dependencies at module import time.
+
+    Caching and single-flight work as in ``generate_text``.
+    """
     try:
-        # Create a client
-        client = genai.Client(api_key=api_key)
+        return generate_text(prompt, use_cache=use_cache)
+    except GeminiCallError as e:
+        return str(e)
 
-        # Generate content
-        response = client.generate_text(
-            model=MODEL_NAME,
-            prompt=prompt
-        )
 
-        # Response is now a dict with 'candidates'
-        if response and response.candidates:
-            return response.candidates[0].output_text.strip()
+def stream_gemini(prompt: str, use_cache: bool = True):
+    """
+    Streaming version of ``call_gemini``: yields chunks of the completion as
+    they arrive so callers can forward them before generation finishes.
 
-        return "No response generated."
+    A cached answer is yielded as a single chunk, and a completed stream is
+    written back to the cache. Unlike ``call_gemini``, upstream errors are
+    raised to the caller, which by then may already have sent partial output.
+    """
+    api_key = getattr(settings, "GEMINI_API_KEY", None)
+    if not api_key:
+        yield NOT_CONFIGURED_MESSAGE
+        return
 
-    except Exception:
-        logger.exception("Gemini API failure")
-        return "AI service is temporarily unavailable."
+    use_cache = use_cache and prompt_cache.enabled
+    if use_cache:
+        cached = prompt_cache.get(prompt, MODEL_NAME)
+        if cached is not None:
+            yield cached
+            return
 
+    parts = []
+    for chunk in _generate_stream(prompt):
+        parts.append(chunk)
+        yield chunk
 
+    if not parts:
+        yield NO_RESPONSE_MESSAGE
+        return
 
+    if use_cache:
+        prompt_cache.set(prompt, MODEL_NAME, "".join(parts).strip())
 
 
+async def call_gemini_async(prompt: str, use_cache: bool = True) -> str:
+    """
+    Non-blocking version of ``call_gemini`` for async views.
 
+    Behaves identically (same cache, same fallback messages) but awaits the
+    upstream call, so one ASGI worker can hold many requests in flight.
+    """
+    api_key = getattr(settings, "GEMINI_API_KEY", None)
+    if not api_key:
+        return NOT_CONFIGURED_MESSAGE
 
+    use_cache = use_cache and prompt_cache.enabled
+    # A shared cache backend may do network I/O, keep it off the event loop
+    cache_get = prompt_cache.get
+    cache_set = prompt_cache.set
+    if prompt_cache.backend_alias:
+        cache_get = sync_to_async(cache_get, thread_sensitive=False)
+        cache_set = sync_to_async(cache_set, thread_sensitive=False)
 
+    if use_cache:
+        cached = cache_get(prompt, MODEL_NAME)
+        if prompt_cache.backend_alias:
+            cached = await cached
+        if cached is not None:
+            return cached
 
+    try:
+        if use_cache:
+            text = await single_flight.do_async(
+                prompt_cache.make_key(prompt, MODEL_NAME),
+                lambda: _generate_async(prompt),
+            )
+        else:
+            text = await _generate_async(prompt)
+    except ImportError:
+        logger.exception("Failed to import google.genai SDK")
+        return SDK_MISSING_MESSAGE
+    except CircuitOpenError:
+        logger.warning("Gemini circuit breaker is open, failing fast")
+        return UNAVAILABLE_MESSAGE
+    except Exception:
+        logger.exception("Gemini API failure")
+        return UNAVAILABLE_MESSAGE
 
+    if text is None:
+        return NO_RESPONSE_MESSAGE
 
+    if use_cache:
+        stored = cache_set(prompt, MODEL_NAME, text)
+        if prompt_cache.backend_alias:
+            await stored
 
+    return text
@@ -0,0 +1,17 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsDoctorOrAdmin(BasePermission):
+    """
+    Clinic-wide AI tools (e.g. batch summaries) are limited to doctors and admins.
+    """
+
+    message = "Only doctors and admins can use this AI endpoint."
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(
+            user
+            and user.is_authenticated
+            and (user.is_staff or getattr(user, "role", None) in ("doctor", "admin"))
+        )
@@ -0,0 +1,328 @@
+# ai/resilience.py
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from .client import DEFAULT_READ_TIMEOUT
+
+logger = logging.getLogger("ai")
+
+# HTTP status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the per-call deadline leaves no time for another attempt."""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+
+    CLOSED counts consecutive failures and opens after ``failure_threshold``.
+    OPEN rejects calls until ``recovery_timeout`` seconds have passed, then
+    moves to HALF_OPEN, where up to ``half_open_max_calls`` probe calls are
+    let through: one success closes the breaker, one failure re-opens it.
+    ``allow`` hands out a ticket; a probe that ends without a verdict (a
+    client error, a cancelled call, an abandoned stream) gives its slot
+    back by passing the ticket to ``release``. Calls admitted while CLOSED
+    hold no slot, so releasing their ticket changes nothing.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        # Tells probe tickets of an earlier half-open period from current ones
+        self._half_open_round = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+            self._half_open_round += 1
+
+    def allow(self):
+        """False when the call is rejected, otherwise a truthy ticket for ``release``."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return _ProbeTicket(self._half_open_round)
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def release(self, ticket):
+        """
+        Returns the probe slot ``ticket`` was given; a no-op for calls
+        admitted while CLOSED and once success or failure has moved the
+        state on.
+        """
+        with self._lock:
+            if (
+                isinstance(ticket, _ProbeTicket)
+                and self._state == self.HALF_OPEN
+                and ticket.round == self._half_open_round
+                and self._probes > 0
+            ):
+                self._probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("Gemini circuit breaker opened after %s failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "rejected": self.rejected,
+            }
+
+
+class _ProbeTicket:
+    __slots__ = ("round",)
+
+    def __init__(self, round):
+        self.round = round
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of overall traffic.
+
+    Every first attempt deposits ``ratio`` tokens (up to ``max_tokens``) and
+    every retry spends one, so during an outage retries add at most
+    ``ratio`` extra load instead of multiplying it.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0, initial_tokens=None):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens if initial_tokens is None else initial_tokens
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def record_request(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tokens": round(self._tokens, 2), "exhausted": self.exhausted}
+
+
+def is_retryable(exc) -> bool:
+    """Transport errors, timeouts, 429 and 5xx are retried; other errors are final."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exc, httpx.TransportError)
+
+
+def counts_as_failure(exc) -> bool:
+    """Client mistakes (400, 403, 404...) say nothing about upstream health."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    return True
+
+
+class CallPolicy:
+    """
+    Timeout, retry and circuit-breaker policy for one upstream dependency.
+
+    ``fn`` receives the number of seconds the attempt may take, which is the
+    remaining deadline capped by ``attempt_timeout``.
+    """
+
+    def __init__(self, breaker, budget, deadline=30.0, attempt_timeout=DEFAULT_READ_TIMEOUT,
+                 max_retries=2, backoff_base=0.2, backoff_cap=2.0):
+        self.breaker = breaker
+        self.budget = budget
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            breaker=CircuitBreaker(
+                failure_threshold=getattr(settings, "GEMINI_BREAKER_FAILURE_THRESHOLD", 5),
+                recovery_timeout=getattr(settings, "GEMINI_BREAKER_RECOVERY_TIMEOUT", 30.0),
+                half_open_max_calls=getattr(settings, "GEMINI_BREAKER_HALF_OPEN_CALLS", 1),
+            ),
+            budget=RetryBudget(
+                ratio=getattr(settings, "GEMINI_RETRY_BUDGET_RATIO", 0.2),
+                max_tokens=getattr(settings, "GEMINI_RETRY_BUDGET_MAX", 10.0),
+            ),
+            deadline=getattr(settings, "GEMINI_CALL_DEADLINE", 30.0),
+            attempt_timeout=getattr(settings, "GEMINI_READ_TIMEOUT", DEFAULT_READ_TIMEOUT),
+            max_retries=getattr(settings, "GEMINI_MAX_RETRIES", 2),
+        )
+
+    def backoff(self, attempt) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _next_step(self, exc, attempt, deadline_at, tickets):
+        """
+        Records the failure and returns the delay before retrying, or None
+        to give up. The retry's breaker ticket is added to ``tickets``.
+        """
+        if counts_as_failure(exc):
+            self.breaker.record_failure()
+        if attempt >= self.max_retries or not is_retryable(exc):
+            return None
+
+        delay = self.backoff(attempt)
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        ticket = self.breaker.allow()
+        if not ticket:
+            return None
+        tickets.append(ticket)
+        if not self.budget.try_spend():
+            return None
+        return delay
+
+    def _start(self):
+        """Returns the call's deadline and the breaker tickets it holds."""
+        ticket = self.breaker.allow()
+        if not ticket:
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        self.budget.record_request()
+        return time.monotonic() + self.deadline, [ticket]
+
+    def _release(self, tickets):
+        for ticket in tickets:
+            self.breaker.release(ticket)
+
+    def _attempt_timeout(self, deadline_at):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Gemini call deadline exceeded")
+        return min(remaining, self.attempt_timeout)
+
+    def call(self, fn):
+        deadline_at, tickets = self._start()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = fn(self._attempt_timeout(deadline_at))
+                except Exception as exc:
+                    delay = self._next_step(exc, attempt, deadline_at, tickets)
+                    if delay is None:
+                        raise
+                    logger.info("Retrying Gemini call in %.2fs after %s", delay, exc)
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            self._release(tickets)
+
+    async def call_async(self, coro_fn):
+        deadline_at, tickets = self._start()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = await coro_fn(self._attempt_timeout(deadline_at))
+                except Exception as exc:
+                    delay = self._next_step(exc, attempt, deadline_at, tickets)
+                    if delay is None:
+                        raise
+                    logger.info("Retrying Gemini call in %.2fs after %s", delay, exc)
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            # Also reached when the awaiting task is cancelled
+            self._release(tickets)
+
+    def stream(self, gen_fn):
+        """
+        Guards a streaming call. There are no retries because chunks may
+        already have been forwarded to the client, but the breaker and the
+        deadline still apply.
+        """
+        deadline_at, tickets = self._start()
+        try:
+            yield from gen_fn(self._attempt_timeout(deadline_at))
+        except Exception as exc:
+            if counts_as_failure(exc):
+                self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            # Also reached when the client goes away and the generator is closed
+            self._release(tickets)
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+        }
+
+
+gemini_policy = CallPolicy.from_settings()
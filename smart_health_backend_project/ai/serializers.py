@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from datetime import date
 
 # -----------------------------
@@ -35,6 +36,39 @@ class MedicalSummarySerializer(serializers.Serializer):
         return value
 
 
+# -----------------------------
+# 2b. Batch Medical Summary
+# -----------------------------
+class BatchMedicalSummaryItemSerializer(MedicalSummarySerializer):
+    id = serializers.CharField(
+        max_length=100,
+        required=False,
+        help_text="Optional client reference echoed back in the result (e.g. patient id)."
+    )
+
+
+class BatchMedicalSummarySerializer(serializers.Serializer):
+    items = BatchMedicalSummaryItemSerializer(many=True)
+
+    def validate_items(self, value):
+        limit = getattr(settings, "AI_BATCH_MAX_ITEMS", 50)
+        if not value:
+            raise serializers.ValidationError("At least one item is required.")
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} items per batch.")
+        return value
+
+    class Meta:
+        swagger_schema_fields = {
+            "example": {
+                "items": [
+                    {"id": "12", "medical_history": "Hypertension, on medication."},
+                    {"id": "13", "medical_history": "Type 2 diabetes, insulin since 2020."}
+                ]
+            }
+        }
+
+
 # -----------------------------
 # 3. Doctor Recommendation
 # -----------------------------
@@ -47,8 +81,14 @@ class DoctorRecommendationSerializer(serializers.Serializer):
         max_length=200,
         help_text="City, district or region."
     )
+    specialization = serializers.CharField(
+        max_length=100,
+        required=False,
+        help_text="Optional specialization to narrow the candidate doctors."
+    )
     symptoms.swagger_example = "shortness of breath, chest pain"
     location.swagger_example = "Kigali"
+    specialization.swagger_example = "Cardiology"
 
     def validate_symptoms(self, value):
         value = value.strip()
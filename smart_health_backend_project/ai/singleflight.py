@@ -0,0 +1,188 @@
+# ai/singleflight.py
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger("ai")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight wait and receive the same result or
+    exception. A follower waits at most ``lock_timeout`` seconds and then
+    runs the function itself, and async followers of a cancelled leader
+    start over instead of being cancelled with it. With ``distributed=True`` the leader also takes a lock in the
+    Django cache so workers in other processes wait for its result instead
+    of issuing their own upstream call.
+    """
+
+    LOCK_PREFIX = "ai:inflight:"
+    RESULT_PREFIX = "ai:inflight-result:"
+
+    def __init__(self, enabled=True, distributed=False, backend_alias="default",
+                 lock_timeout=60, poll_interval=0.05):
+        self.enabled = enabled
+        self.distributed = distributed
+        self.backend_alias = backend_alias
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.coalesced = 0
+        self.remote_coalesced = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            enabled=getattr(settings, "GEMINI_SINGLEFLIGHT_ENABLED", True),
+            distributed=getattr(settings, "GEMINI_SINGLEFLIGHT_DISTRIBUTED", False),
+            backend_alias=getattr(settings, "GEMINI_SINGLEFLIGHT_BACKEND", "default"),
+            lock_timeout=getattr(settings, "GEMINI_SINGLEFLIGHT_LOCK_TIMEOUT", 60),
+        )
+
+    def do(self, key, fn):
+        """Runs ``fn()`` once per in-flight ``key`` and shares its outcome."""
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.event.wait(self.lock_timeout):
+                logger.info("Single-flight leader for %s is still running, calling upstream directly", key)
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_leader(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key, coro_fn):
+        """
+        Event-loop counterpart of ``do`` for ``call_gemini_async``.
+        Coalesces within the running loop only.
+        """
+        if not self.enabled:
+            return await coro_fn()
+
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+
+        future = calls.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.lock_timeout)
+            except asyncio.TimeoutError:
+                logger.info("Single-flight leader for %s is still running, calling upstream directly", key)
+                return await coro_fn()
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # The leader was cancelled, not us: take over the call
+            return await self.do_async(key, coro_fn)
+
+        future = calls[key] = loop.create_future()
+        # Avoid "exception was never retrieved" when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        with self._lock:
+            self.leaders += 1
+
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            calls.pop(key, None)
+
+    def _run_leader(self, key, fn):
+        if not self.distributed:
+            return fn()
+
+        cache = caches[self.backend_alias]
+        lock_key = f"{self.LOCK_PREFIX}{key}"
+        result_key = f"{self.RESULT_PREFIX}{key}"
+
+        if cache.add(lock_key, uuid.uuid4().hex, timeout=self.lock_timeout):
+            try:
+                result = fn()
+                if result is not None:
+                    cache.set(result_key, result, timeout=self.lock_timeout)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker owns this prompt: wait for it to publish the result
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            result = cache.get(result_key)
+            if result is not None:
+                with self._lock:
+                    self.remote_coalesced += 1
+                return result
+            if cache.get(lock_key) is None:
+                break
+            time.sleep(self.poll_interval)
+
+        logger.info("Single-flight owner for %s went away, calling upstream directly", key)
+        return fn()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "distributed": self.distributed,
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "remote_coalesced": self.remote_coalesced,
+            }
+
+
+single_flight = SingleFlight.from_settings()
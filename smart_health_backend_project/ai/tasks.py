@@ -0,0 +1,64 @@
+# ai/tasks.py
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from .gemini_utils import GeminiCallError, generate_text
+from .models import AIJob
+
+logger = logging.getLogger("ai")
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def run_ai_job_task(self, job_id):
+    """
+    Runs the prompt stored on an AIJob and records the outcome on the job.
+    Completed or failed jobs are left untouched, so redelivery is harmless.
+
+    An unavailable upstream (GeminiUnavailableError) is retried, any other
+    failure fails the job with the fallback text ``call_gemini`` would
+    have answered. The prompt is cleared once the job has finished.
+    """
+    try:
+        job = AIJob.objects.get(id=job_id)
+    except AIJob.DoesNotExist:
+        logger.error(f"AI job {job_id} does not exist.")
+        return f"AI job {job_id} not found."
+
+    if job.status in (AIJob.STATUS_COMPLETED, AIJob.STATUS_FAILED):
+        return f"AI job {job_id} already {job.status}."
+
+    job.status = AIJob.STATUS_RUNNING
+    job.save(update_fields=["status"])
+
+    try:
+        job.result = generate_text(job.prompt, use_cache=job.use_cache)
+        job.status = AIJob.STATUS_COMPLETED
+    except Exception as e:
+        retryable = isinstance(e, GeminiCallError) and e.retryable
+        if retryable and not self.request.called_directly and self.request.retries < self.max_retries:
+            logger.warning(f"AI job {job_id} retrying: {e}")
+            raise self.retry(exc=e)
+        logger.exception(f"AI job {job_id} failed")
+        job.error = str(e)
+        job.status = AIJob.STATUS_FAILED
+
+    job.prompt = ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["prompt", "result", "error", "status", "finished_at"])
+    return f"AI job {job_id} {job.status}."
+
+
+@shared_task
+def purge_ai_jobs_task():
+    """
+    Celery beat entry point: deletes jobs created more than
+    ``AI_JOB_RETENTION_DAYS`` ago. Their results hold patient health data.
+    """
+    cutoff = timezone.now() - timedelta(days=getattr(settings, "AI_JOB_RETENTION_DAYS", 7))
+    deleted, _ = AIJob.objects.filter(created_at__lt=cutoff).delete()
+    logger.info(f"Purged {deleted} AI jobs")
+    return deleted
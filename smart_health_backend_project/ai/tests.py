@@ -1,14 +1,40 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import time as dt_time, timedelta
+
+from celery.exceptions import Retry
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
-from doctors.models import DoctorProfile
+from doctors.models import Availability, DoctorProfile
+from . import client as client_registry
+from .batch import summarize_batch, summary_prompt
+from .cache import PromptCache, prompt_cache
+from .candidates import select_doctor_candidates
+from .gemini_utils import MODEL_NAME, call_gemini, call_gemini_async, stream_gemini
+from .models import AIJob
+from .resilience import CallPolicy, CircuitBreaker, CircuitOpenError, RetryBudget
+from .singleflight import SingleFlight
+from .tasks import purge_ai_jobs_task, run_ai_job_task
+from .triage import SymptomIndex
 
 User = get_user_model()
 
 
+class UpstreamError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
 class AITestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", password="password", email="test@example.com")
@@ -67,3 +93,665 @@ class AITestCase(APITestCase):
         self.assertEqual(data["status"], "error")
         self.assertEqual(data["data"], [])
 
+
+
+class PromptCacheTests(SimpleTestCase):
+    def test_normalized_prompts_share_an_entry(self):
+        cache = PromptCache(max_size=10, ttl=60)
+        cache.set("Fever,   Cough", "gemini", "answer")
+        self.assertEqual(cache.get("  fever, cough ", "gemini"), "answer")
+        self.assertIsNone(cache.get("fever, cough", "other-model"))
+
+    def test_lru_eviction_respects_max_size(self):
+        cache = PromptCache(max_size=2, ttl=60)
+        cache.set("a", "m", "1")
+        cache.set("b", "m", "2")
+        cache.get("a", "m")
+        cache.set("c", "m", "3")
+
+        self.assertEqual(cache.get("a", "m"), "1")
+        self.assertIsNone(cache.get("b", "m"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = PromptCache(max_size=10, ttl=5)
+        with patch("ai.cache.time.monotonic", return_value=100.0):
+            cache.set("a", "m", "1")
+        with patch("ai.cache.time.monotonic", return_value=106.0):
+            self.assertIsNone(cache.get("a", "m"))
+
+    def test_backend_alias_shares_entries_between_instances(self):
+        first = PromptCache(max_size=10, ttl=60, backend_alias="default")
+        second = PromptCache(max_size=10, ttl=60, backend_alias="default")
+        first.set("shared prompt", "m", "shared")
+        self.assertEqual(second.get("shared prompt", "m"), "shared")
+
+
+@override_settings(GEMINI_API_KEY="test-key")
+class CallGeminiCacheTests(SimpleTestCase):
+    def setUp(self):
+        prompt_cache.clear()
+
+    @patch("ai.gemini_utils._generate", return_value="cached answer")
+    def test_identical_prompts_hit_the_cache(self, mock_generate):
+        self.assertEqual(call_gemini("chest pain"), "cached answer")
+        self.assertEqual(call_gemini("Chest  pain"), "cached answer")
+        mock_generate.assert_called_once()
+        self.assertEqual(prompt_cache.stats()["hits"], 1)
+
+    @patch("ai.gemini_utils._generate", return_value="fresh answer")
+    def test_use_cache_false_bypasses_the_cache(self, mock_generate):
+        call_gemini("chest pain", use_cache=False)
+        call_gemini("chest pain", use_cache=False)
+        self.assertEqual(mock_generate.call_count, 2)
+
+    @patch("ai.gemini_utils._generate", return_value="fresh answer")
+    def test_use_cache_false_skips_single_flight(self, mock_generate):
+        with patch("ai.gemini_utils.single_flight.do") as mock_do:
+            self.assertEqual(call_gemini("chest pain", use_cache=False), "fresh answer")
+        mock_do.assert_not_called()
+
+    @patch("ai.gemini_utils._generate", side_effect=RuntimeError("boom"))
+    def test_failures_are_not_cached(self, mock_generate):
+        self.assertEqual(call_gemini("chest pain"), "AI service is temporarily unavailable.")
+        call_gemini("chest pain")
+        self.assertEqual(mock_generate.call_count, 2)
+
+
+@override_settings(GEMINI_API_KEY="test-key")
+class GeminiClientRegistryTests(SimpleTestCase):
+    def setUp(self):
+        client_registry._clients.clear()
+        self.addCleanup(client_registry._clients.clear)
+
+    @patch("ai.client._build_client", side_effect=lambda api_key: object())
+    def test_client_is_reused_across_calls(self, mock_build):
+        self.assertIs(client_registry.get_client(), client_registry.get_client())
+        mock_build.assert_called_once_with("test-key")
+
+    @patch("ai.client._build_client", side_effect=lambda api_key: object())
+    def test_new_client_after_fork_or_key_change(self, mock_build):
+        first = client_registry.get_client()
+
+        client_registry._forget_clients_after_fork()
+        self.assertIsNot(client_registry.get_client(), first)
+
+        with override_settings(GEMINI_API_KEY="other-key"):
+            client_registry.get_client()
+        self.assertEqual(mock_build.call_count, 3)
+
+    def test_pool_limits_come_from_settings(self):
+        with override_settings(GEMINI_HTTP_POOL_SIZE=3, GEMINI_CONNECT_TIMEOUT=1.5):
+            kwargs = client_registry._http_client_kwargs()
+        self.assertEqual(kwargs["limits"].max_connections, 3)
+        self.assertEqual(kwargs["timeout"].connect, 1.5)
+
+
+class AsyncAIViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="asyncuser", password="password", email="async@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    @patch("ai.views.call_gemini_async", new_callable=AsyncMock)
+    def test_async_symptom_checker_returns_analysis(self, mock_call):
+        mock_call.return_value = "Async analysis"
+
+        resp = self.client.post("/api/v1/async/symptoms/checker/", {"symptoms": "headache"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()["data"]["analysis"], "Async analysis")
+        mock_call.assert_awaited_once()
+
+    def test_async_view_keeps_drf_validation_and_auth(self):
+        resp = self.client.post("/api/v1/async/medical/summary/", {"medical_history": "  "}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=None)
+        resp = self.client.post("/api/v1/async/medical/summary/", {"medical_history": "x"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_doctor_recommendation_no_doctors_returns_404(self):
+        payload = {"symptoms": "sore throat", "location": "NowhereTown"}
+        resp = self.client.post("/api/v1/async/doctors/recommendation/", payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(resp.json()["status"], "error")
+
+
+@override_settings(GEMINI_API_KEY="test-key")
+class CallGeminiAsyncTests(SimpleTestCase):
+    def setUp(self):
+        prompt_cache.clear()
+
+    @patch("ai.gemini_utils._generate_async", new_callable=AsyncMock, return_value="async answer")
+    def test_shares_the_prompt_cache(self, mock_generate):
+        self.assertEqual(asyncio.run(call_gemini_async("cough")), "async answer")
+        self.assertEqual(asyncio.run(call_gemini_async("Cough")), "async answer")
+        mock_generate.assert_awaited_once()
+
+
+class AIStreamingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="streamuser", password="password", email="stream@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    def read_events(self, resp):
+        body = b"".join(resp.streaming_content).decode("utf-8")
+        events = []
+        for block in body.strip().split("\n\n"):
+            name, data = block.split("\n")
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+        return events
+
+    @patch("ai.views.stream_gemini")
+    def test_symptom_checker_streams_tokens_then_envelope(self, mock_stream):
+        mock_stream.return_value = iter(["Possible ", "migraine."])
+
+        resp = self.client.post("/api/v1/symptoms/checker/?stream=1", {"symptoms": "headache"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+
+        events = self.read_events(resp)
+        self.assertEqual(events[:2], [("token", {"text": "Possible "}), ("token", {"text": "migraine."})])
+        self.assertEqual(events[-1], ("done", {
+            "status": "success",
+            "message": "Symptom analysis completed.",
+            "data": {"analysis": "Possible migraine."},
+        }))
+
+    @patch("ai.views.stream_gemini")
+    def test_upstream_failure_ends_with_error_envelope(self, mock_stream):
+        def failing(prompt, use_cache=True):
+            yield "Partial"
+            raise RuntimeError("connection reset")
+        mock_stream.side_effect = failing
+
+        resp = self.client.post("/api/v1/medical/summary/?stream=true", {"medical_history": "fever"}, format="json")
+        name, envelope = self.read_events(resp)[-1]
+        self.assertEqual(name, "done")
+        self.assertEqual(envelope["status"], "error")
+        self.assertEqual(envelope["data"], {"summary": "Partial"})
+
+
+@override_settings(GEMINI_API_KEY="test-key")
+class StreamGeminiTests(SimpleTestCase):
+    def setUp(self):
+        prompt_cache.clear()
+
+    @patch("ai.gemini_utils._generate_stream", return_value=iter(["a", "b"]))
+    def test_completed_stream_is_cached(self, mock_stream):
+        self.assertEqual(list(stream_gemini("rash")), ["a", "b"])
+        self.assertEqual(list(stream_gemini("rash")), ["ab"])
+        mock_stream.assert_called_once()
+
+
+class AIJobTests(APITestCase):
+    def setUp(self):
+        # DRF throttle counters live in the default cache
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        self.user = User.objects.create_user(username="jobuser", password="password", email="job@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    @patch("ai.tasks.generate_text", return_value="Queued analysis")
+    @patch("ai.views.run_ai_job_task.delay", side_effect=ConnectionError("broker down"))
+    def test_job_mode_falls_back_to_inline_run_and_is_pollable(self, mock_delay, mock_call):
+        resp = self.client.post("/api/v1/symptoms/checker/?mode=job", {"symptoms": "fever"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        job_id = resp.json()["data"]["job_id"]
+        self.assertEqual(resp.json()["data"]["job_status"], AIJob.STATUS_COMPLETED)
+
+        resp = self.client.get(f"/api/v1/jobs/{job_id}/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.json()
+        self.assertEqual(data["message"], "Symptom analysis completed.")
+        self.assertEqual(data["data"]["result"], {"analysis": "Queued analysis"})
+
+    @patch("ai.gemini_utils._generate", side_effect=UpstreamError(503))
+    @patch("ai.views.run_ai_job_task.delay", side_effect=ConnectionError("broker down"))
+    @override_settings(GEMINI_API_KEY="test-key")
+    def test_upstream_failure_fails_the_job(self, mock_delay, mock_call):
+        resp = self.client.post("/api/v1/symptoms/checker/?mode=job", {"symptoms": "fever"}, format="json")
+        job = AIJob.objects.get(id=resp.json()["data"]["job_id"])
+
+        self.assertEqual(job.status, AIJob.STATUS_FAILED)
+        self.assertEqual(job.error, "AI service is temporarily unavailable.")
+        self.assertEqual(job.result, "")
+        self.assertEqual(job.prompt, "")
+
+    @override_settings(GEMINI_API_KEY="test-key")
+    def test_only_upstream_failures_are_retried(self):
+        job = AIJob.objects.create(endpoint="symptoms", prompt="fever", result_key="analysis", use_cache=False)
+        task = run_ai_job_task
+        with patch.object(task, "retry", side_effect=Retry()) as mock_retry, \
+                patch("ai.gemini_utils._generate", side_effect=TimeoutError("read timed out")):
+            task.push_request(retries=0, called_directly=False)
+            self.addCleanup(task.pop_request)
+            with self.assertRaises(Retry):
+                task.run(job.id)
+        mock_retry.assert_called_once()
+
+        # A client error fails the same way on every try
+        with patch("ai.gemini_utils._generate", side_effect=UpstreamError(400)):
+            task.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AIJob.STATUS_FAILED)
+        self.assertEqual(job.error, "AI service is temporarily unavailable.")
+
+    def test_old_jobs_are_purged(self):
+        old = AIJob.objects.create(endpoint="symptoms", prompt="fever", result_key="analysis")
+        AIJob.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=8))
+        recent = AIJob.objects.create(endpoint="symptoms", prompt="cough", result_key="analysis")
+
+        self.assertEqual(purge_ai_jobs_task(), 1)
+        self.assertEqual(list(AIJob.objects.values_list("pk", flat=True)), [recent.pk])
+
+    @patch("ai.views.run_ai_job_task.delay")
+    def test_enqueued_job_is_pending_and_private(self, mock_delay):
+        resp = self.client.post("/api/v1/medical/summary/?mode=job", {"medical_history": "asthma"}, format="json")
+        job_id = resp.json()["data"]["job_id"]
+        mock_delay.assert_called_once_with(job_id)
+
+        resp = self.client.get(f"/api/v1/jobs/{job_id}/")
+        self.assertEqual(resp.json()["data"]["job_status"], AIJob.STATUS_PENDING)
+        self.assertIsNone(resp.json()["data"]["result"])
+
+        other = User.objects.create_user(username="other", password="password", email="other@example.com")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f"/api/v1/jobs/{job_id}/").status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(GEMINI_API_KEY="test-key", AI_BATCH_PACK_SIZE=2, AI_BATCH_CONCURRENCY=2)
+class BatchSummaryTests(APITestCase):
+    def setUp(self):
+        prompt_cache.clear()
+        self.addCleanup(prompt_cache.clear)
+        # DRF throttle counters live in the default cache
+        caches["default"].clear()
+        self.doctor = User.objects.create_user(
+            username="batchdoc", password="password", email="batchdoc@example.com", role="doctor"
+        )
+        self.client.force_authenticate(user=self.doctor)
+
+    @patch("ai.gemini_utils._generate")
+    def test_packs_uncached_items_and_reuses_cache(self, mock_generate):
+        prompt_cache.set(summary_prompt("asthma"), MODEL_NAME, "Cached asthma summary")
+        mock_generate.return_value = (
+            '```json\n[{"id": 1, "summary": "Summary A"}, {"id": 2, "summary": "Summary B"}]\n```'
+        )
+
+        outcomes = summarize_batch(["asthma", "diabetes", "hypertension"])
+
+        self.assertEqual(mock_generate.call_count, 1)
+        self.assertEqual(outcomes, [
+            ("Cached asthma summary", True), ("Summary A", True), ("Summary B", True),
+        ])
+        # Packed answers never feed the single-item cache
+        self.assertIsNone(prompt_cache.get(summary_prompt("diabetes"), MODEL_NAME))
+
+    @patch("ai.gemini_utils._generate")
+    def test_reordered_pack_is_rejected(self, mock_generate):
+        mock_generate.side_effect = lambda prompt: (
+            '[{"id": 2, "summary": "B"}, {"id": 1, "summary": "A"}]'
+            if "each of the following" in prompt else f"single: {prompt[-4:]}"
+        )
+
+        outcomes = summarize_batch(["flu1", "flu2"])
+
+        self.assertEqual(outcomes, [("single: flu1", True), ("single: flu2", True)])
+
+    @patch("ai.gemini_utils._generate")
+    def test_unparseable_pack_falls_back_to_single_calls(self, mock_generate):
+        mock_generate.side_effect = lambda prompt: (
+            "not json" if "each of the following" in prompt else f"single: {prompt[-4:]}"
+        )
+
+        outcomes = summarize_batch(["flu1", "flu2"])
+
+        self.assertEqual(mock_generate.call_count, 3)
+        self.assertEqual(outcomes, [("single: flu1", True), ("single: flu2", True)])
+
+    @patch("ai.views.summarize_batch")
+    def test_endpoint_reports_partial_failures(self, mock_batch):
+        mock_batch.return_value = [("Summary", True), ("AI service is temporarily unavailable.", False)]
+        payload = {"items": [{"id": "p1", "medical_history": "asthma"}, {"medical_history": "flu"}]}
+
+        resp = self.client.post("/api/v1/medical/summary/batch/", payload, format="json")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.json()
+        self.assertEqual(data["status"], "partial")
+        self.assertEqual(data["data"]["succeeded"], 1)
+        self.assertEqual(data["data"]["results"][0], {"index": 0, "id": "p1", "status": "success", "summary": "Summary"})
+        self.assertEqual(data["data"]["results"][1]["status"], "error")
+
+    def test_endpoint_limits_batch_size_and_role(self):
+        with self.settings(AI_BATCH_MAX_ITEMS=1):
+            payload = {"items": [{"medical_history": "a"}, {"medical_history": "b"}]}
+            resp = self.client.post("/api/v1/medical/summary/batch/", payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        patient = User.objects.create_user(username="batchpatient", password="password", email="bp@example.com")
+        self.client.force_authenticate(user=patient)
+        resp = self.client.post("/api/v1/medical/summary/batch/", {"items": [{"medical_history": "a"}]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DoctorCandidateTests(APITestCase):
+    def make_doctor(self, username, **profile):
+        user = User.objects.create_user(username=username, password="password", email=f"{username}@example.com", role="doctor")
+        defaults = {"specialization": "General", "location": "Kigali", "is_verified": True}
+        defaults.update(profile)
+        doctor, _ = DoctorProfile.objects.update_or_create(user=user, defaults=defaults)
+        return doctor
+
+    def test_ranks_by_availability_rating_and_experience(self):
+        veteran = self.make_doctor("veteran", rating=4.0, years_of_experience=30)
+        top_rated = self.make_doctor("toprated", rating=4.9, years_of_experience=2)
+        available = self.make_doctor("available", rating=3.0, years_of_experience=1)
+        self.make_doctor("unverified", rating=5.0, is_verified=False)
+        self.make_doctor("elsewhere", rating=5.0, location="Musanze")
+        Availability.objects.create(
+            doctor=available, day_of_week=timezone.localdate().strftime("%A"),
+            start_time=dt_time(9), end_time=dt_time(17),
+        )
+
+        self.assertEqual(select_doctor_candidates("kigali", limit=10), [available, top_rated, veteran])
+        self.assertEqual(select_doctor_candidates("KIGALI", limit=2), [available, top_rated])
+
+    def test_specialization_narrows_and_location_falls_back_to_substring(self):
+        cardiologist = self.make_doctor("cardio", specialization="Cardiology", location="Kigali, Rwanda")
+        self.make_doctor("gp", location="Kigali, Rwanda", rating=5.0)
+
+        self.assertEqual(select_doctor_candidates("Kigali", "cardiology"), [cardiologist])
+        self.assertEqual(len(select_doctor_candidates("Kigali", "Dermatology")), 2)
+
+
+class SymptomIndexTests(SimpleTestCase):
+    def test_specific_symptoms_are_confident(self):
+        result = SymptomIndex().match("Sudden CHEST PAIN and palpitations since morning")
+        self.assertTrue(result.confident)
+        self.assertTrue(result.urgent)
+        self.assertEqual(result.specialization, "Cardiology")
+        self.assertEqual(result.matched, ["chest pain", "palpitations"])
+
+    def test_vague_mixed_or_negated_symptoms_are_left_to_the_model(self):
+        index = SymptomIndex()
+        self.assertFalse(index.match("headache").confident)
+        self.assertFalse(index.match("rash and chest pain").confident)
+        self.assertEqual(index.match("no chest pain, just a headache").matched, ["headache"])
+        self.assertEqual(index.match("something unusual").scores, {})
+
+
+class LocalTriageViewTests(APITestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user(username="triageuser", password="password", email="triage@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    @patch("ai.views.call_gemini")
+    def test_symptom_checker_answers_locally(self, mock_call):
+        resp = self.client.post("/api/v1/symptoms/checker/", {"symptoms": "itchy skin rash"}, format="json")
+
+        mock_call.assert_not_called()
+        data = resp.json()["data"]
+        self.assertEqual(data["source"], "local")
+        self.assertEqual(data["triage"]["specializations"][0]["name"], "Dermatology")
+        self.assertIn("Dermatology", data["analysis"])
+
+    @patch("ai.views.call_gemini")
+    def test_recommendation_narrows_to_matched_specialization(self, mock_call):
+        for username, specialization in (("derm", "Dermatology"), ("gp", "General")):
+            user = User.objects.create_user(username=username, password="password", email=f"{username}@example.com", role="doctor")
+            DoctorProfile.objects.update_or_create(user=user, defaults={
+                "specialization": specialization, "location": "Huye", "is_verified": True,
+            })
+
+        resp = self.client.post("/api/v1/doctors/recommendation/", {"symptoms": "eczema", "location": "Huye"}, format="json")
+
+        mock_call.assert_not_called()
+        recommendation = resp.json()["data"]["recommendation"]
+        self.assertIn("derm (Dermatology", recommendation)
+        self.assertNotIn("gp (", recommendation)
+
+    @override_settings(AI_LOCAL_TRIAGE_ENABLED=False)
+    @patch("ai.views.call_gemini", return_value="Model analysis")
+    def test_disabled_index_always_calls_model(self, mock_call):
+        resp = self.client.post("/api/v1/symptoms/checker/", {"symptoms": "itchy skin rash"}, format="json")
+        self.assertEqual(resp.json()["data"], {"analysis": "Model analysis"})
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "shared"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        leader.start()
+        started.wait(5)
+
+        followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(3)]
+        for t in followers:
+            t.start()
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.01)
+        release.set()
+        for t in [leader, *followers]:
+            t.join(5)
+
+        self.assertEqual(results, ["shared"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()["leaders"], 1)
+
+    def test_leader_errors_propagate_and_key_is_released(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do("k", lambda: (_ for _ in ()).throw(ValueError("bad")))
+        self.assertEqual(flight.do("k", lambda: "retry"), "retry")
+
+    def test_distributed_follower_reads_result_from_cache(self):
+        flight = SingleFlight(distributed=True, lock_timeout=2, poll_interval=0.01)
+        backend = caches["default"]
+        backend.add(f"{SingleFlight.LOCK_PREFIX}k", "other-worker")
+        backend.set(f"{SingleFlight.RESULT_PREFIX}k", "from other worker")
+        self.addCleanup(backend.clear)
+
+        self.assertEqual(flight.do("k", lambda: "local"), "from other worker")
+        self.assertEqual(flight.stats()["remote_coalesced"], 1)
+
+    def test_async_calls_are_coalesced(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "shared"
+
+        async def burst():
+            return await asyncio.gather(*(flight.do_async("k", fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(burst()), ["shared"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()["coalesced"], 4)
+
+    def test_follower_stops_waiting_after_lock_timeout(self):
+        flight = SingleFlight(lock_timeout=0.05)
+        started = threading.Event()
+        release = threading.Event()
+
+        def stuck():
+            started.set()
+            release.wait(5)
+            return "late"
+
+        leader = threading.Thread(target=lambda: flight.do("k", stuck))
+        leader.start()
+        self.addCleanup(leader.join, 5)
+        self.addCleanup(release.set)
+        started.wait(5)
+
+        self.assertEqual(flight.do("k", lambda: "own call"), "own call")
+        self.assertEqual(flight.stats()["coalesced"], 1)
+
+    def test_async_followers_take_over_from_a_cancelled_leader(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "shared"
+
+        async def burst():
+            leader = asyncio.ensure_future(flight.do_async("k", fetch))
+            await asyncio.sleep(0)
+            followers = [asyncio.ensure_future(flight.do_async("k", fetch)) for _ in range(3)]
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await asyncio.gather(*followers)
+
+        self.assertEqual(asyncio.run(burst()), ["shared"] * 3)
+        self.assertEqual(len(calls), 2)
+
+
+class CallPolicyTests(SimpleTestCase):
+    def make_policy(self, **kwargs):
+        defaults = dict(
+            breaker=CircuitBreaker(failure_threshold=2, recovery_timeout=60),
+            budget=RetryBudget(ratio=0.5, max_tokens=5),
+            deadline=5,
+            attempt_timeout=2,
+            max_retries=2,
+            backoff_base=0,
+        )
+        defaults.update(kwargs)
+        return CallPolicy(**defaults)
+
+    def test_retries_transient_errors_then_succeeds(self):
+        policy = self.make_policy()
+        outcomes = [UpstreamError(503), "ok"]
+
+        def attempt(timeout):
+            self.assertLessEqual(timeout, 2)
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(policy.call(attempt), "ok")
+        self.assertEqual(policy.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_client_errors_are_not_retried_and_do_not_trip_breaker(self):
+        policy = self.make_policy()
+        calls = []
+
+        def attempt(timeout):
+            calls.append(timeout)
+            raise UpstreamError(400)
+
+        with self.assertRaises(UpstreamError):
+            policy.call(attempt)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(policy.breaker.stats()["consecutive_failures"], 0)
+
+    def test_open_breaker_fails_fast_then_half_open_probe_closes_it(self):
+        policy = self.make_policy(max_retries=0)
+
+        def failing(timeout):
+            raise UpstreamError(503)
+
+        for _ in range(2):
+            with self.assertRaises(UpstreamError):
+                policy.call(failing)
+        self.assertEqual(policy.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            policy.call(lambda timeout: self.fail("upstream must not be called"))
+
+        policy.breaker._opened_at -= 61
+        self.assertEqual(policy.call(lambda timeout: "recovered"), "recovered")
+        self.assertEqual(policy.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_ending_without_verdict_frees_its_slot(self):
+        policy = self.make_policy(max_retries=0)
+        policy.breaker.record_failure()
+        policy.breaker.record_failure()
+        policy.breaker._opened_at -= 61
+
+        def bad_request(timeout):
+            raise UpstreamError(400)
+
+        with self.assertRaises(UpstreamError):
+            policy.call(bad_request)
+        self.assertEqual(policy.breaker.state, CircuitBreaker.HALF_OPEN)
+
+        # An abandoned stream does not hold the slot either
+        stream = policy.stream(lambda timeout: iter(["a", "b"]))
+        next(stream)
+        stream.close()
+
+        self.assertEqual(policy.call(lambda timeout: "recovered"), "recovered")
+        self.assertEqual(policy.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_call_admitted_while_closed_does_not_free_a_probe_slot(self):
+        policy = self.make_policy(max_retries=0)
+        breaker = policy.breaker
+        probes = []
+
+        def long_call(timeout):
+            # While this call runs the breaker opens, then admits a probe
+            breaker.record_failure()
+            breaker.record_failure()
+            breaker._opened_at -= 61
+            probes.append(breaker.allow())
+            raise UpstreamError(400)
+
+        with self.assertRaises(UpstreamError):
+            policy.call(long_call)
+        self.assertTrue(probes[0])
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+        # So does a stream admitted while closed and abandoned mid-probe
+        breaker.release(probes[0])
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        stream = policy.stream(lambda timeout: iter(["a", "b"]))
+        next(stream)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker._opened_at -= 61
+        self.assertTrue(breaker.allow())
+        stream.close()
+        self.assertFalse(breaker.allow())
+
+    def test_retry_budget_limits_retries(self):
+        policy = self.make_policy(budget=RetryBudget(ratio=0, max_tokens=1, initial_tokens=0))
+        calls = []
+
+        def attempt(timeout):
+            calls.append(timeout)
+            raise UpstreamError(503)
+
+        with self.assertRaises(UpstreamError):
+            policy.call(attempt)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(policy.budget.stats()["exhausted"], 1)
+
+    @override_settings(GEMINI_API_KEY="test-key")
+    def test_call_gemini_returns_fallback_while_open(self):
+        prompt_cache.clear()
+        policy = self.make_policy()
+        policy.breaker.record_failure()
+        policy.breaker.record_failure()
+
+        with patch("ai.gemini_utils.gemini_policy", policy):
+            self.assertEqual(call_gemini("dizziness"), "AI service is temporarily unavailable.")
@@ -0,0 +1,264 @@
+# ai/triage.py
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+logger = logging.getLogger("ai")
+
+# (phrase, specialization, weight, urgent)
+# Weight reflects how strongly the phrase points at the specialization:
+# 3 = specific, 2 = suggestive, 1 = common symptom with many possible causes.
+SYMPTOM_TABLE = (
+    # Cardiology
+    ("chest pain", "Cardiology", 3, True),
+    ("chest tightness", "Cardiology", 3, True),
+    ("palpitations", "Cardiology", 3, False),
+    ("racing heart", "Cardiology", 3, False),
+    ("irregular heartbeat", "Cardiology", 3, False),
+    ("high blood pressure", "Cardiology", 2, False),
+    ("hypertension", "Cardiology", 2, False),
+    ("swollen ankles", "Cardiology", 2, False),
+    # Pulmonology
+    ("shortness of breath", "Pulmonology", 2, True),
+    ("difficulty breathing", "Pulmonology", 2, True),
+    ("breathlessness", "Pulmonology", 2, True),
+    ("wheezing", "Pulmonology", 3, False),
+    ("coughing blood", "Pulmonology", 3, True),
+    ("chronic cough", "Pulmonology", 3, False),
+    ("cough", "Pulmonology", 1, False),
+    # Neurology
+    ("seizure", "Neurology", 3, True),
+    ("numbness", "Neurology", 3, False),
+    ("tingling", "Neurology", 2, False),
+    ("migraine", "Neurology", 3, False),
+    ("memory loss", "Neurology", 3, False),
+    ("tremor", "Neurology", 3, False),
+    ("slurred speech", "Neurology", 3, True),
+    ("fainting", "Neurology", 2, True),
+    ("dizziness", "Neurology", 1, False),
+    ("headache", "Neurology", 1, False),
+    # Gastroenterology
+    ("abdominal pain", "Gastroenterology", 2, False),
+    ("stomach pain", "Gastroenterology", 2, False),
+    ("heartburn", "Gastroenterology", 3, False),
+    ("acid reflux", "Gastroenterology", 3, False),
+    ("diarrhea", "Gastroenterology", 2, False),
+    ("constipation", "Gastroenterology", 2, False),
+    ("bloating", "Gastroenterology", 2, False),
+    ("blood in stool", "Gastroenterology", 3, True),
+    ("vomiting blood", "Gastroenterology", 3, True),
+    ("vomiting", "Gastroenterology", 1, False),
+    ("nausea", "Gastroenterology", 1, False),
+    # Dermatology
+    ("rash", "Dermatology", 3, False),
+    ("itching", "Dermatology", 2, False),
+    ("itchy skin", "Dermatology", 3, False),
+    ("acne", "Dermatology", 3, False),
+    ("eczema", "Dermatology", 3, False),
+    ("hives", "Dermatology", 3, False),
+    ("skin lesion", "Dermatology", 3, False),
+    ("changing mole", "Dermatology", 3, False),
+    # ENT
+    ("ear pain", "ENT", 3, False),
+    ("earache", "ENT", 3, False),
+    ("hearing loss", "ENT", 3, False),
+    ("ringing in ears", "ENT", 3, False),
+    ("tinnitus", "ENT", 3, False),
+    ("sinus pain", "ENT", 3, False),
+    ("nosebleed", "ENT", 2, False),
+    ("hoarseness", "ENT", 2, False),
+    ("sore throat", "ENT", 1, False),
+    # Ophthalmology
+    ("blurred vision", "Ophthalmology", 3, False),
+    ("eye pain", "Ophthalmology", 3, False),
+    ("red eye", "Ophthalmology", 3, False),
+    ("double vision", "Ophthalmology", 3, True),
+    ("vision loss", "Ophthalmology", 3, True),
+    # Orthopedics
+    ("joint pain", "Orthopedics", 3, False),
+    ("back pain", "Orthopedics", 2, False),
+    ("knee pain", "Orthopedics", 3, False),
+    ("neck pain", "Orthopedics", 2, False),
+    ("fracture", "Orthopedics", 3, True),
+    ("sprain", "Orthopedics", 3, False),
+    ("muscle pain", "Orthopedics", 1, False),
+    # Urology
+    ("painful urination", "Urology", 3, False),
+    ("burning urination", "Urology", 3, False),
+    ("frequent urination", "Urology", 2, False),
+    ("blood in urine", "Urology", 3, True),
+    # Gynecology
+    ("irregular periods", "Gynecology", 3, False),
+    ("pelvic pain", "Gynecology", 2, False),
+    ("vaginal bleeding", "Gynecology", 3, True),
+    # Endocrinology
+    ("excessive thirst", "Endocrinology", 3, False),
+    ("unexplained weight loss", "Endocrinology", 2, False),
+    ("diabetes", "Endocrinology", 2, False),
+    ("thyroid", "Endocrinology", 3, False),
+    # Psychiatry
+    ("anxiety", "Psychiatry", 3, False),
+    ("depression", "Psychiatry", 3, False),
+    ("panic attacks", "Psychiatry", 3, False),
+    ("insomnia", "Psychiatry", 2, False),
+    ("suicidal thoughts", "Psychiatry", 3, True),
+    # General Medicine
+    ("fever", "General Medicine", 1, False),
+    ("fatigue", "General Medicine", 1, False),
+    ("tiredness", "General Medicine", 1, False),
+    ("chills", "General Medicine", 1, False),
+    ("body aches", "General Medicine", 1, False),
+    ("loss of appetite", "General Medicine", 1, False),
+)
+
+# A match is ignored when one of these appears within NEGATION_WINDOW tokens before it
+NEGATIONS = frozenset({"no", "not", "without", "denies", "never"})
+NEGATION_WINDOW = 3
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str):
+    """Lowercase word tokens with a naive plural strip ("headaches" -> "headache")."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").casefold()):
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+@dataclass
+class TriageResult:
+    matched: list = field(default_factory=list)
+    scores: dict = field(default_factory=dict)
+    urgent: bool = False
+    confident: bool = False
+
+    @property
+    def specialization(self):
+        if not self.scores:
+            return None
+        return max(self.scores.items(), key=lambda item: (item[1], item[0]))[0]
+
+    def as_dict(self) -> dict:
+        return {
+            "specializations": [
+                {"name": name, "score": score}
+                for name, score in sorted(self.scores.items(), key=lambda item: (-item[1], item[0]))
+            ],
+            "matched_symptoms": self.matched,
+            "urgent": self.urgent,
+            "confident": self.confident,
+        }
+
+    def analysis(self) -> str:
+        """Plain-language answer in the same register as the model's output."""
+        text = (
+            f"Reported symptoms ({', '.join(self.matched)}) are most often assessed by "
+            f"{self.specialization}. Consider booking a {self.specialization} consultation."
+        )
+        if self.urgent:
+            text = (
+                "Some of these symptoms can be signs of an emergency. If they are severe, "
+                "sudden or getting worse, seek emergency care immediately. " + text
+            )
+        return text + " This is general guidance, not a diagnosis."
+
+
+class SymptomIndex:
+    """
+    Token trie over ``SYMPTOM_TABLE`` phrases.
+
+    ``match`` walks the input once and takes the longest phrase starting at
+    each token, so "chest pain" wins over a shorter overlapping phrase.
+    Scores are summed per specialization. The result is confident when the
+    top specialization reaches ``min_score`` and holds at least
+    ``min_share`` of the total; anything else is left to the model.
+    """
+
+    def __init__(self, table=SYMPTOM_TABLE, min_score=3.0, min_share=0.6):
+        self.min_score = min_score
+        self.min_share = min_share
+        self._root = {}
+        for phrase, specialization, weight, urgent in table:
+            node = self._root
+            for token in tokenize(phrase):
+                node = node.setdefault(token, {})
+            node[None] = (phrase, specialization, weight, urgent)
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.confident_hits = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            min_score=getattr(settings, "AI_LOCAL_TRIAGE_MIN_SCORE", 3.0),
+            min_share=getattr(settings, "AI_LOCAL_TRIAGE_MIN_SHARE", 0.6),
+        )
+
+    def _longest_match(self, tokens, start):
+        node, found, end = self._root, None, start
+        for position in range(start, len(tokens)):
+            node = node.get(tokens[position])
+            if node is None:
+                break
+            if None in node:
+                found, end = node[None], position + 1
+        return found, end
+
+    def match(self, text: str) -> TriageResult:
+        tokens = tokenize(text)
+        result = TriageResult()
+        seen = set()
+
+        position = 0
+        while position < len(tokens):
+            entry, end = self._longest_match(tokens, position)
+            if entry is None:
+                position += 1
+                continue
+
+            phrase, specialization, weight, urgent = entry
+            negated = NEGATIONS.intersection(tokens[max(0, position - NEGATION_WINDOW):position])
+            if not negated and phrase not in seen:
+                seen.add(phrase)
+                result.matched.append(phrase)
+                result.scores[specialization] = result.scores.get(specialization, 0) + weight
+                result.urgent = result.urgent or urgent
+            position = end
+
+        if result.scores:
+            top = result.scores[result.specialization]
+            total = sum(result.scores.values())
+            result.confident = top >= self.min_score and top / total >= self.min_share
+
+        with self._lock:
+            self.lookups += 1
+            if result.confident:
+                self.confident_hits += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": getattr(settings, "AI_LOCAL_TRIAGE_ENABLED", True),
+                "lookups": self.lookups,
+                "answered_locally": self.confident_hits,
+                "local_ratio": round(self.confident_hits / self.lookups, 4) if self.lookups else 0.0,
+            }
+
+
+symptom_index = SymptomIndex.from_settings()
+
+
+def local_triage(symptoms: str):
+    """Returns a confident TriageResult, or None when the model should be asked."""
+    if not getattr(settings, "AI_LOCAL_TRIAGE_ENABLED", True):
+        return None
+    result = symptom_index.match(symptoms)
+    return result if result.confident else None
@@ -7,8 +7,14 @@ from drf_yasg import openapi
 from .views import (
     AISymptomCheckerView,
     AIMedicalSummaryView,
+    AIBatchMedicalSummaryView,
     AIDoctorRecommendationView,
-    AdminAIInsightsView
+    AdminAIInsightsView,
+    AdminAIMetricsView,
+    AIJobStatusView,
+    AsyncAISymptomCheckerView,
+    AsyncAIMedicalSummaryView,
+    AsyncAIDoctorRecommendationView,
 )
 
 app_name = "ai_api"
@@ -31,12 +37,21 @@ urlpatterns = [
     path("recommend-doctors/", AIDoctorRecommendationView.as_view(), name="recommend_doctors"),
     path("medical/summary/", AIMedicalSummaryView.as_view(), name="medical_summary"),
     path("admin/insights/", AdminAIInsightsView.as_view(), name="admin_insights"),
+    path("admin/metrics/", AdminAIMetricsView.as_view(), name="admin_metrics"),
     
     # Keep v1 endpoints for backward compatibility
     path("v1/symptoms/checker/", AISymptomCheckerView.as_view(), name="v1_symptom_checker"),
     path("v1/medical/summary/", AIMedicalSummaryView.as_view(), name="v1_medical_summary"),
+    path("v1/medical/summary/batch/", AIBatchMedicalSummaryView.as_view(), name="v1_medical_summary_batch"),
     path("v1/doctors/recommendation/", AIDoctorRecommendationView.as_view(), name="v1_doctor_recommendation"),
     path("v1/admin/insights/", AdminAIInsightsView.as_view(), name="v1_admin_insights"),
+    path("v1/admin/metrics/", AdminAIMetricsView.as_view(), name="v1_admin_metrics"),
+    path("v1/jobs/<uuid:job_id>/", AIJobStatusView.as_view(), name="v1_job_status"),
+
+    # Non-blocking variants; deploy under ASGI (e.g. uvicorn smart_health_backend_project.asgi:application)
+    path("v1/async/symptoms/checker/", AsyncAISymptomCheckerView.as_view(), name="v1_async_symptom_checker"),
+    path("v1/async/medical/summary/", AsyncAIMedicalSummaryView.as_view(), name="v1_async_medical_summary"),
+    path("v1/async/doctors/recommendation/", AsyncAIDoctorRecommendationView.as_view(), name="v1_async_doctor_recommendation"),
 ]
 
 if settings.DEBUG:
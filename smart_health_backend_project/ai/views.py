@@ -4,23 +4,35 @@ from rest_framework.views import APIView
 from rest_framework.throttling import UserRateThrottle, ScopedRateThrottle
 from rest_framework.permissions import IsAdminUser
 
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+from django.db.models import Count, F, Sum
+from asgiref.sync import sync_to_async
 
-from appointments.models import Appointment
-from doctors.models import DoctorProfile
+from appointments.models import Appointment, AppointmentDailyRollup
+from common.views import AsyncAPIViewMixin
 
 from datetime import timedelta
+import json
 import logging
 
 from .serializers import (
     SymptomCheckerSerializer,
     MedicalSummarySerializer,
+    BatchMedicalSummarySerializer,
     DoctorRecommendationSerializer,
     AdminAIInsightsSerializer,
 )
-from .gemini_utils import call_gemini
+from .gemini_utils import call_gemini, call_gemini_async, stream_gemini
+from .models import AIJob
+from .batch import summarize_batch, summary_prompt
+from .candidates import describe_candidate, select_doctor_candidates
+from .permissions import IsDoctorOrAdmin
+from .tasks import run_ai_job_task
+from .cache import prompt_cache
+from .resilience import gemini_policy
+from .singleflight import single_flight
+from .triage import local_triage, symptom_index
 
 from drf_yasg.utils import swagger_auto_schema
 
@@ -35,14 +47,87 @@ class BaseAIView(generics.GenericAPIView):
     throttle_classes = [UserRateThrottle, ScopedRateThrottle]
     throttle_scope = "ai"
     http_method_names = ["post"]
+    # Set to False on endpoints whose answers must never be served from cache
+    cache_ai_responses = True
+
+    def build_envelope(self, data=None, message="", status_type="success"):
+        return {"status": status_type, "message": message, "data": data}
 
     def format_response(self, data=None, message="", status_type="success",
                         http_status=status.HTTP_200_OK):
         return Response(
-            {"status": status_type, "message": message, "data": data},
+            self.build_envelope(data, message, status_type),
             status=http_status
         )
 
+    def wants_job(self, request):
+        return request.query_params.get("mode", "").lower() == "job"
+
+    def enqueue_job(self, request, endpoint, prompt, data_key, message):
+        """
+        Stores the prompt as an AIJob and hands it to Celery, answering 202
+        with the job id. Clients poll ``v1/jobs/<job_id>/`` for the result.
+        """
+        job = AIJob.objects.create(
+            requested_by=request.user,
+            endpoint=endpoint,
+            prompt=prompt,
+            use_cache=self.cache_ai_responses,
+            result_key=data_key,
+            result_message=message,
+        )
+
+        # Try to enqueue the Celery task; if broker is unavailable (e.g., in dev/test),
+        # fall back to executing the task synchronously so the API remains usable.
+        try:
+            run_ai_job_task.delay(str(job.id))
+        except Exception as e:
+            logger.warning("Failed to enqueue AI job, running synchronously: %s", e)
+            run_ai_job_task.run(str(job.id))
+
+        job.refresh_from_db(fields=["status"])
+        return self.format_response(
+            data={"job_id": str(job.id), "job_status": job.status},
+            message="AI job accepted.",
+            http_status=status.HTTP_202_ACCEPTED
+        )
+
+    def wants_stream(self, request):
+        return request.query_params.get("stream", "").lower() in ("1", "true", "yes")
+
+    def stream_response(self, prompt, data_key, message):
+        """
+        Server-Sent Events response: one ``token`` event per model chunk,
+        then a ``done`` event carrying the usual ``format_response`` envelope.
+        """
+        def sse(event, payload):
+            return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+        def events():
+            parts = []
+            try:
+                for chunk in stream_gemini(prompt, use_cache=self.cache_ai_responses):
+                    parts.append(chunk)
+                    yield sse("token", {"text": chunk})
+                envelope = self.build_envelope(
+                    data={data_key: "".join(parts).strip()},
+                    message=message,
+                )
+            except Exception:
+                logger.exception("Gemini streaming failure")
+                envelope = self.build_envelope(
+                    data={data_key: "".join(parts).strip()},
+                    message="AI service is temporarily unavailable.",
+                    status_type="error",
+                )
+            yield sse("done", envelope)
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stop nginx from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
 
 # -----------------------------
 # 1. AI Symptom Checker
@@ -50,6 +135,19 @@ class BaseAIView(generics.GenericAPIView):
 class AISymptomCheckerView(BaseAIView):
     serializer_class = SymptomCheckerSerializer
 
+    def build_prompt(self, data):
+        return f"Analyze these symptoms medically and safely: {data['symptoms']}"
+
+    def local_response(self, data):
+        """Answers clearly recognized symptoms from the local index, or returns None."""
+        triage = local_triage(data["symptoms"])
+        if triage is None:
+            return None
+        return self.format_response(
+            data={"analysis": triage.analysis(), "source": "local", "triage": triage.as_dict()},
+            message="Symptom analysis completed."
+        )
+
     @swagger_auto_schema(
         operation_summary="AI Symptom Checker",
         request_body=SymptomCheckerSerializer
@@ -58,8 +156,29 @@ class AISymptomCheckerView(BaseAIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        if self.wants_job(request):
+            return self.enqueue_job(
+                request,
+                endpoint="symptom_checker",
+                prompt=self.build_prompt(serializer.validated_data),
+                data_key="analysis",
+                message="Symptom analysis completed.",
+            )
+
+        if self.wants_stream(request):
+            return self.stream_response(
+                self.build_prompt(serializer.validated_data),
+                data_key="analysis",
+                message="Symptom analysis completed.",
+            )
+
+        local = self.local_response(serializer.validated_data)
+        if local is not None:
+            return local
+
         result = call_gemini(
-            f"Analyze these symptoms medically and safely: {serializer.validated_data['symptoms']}"
+            self.build_prompt(serializer.validated_data),
+            use_cache=self.cache_ai_responses,
         )
 
         return self.format_response(
@@ -74,6 +193,9 @@ class AISymptomCheckerView(BaseAIView):
 class AIMedicalSummaryView(BaseAIView):
     serializer_class = MedicalSummarySerializer
 
+    def build_prompt(self, data):
+        return summary_prompt(data["medical_history"])
+
     @swagger_auto_schema(
         operation_summary="AI Medical Summary",
         request_body=MedicalSummarySerializer
@@ -82,8 +204,25 @@ class AIMedicalSummaryView(BaseAIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        if self.wants_job(request):
+            return self.enqueue_job(
+                request,
+                endpoint="medical_summary",
+                prompt=self.build_prompt(serializer.validated_data),
+                data_key="summary",
+                message="Medical summary generated.",
+            )
+
+        if self.wants_stream(request):
+            return self.stream_response(
+                self.build_prompt(serializer.validated_data),
+                data_key="summary",
+                message="Medical summary generated.",
+            )
+
         summary = call_gemini(
-            f"Generate a professional medical summary: {serializer.validated_data['medical_history']}"
+            self.build_prompt(serializer.validated_data),
+            use_cache=self.cache_ai_responses,
         )
 
         return self.format_response(
@@ -92,12 +231,83 @@ class AIMedicalSummaryView(BaseAIView):
         )
 
 
+# -----------------------------
+# 2b. AI Batch Medical Summary
+# -----------------------------
+class AIBatchMedicalSummaryView(BaseAIView):
+    serializer_class = BatchMedicalSummarySerializer
+    permission_classes = [IsDoctorOrAdmin]
+
+    @swagger_auto_schema(
+        operation_summary="AI Batch Medical Summary",
+        request_body=BatchMedicalSummarySerializer
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        items = serializer.validated_data["items"]
+        outcomes = summarize_batch(
+            [item["medical_history"] for item in items],
+            use_cache=self.cache_ai_responses,
+        )
+
+        results = []
+        for index, (item, (text, ok)) in enumerate(zip(items, outcomes)):
+            result = {"index": index, "id": item.get("id"), "status": "success" if ok else "error"}
+            result["summary" if ok else "error"] = text
+            results.append(result)
+
+        failed = sum(1 for r in results if r["status"] == "error")
+        if not failed:
+            status_type = "success"
+        elif failed < len(results):
+            status_type = "partial"
+        else:
+            status_type = "error"
+
+        return self.format_response(
+            data={"results": results, "succeeded": len(results) - failed, "failed": failed},
+            message="Batch medical summaries generated.",
+            status_type=status_type,
+        )
+
+
 # -----------------------------
 # 3. AI Doctor Recommendation
 # -----------------------------
 class AIDoctorRecommendationView(BaseAIView):
     serializer_class = DoctorRecommendationSerializer
 
+    def get_doctor_names(self, data, triage=None):
+        specialization = data.get("specialization") or (triage and triage.specialization)
+        doctors = select_doctor_candidates(data["location"], specialization)
+        return [describe_candidate(doc) for doc in doctors]
+
+    def local_recommendation(self, triage, doctor_names):
+        return self.format_response(
+            data={
+                "recommendation": f"{triage.analysis()} Suggested doctors: {'; '.join(doctor_names)}.",
+                "source": "local",
+                "triage": triage.as_dict(),
+            },
+            message="Doctor recommendation generated."
+        )
+
+    def build_prompt(self, data, doctor_names):
+        return (
+            f"Recommend the best doctors for symptoms '{data['symptoms']}' "
+            f"from this list: {doctor_names}"
+        )
+
+    def no_doctors_response(self):
+        return self.format_response(
+            data=[],
+            message="No verified doctors found in this location.",
+            status_type="error",
+            http_status=status.HTTP_404_NOT_FOUND
+        )
+
     @swagger_auto_schema(
         operation_summary="AI Doctor Recommendation",
         request_body=DoctorRecommendationSerializer
@@ -106,27 +316,26 @@ class AIDoctorRecommendationView(BaseAIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        symptoms = serializer.validated_data["symptoms"]
-        location = serializer.validated_data["location"]
-
-        doctors = DoctorProfile.objects.select_related("user").filter(
-            location__icontains=location,
-            is_verified=True
-        )
-
-        if not doctors.exists():
-            return self.format_response(
-                data=[],
-                message="No verified doctors found in this location.",
-                status_type="error",
-                http_status=status.HTTP_404_NOT_FOUND
+        triage = local_triage(serializer.validated_data["symptoms"])
+        doctor_names = self.get_doctor_names(serializer.validated_data, triage)
+        if not doctor_names:
+            return self.no_doctors_response()
+
+        if self.wants_job(request):
+            return self.enqueue_job(
+                request,
+                endpoint="doctor_recommendation",
+                prompt=self.build_prompt(serializer.validated_data, doctor_names),
+                data_key="recommendation",
+                message="Doctor recommendation generated.",
             )
 
-        doctor_names = [doc.user.get_full_name() or doc.user.username for doc in doctors]
+        if triage is not None:
+            return self.local_recommendation(triage, doctor_names)
 
         recommendation = call_gemini(
-            f"Recommend the best doctors for symptoms '{symptoms}' "
-            f"from this list: {doctor_names}"
+            self.build_prompt(serializer.validated_data, doctor_names),
+            use_cache=self.cache_ai_responses,
         )
 
         return self.format_response(
@@ -140,6 +349,7 @@ class AIDoctorRecommendationView(BaseAIView):
 # -----------------------------
 class AdminAIInsightsView(APIView):
     permission_classes = [IsAdminUser]
+    cache_ai_responses = True
 
     @swagger_auto_schema(
         operation_summary="Admin AI Insights",
@@ -156,26 +366,27 @@ class AdminAIInsightsView(APIView):
             "start_date", end_date - timedelta(days=30)
         )
 
+        rollups = AppointmentDailyRollup.objects.filter(date__range=[start_date, end_date])
+
         # Top doctors
         top_doctors = (
-            Appointment.objects
-            .filter(date__range=[start_date, end_date])
+            rollups
             .values("doctor__user__username")
-            .annotate(total_appointments=Count("id"))
+            .annotate(total_appointments=Sum("count"))
+            .filter(total_appointments__gt=0)
             .order_by("-total_appointments")[:5]
         )
 
         # Appointment trends
         trend_data = (
-            Appointment.objects
-            .filter(date__range=[start_date, end_date])
-            .annotate(day=TruncDate("date"))
-            .values("day")
-            .annotate(total=Count("id"))
+            rollups
+            .values(day=F("date"))
+            .annotate(total=Sum("count"))
+            .filter(total__gt=0)
             .order_by("day")
         )
 
-        # High-risk patients
+        # High-risk patients (per patient, so not covered by the daily rollup)
         high_risk_patients = (
             Appointment.objects
             .filter(
@@ -188,7 +399,8 @@ class AdminAIInsightsView(APIView):
         )
 
         insight_text = call_gemini(
-            f"Summarize these appointment trends for a hospital admin: {list(trend_data)}"
+            f"Summarize these appointment trends for a hospital admin: {list(trend_data)}",
+            use_cache=self.cache_ai_responses,
         )
 
         return Response({
@@ -199,6 +411,140 @@ class AdminAIInsightsView(APIView):
         })
 
 
+# -----------------------------
+# AI Job Status
+# -----------------------------
+class AIJobStatusView(generics.RetrieveAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_url_kwarg = "job_id"
+
+    def get_queryset(self):
+        qs = AIJob.objects.all()
+        if not self.request.user.is_staff:
+            qs = qs.filter(requested_by=self.request.user)
+        return qs
+
+    @swagger_auto_schema(operation_summary="AI Job Status")
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+
+        if job.status == AIJob.STATUS_COMPLETED:
+            result = {job.result_key: job.result}
+            message = job.result_message
+        elif job.status == AIJob.STATUS_FAILED:
+            result = None
+            message = "AI job failed."
+        else:
+            result = None
+            message = "AI job is still running."
+
+        return Response({
+            "status": "error" if job.status == AIJob.STATUS_FAILED else "success",
+            "message": message,
+            "data": {
+                "job_id": str(job.id),
+                "job_status": job.status,
+                "result": result,
+                "created_at": job.created_at,
+                "finished_at": job.finished_at,
+            },
+        })
+
+
+# -----------------------------
+# Async AI Views (served under ASGI)
+# -----------------------------
+class AsyncAISymptomCheckerView(AsyncAPIViewMixin, AISymptomCheckerView):
+
+    @swagger_auto_schema(
+        operation_summary="AI Symptom Checker (async)",
+        request_body=SymptomCheckerSerializer
+    )
+    async def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        local = self.local_response(serializer.validated_data)
+        if local is not None:
+            return local
+
+        result = await call_gemini_async(
+            self.build_prompt(serializer.validated_data),
+            use_cache=self.cache_ai_responses,
+        )
+
+        return self.format_response(
+            data={"analysis": result},
+            message="Symptom analysis completed."
+        )
+
+
+class AsyncAIMedicalSummaryView(AsyncAPIViewMixin, AIMedicalSummaryView):
+
+    @swagger_auto_schema(
+        operation_summary="AI Medical Summary (async)",
+        request_body=MedicalSummarySerializer
+    )
+    async def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        summary = await call_gemini_async(
+            self.build_prompt(serializer.validated_data),
+            use_cache=self.cache_ai_responses,
+        )
+
+        return self.format_response(
+            data={"summary": summary},
+            message="Medical summary generated."
+        )
+
+
+class AsyncAIDoctorRecommendationView(AsyncAPIViewMixin, AIDoctorRecommendationView):
+
+    @swagger_auto_schema(
+        operation_summary="AI Doctor Recommendation (async)",
+        request_body=DoctorRecommendationSerializer
+    )
+    async def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        triage = local_triage(serializer.validated_data["symptoms"])
+        doctor_names = await sync_to_async(self.get_doctor_names)(serializer.validated_data, triage)
+        if not doctor_names:
+            return self.no_doctors_response()
+
+        if triage is not None:
+            return self.local_recommendation(triage, doctor_names)
+
+        recommendation = await call_gemini_async(
+            self.build_prompt(serializer.validated_data, doctor_names),
+            use_cache=self.cache_ai_responses,
+        )
+
+        return self.format_response(
+            data={"recommendation": recommendation},
+            message="Doctor recommendation generated."
+        )
+
+
+# -----------------------------
+# 5. Admin AI Metrics
+# -----------------------------
+class AdminAIMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(operation_summary="Admin AI Metrics")
+    def get(self, request):
+        return Response({
+            "cache": prompt_cache.stats(),
+            "singleflight": single_flight.stats(),
+            "upstream": gemini_policy.stats(),
+            "local_triage": symptom_index.stats(),
+        })
+
+
 
 
 
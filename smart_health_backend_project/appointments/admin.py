@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Appointment
+from .models import Appointment, AppointmentDailyRollup
 
 
 @admin.register(Appointment)
@@ -27,3 +27,11 @@ class AppointmentAdmin(admin.ModelAdmin):
     ordering = ("-created_at",)
 
     readonly_fields = ("created_at",)
+
+
+@admin.register(AppointmentDailyRollup)
+class AppointmentDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ("date", "doctor", "status", "count")
+    list_filter = ("status", "date")
+    ordering = ("-date",)
+    readonly_fields = ("date", "doctor", "status", "count")
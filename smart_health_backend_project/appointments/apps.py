@@ -5,15 +5,5 @@ class AppointmentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "appointments"
 
-
-
-
-
-
-
-
-
-
-
-
-
+    def ready(self):
+        import appointments.signals  # noqa
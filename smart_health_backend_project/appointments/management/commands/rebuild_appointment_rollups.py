@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from appointments.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily appointment rollup table from the Appointment table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_date, help="First date to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--end", type=parse_date, help="Last date to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups(start=options["start"], end=options["end"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows."))
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rollups(apps, schema_editor):
+    Appointment = apps.get_model("appointments", "Appointment")
+    AppointmentDailyRollup = apps.get_model("appointments", "AppointmentDailyRollup")
+
+    grouped = (
+        Appointment.objects
+        .order_by()
+        .values("date", "doctor_id", "status")
+        .annotate(total=Count("id"))
+    )
+    AppointmentDailyRollup.objects.bulk_create(
+        [
+            AppointmentDailyRollup(
+                date=row["date"], doctor_id=row["doctor_id"],
+                status=row["status"], count=row["total"],
+            )
+            for row in grouped.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_initial'),
+        ('doctors', '0003_doctorprofile_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('cancelled', 'Cancelled'), ('completed', 'Completed')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_rollups', to='doctors.doctorprofile')),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['date', 'status'], name='rollup_date_status_idx')],
+                'unique_together': {('date', 'doctor', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
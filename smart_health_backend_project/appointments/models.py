@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import datetime
@@ -82,18 +82,39 @@ class Appointment(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        # post_save (the daily rollup) runs outside save()'s own atomic block;
+        # this keeps the appointment and its rollup change in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.patient.user.username} → {self.doctor.user.username}"
 
 
+class AppointmentDailyRollup(models.Model):
+    """
+    Appointment counts per date × doctor × status.
 
+    Kept current by the signals in ``appointments.signals`` and rebuilt from
+    scratch with ``manage.py rebuild_appointment_rollups``. Admin trend and
+    insight queries read this table instead of scanning Appointment.
+    """
 
+    date = models.DateField()
+    doctor = models.ForeignKey(
+        "doctors.DoctorProfile",
+        on_delete=models.CASCADE,
+        related_name="appointment_rollups"
+    )
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        ordering = ["date"]
+        unique_together = (("date", "doctor", "status"),)
+        indexes = [
+            models.Index(fields=["date", "status"], name="rollup_date_status_idx"),
+        ]
 
-
-
-
-
-
+    def __str__(self):
+        return f"{self.date} {self.doctor_id} {self.status}: {self.count}"
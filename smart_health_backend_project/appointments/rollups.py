@@ -0,0 +1,73 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Appointment, AppointmentDailyRollup
+
+logger = logging.getLogger(__name__)
+
+
+def rollup_key(appointment):
+    return (appointment.date, appointment.doctor_id, appointment.status)
+
+
+def apply_delta(key, delta):
+    """
+    Adds ``delta`` to the rollup row for ``(date, doctor_id, status)``.
+    A decrement never takes a row below zero; a row that has already
+    drifted there is left for ``rebuild_appointment_rollups``.
+    """
+    date, doctor_id, status = key
+    rows = AppointmentDailyRollup.objects.filter(date=date, doctor_id=doctor_id, status=status)
+    if delta < 0:
+        if not rows.filter(count__gte=-delta).update(count=F("count") + delta):
+            logger.warning("Appointment rollup %s would go below zero; run rebuild_appointment_rollups", key)
+        return
+    if rows.update(count=F("count") + delta):
+        return
+
+    _, created = AppointmentDailyRollup.objects.get_or_create(
+        date=date, doctor_id=doctor_id, status=status, defaults={"count": delta}
+    )
+    if not created:
+        # Another writer created the row between our update and insert
+        rows.update(count=F("count") + delta)
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recomputes rollup rows from Appointment, optionally for a date range only.
+    Returns the number of rollup rows written.
+    """
+    appointments = Appointment.objects.all()
+    rollups = AppointmentDailyRollup.objects.all()
+    if start:
+        appointments = appointments.filter(date__gte=start)
+        rollups = rollups.filter(date__gte=start)
+    if end:
+        appointments = appointments.filter(date__lte=end)
+        rollups = rollups.filter(date__lte=end)
+
+    grouped = (
+        appointments
+        .order_by()
+        .values("date", "doctor_id", "status")
+        .annotate(total=Count("id"))
+    )
+
+    with transaction.atomic():
+        rollups.delete()
+        created = AppointmentDailyRollup.objects.bulk_create(
+            [
+                AppointmentDailyRollup(
+                    date=row["date"], doctor_id=row["doctor_id"],
+                    status=row["status"], count=row["total"],
+                )
+                for row in grouped.iterator()
+            ],
+            batch_size=1000,
+        )
+
+    logger.info("Rebuilt %s appointment rollup rows", len(created))
+    return len(created)
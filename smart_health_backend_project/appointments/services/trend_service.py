@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from appointments.models import Appointment, AppointmentDailyRollup
+
+
+class AppointmentTrendService:
+    """
+    Appointment counts grouped into day, week or month buckets.
+
+    Grouping and summing happen in SQL over AppointmentDailyRollup, so cost
+    depends on the number of rollup rows in the range, not on appointments.
+    Week buckets start on Monday and month buckets on the 1st; a bucket is
+    labelled with its first day even when the range starts mid-bucket.
+    """
+
+    BUCKETS = {
+        "day": TruncDay,
+        "week": TruncWeek,
+        "month": TruncMonth,
+    }
+    MAX_BUCKETS = 1000
+
+    @staticmethod
+    def bucket_start(day: date, bucket: str) -> date:
+        if bucket == "week":
+            return day - timedelta(days=day.weekday())
+        if bucket == "month":
+            return day.replace(day=1)
+        return day
+
+    @staticmethod
+    def next_bucket(day: date, bucket: str) -> date:
+        if bucket == "week":
+            return day + timedelta(days=7)
+        if bucket == "month":
+            return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return day + timedelta(days=1)
+
+    @classmethod
+    def bucket_labels(cls, start: date, end: date, bucket: str) -> list:
+        labels = []
+        current = cls.bucket_start(start, bucket)
+        while current <= end:
+            labels.append(current)
+            current = cls.next_bucket(current, bucket)
+        return labels
+
+    @classmethod
+    def trend(cls, start: date, end: date, bucket: str = "day",
+              by_status: bool = False, zero_fill: bool = True) -> list:
+        """
+        Returns ``[{"date": "YYYY-MM-DD", "count": n}, ...]`` ordered by
+        bucket. With ``by_status`` every row also carries ``"statuses"``, a
+        count per appointment status. Raises ValueError for an unknown
+        bucket, an inverted range or more than MAX_BUCKETS buckets.
+        """
+        if bucket not in cls.BUCKETS:
+            raise ValueError(f"Invalid bucket. Allowed: {', '.join(cls.BUCKETS)}.")
+        if start > end:
+            raise ValueError("Start date must be on or before end date.")
+
+        labels = cls.bucket_labels(start, end, bucket)
+        if len(labels) > cls.MAX_BUCKETS:
+            raise ValueError(f"Range too large: at most {cls.MAX_BUCKETS} {bucket} buckets.")
+
+        group_by = ["period", "status"] if by_status else ["period"]
+        rows = (
+            AppointmentDailyRollup.objects
+            .filter(date__range=[start, end])
+            .annotate(period=cls.BUCKETS[bucket]("date"))
+            .values(*group_by)
+            .annotate(total=Sum("count"))
+            .order_by("period")
+        )
+
+        statuses = [value for value, _ in Appointment.STATUS_CHOICES]
+        buckets = {}
+        for row in rows:
+            period = row["period"]
+            if hasattr(period, "date"):
+                period = period.date()
+            entry = buckets.setdefault(period, cls._empty(period, statuses, by_status))
+            entry["count"] += row["total"]
+            if by_status:
+                entry["statuses"][row["status"]] += row["total"]
+
+        if zero_fill:
+            return [buckets.get(label) or cls._empty(label, statuses, by_status) for label in labels]
+        return [buckets[label] for label in sorted(buckets) if buckets[label]["count"]]
+
+    @staticmethod
+    def _empty(period, statuses, by_status):
+        entry = {"date": str(period), "count": 0}
+        if by_status:
+            entry["statuses"] = dict.fromkeys(statuses, 0)
+        return entry
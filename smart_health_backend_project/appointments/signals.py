@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Appointment
+from .rollups import apply_delta, rollup_key
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_rollup_key(sender, instance, **kwargs):
+    """Keeps the stored date/doctor/status so post_save can move the count."""
+    instance._previous_rollup_key = None
+    if instance.pk:
+        previous = (
+            Appointment.objects
+            .filter(pk=instance.pk)
+            .values_list("date", "doctor_id", "status")
+            .first()
+        )
+        instance._previous_rollup_key = previous
+
+
+@receiver(post_save, sender=Appointment)
+def update_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, "_previous_rollup_key", None)
+    current = rollup_key(instance)
+    if previous == current:
+        return
+    if previous is not None:
+        apply_delta(previous, -1)
+    apply_delta(current, 1)
+
+
+@receiver(post_delete, sender=Appointment)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    apply_delta(rollup_key(instance), -1)
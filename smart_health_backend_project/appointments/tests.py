@@ -9,8 +9,11 @@ from django.utils import timezone
 from users.models import User
 from patients.models import PatientProfile
 from doctors.models import DoctorProfile, Availability
-from appointments.models import Appointment
+from appointments.models import Appointment, AppointmentDailyRollup
+from appointments.services.trend_service import AppointmentTrendService
 from rest_framework.exceptions import ValidationError
+from django.core.management import call_command
+from io import StringIO
 
 
 class AppointmentTests(TestCase):
@@ -211,3 +214,122 @@ class AppointmentEdgeCaseTests(AppointmentTests):
 
 
 
+
+
+class AppointmentRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        patient_user = User.objects.create_user(username="rpat", password="test1234", email="rp@example.com", role="patient")
+        doctor_user = User.objects.create_user(username="rdoc", password="test1234", email="rd@example.com", role="doctor")
+        self.admin_user = User.objects.create_superuser(username="radmin", password="admin123", email="ra@example.com")
+        self.patient, _ = PatientProfile.objects.get_or_create(user=patient_user)
+        self.doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        self.day = timezone.now().date() + timedelta(days=1)
+
+    def counts(self):
+        return {
+            (r.date, r.status): r.count
+            for r in AppointmentDailyRollup.objects.filter(doctor=self.doctor, count__gt=0)
+        }
+
+    def book(self, hour, day=None):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=day or self.day, time=time(hour, 0)
+        )
+
+    def test_rollup_follows_create_status_change_move_and_delete(self):
+        first = self.book(9)
+        self.book(10)
+        self.assertEqual(self.counts(), {(self.day, "pending"): 2})
+
+        first.status = Appointment.STATUS_CANCELLED
+        first.save()
+        self.assertEqual(self.counts(), {(self.day, "pending"): 1, (self.day, "cancelled"): 1})
+
+        later = self.day + timedelta(days=1)
+        first.date = later
+        first.save()
+        self.assertEqual(self.counts(), {(self.day, "pending"): 1, (later, "cancelled"): 1})
+
+        first.delete()
+        self.assertEqual(self.counts(), {(self.day, "pending"): 1})
+
+    def test_delete_with_drifted_rollup_does_not_fail(self):
+        appointment = self.book(9)
+        AppointmentDailyRollup.objects.all().update(count=0)
+
+        appointment.delete()
+
+        self.assertFalse(Appointment.objects.exists())
+        self.assertEqual(AppointmentDailyRollup.objects.get().count, 0)
+
+    def test_rollup_write_failure_rolls_back_the_save(self):
+        with patch("appointments.signals.apply_delta", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.book(9)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        self.book(9)
+        self.book(10)
+        AppointmentDailyRollup.objects.all().update(count=7)
+
+        call_command("rebuild_appointment_rollups", stdout=StringIO())
+
+        self.assertEqual(self.counts(), {(self.day, "pending"): 2})
+
+    def test_trend_view_reads_rollup(self):
+        today = timezone.now().date()
+        AppointmentDailyRollup.objects.create(date=today, doctor=self.doctor, status="pending", count=3)
+        AppointmentDailyRollup.objects.create(date=today, doctor=self.doctor, status="completed", count=2)
+        AppointmentDailyRollup.objects.create(date=today - timedelta(days=1), doctor=self.doctor, status="pending", count=0)
+        self.client.force_authenticate(user=self.admin_user)
+
+        response = self.client.get(reverse("admin-appointments-trend"), {"period": "last_7_days", "fill": "false"})
+
+        self.assertEqual(response.json(), [{"date": str(today), "count": 5}])
+
+
+class AppointmentTrendServiceTests(TestCase):
+    def setUp(self):
+        doctor_user = User.objects.create_user(username="tdoc", password="test1234", email="td@example.com", role="doctor")
+        self.doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        for day, status_name, count in (
+            (date(2024, 1, 1), "pending", 2),     # Monday
+            (date(2024, 1, 3), "completed", 1),
+            (date(2024, 1, 15), "cancelled", 4),
+            (date(2024, 2, 10), "pending", 5),
+        ):
+            AppointmentDailyRollup.objects.create(date=day, doctor=self.doctor, status=status_name, count=count)
+
+    def test_daily_buckets_are_zero_filled(self):
+        trend = AppointmentTrendService.trend(date(2024, 1, 1), date(2024, 1, 4))
+        self.assertEqual(trend, [
+            {"date": "2024-01-01", "count": 2},
+            {"date": "2024-01-02", "count": 0},
+            {"date": "2024-01-03", "count": 1},
+            {"date": "2024-01-04", "count": 0},
+        ])
+
+    def test_weekly_and_monthly_buckets_with_status_breakdown(self):
+        weekly = AppointmentTrendService.trend(date(2024, 1, 1), date(2024, 1, 21), bucket="week")
+        self.assertEqual([(w["date"], w["count"]) for w in weekly], [
+            ("2024-01-01", 3), ("2024-01-08", 0), ("2024-01-15", 4),
+        ])
+
+        with self.assertNumQueries(1):
+            monthly = AppointmentTrendService.trend(date(2024, 1, 1), date(2024, 3, 31), bucket="month", by_status=True)
+        self.assertEqual([m["count"] for m in monthly], [7, 5, 0])
+        self.assertEqual(monthly[0]["statuses"], {"pending": 2, "approved": 0, "cancelled": 4, "completed": 1})
+
+    def test_view_accepts_explicit_range_and_rejects_bad_input(self):
+        admin = User.objects.create_superuser(username="tadmin", password="admin123", email="ta@example.com")
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        url = reverse("admin-appointments-trend")
+
+        response = client.get(url, {"start": "2024-02-01", "end": "2024-02-29", "bucket": "month"})
+        self.assertEqual(response.json(), [{"date": "2024-02-01", "count": 5}])
+
+        self.assertEqual(client.get(url, {"bucket": "year"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.get(url, {"start": "2024-02-01"}).status_code, status.HTTP_400_BAD_REQUEST)
@@ -4,10 +4,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.pagination import PageNumberPagination
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
 
+from common.aggregation_utils import counts_by_value
 from users.permissions import IsPatient, IsDoctor
 from .models import Appointment
+from .services.trend_service import AppointmentTrendService
 from .serializers import (
     AppointmentSerializer,
     CreateAppointmentSerializer,
@@ -117,11 +120,26 @@ class AdminAllAppointmentsView(generics.ListAPIView):
 
 
 class AdminAppointmentTrendView(APIView):
+    """
+    Appointment counts per day, week or month.
+
+    Query params: ``period`` (today, yesterday, last_7_days, last_30_days) or
+    an explicit ``start``/``end`` (YYYY-MM-DD); ``bucket`` (day, week,
+    month); ``breakdown=status`` for per-status counts; ``fill=false`` to
+    drop empty buckets.
+    """
     permission_classes = [permissions.IsAdminUser]
 
-    def get(self, request):
+    def get_range(self, params):
+        if "start" in params or "end" in params:
+            start = parse_date(params.get("start", ""))
+            end = parse_date(params.get("end", ""))
+            if not start or not end:
+                raise ValueError("Both start and end are required as YYYY-MM-DD.")
+            return start, end
+
         today = timezone.now().date()
-        period = request.query_params.get("period", "last_7_days")
+        period = params.get("period", "last_7_days")
 
         ranges = {
             "today": (today, today),
@@ -131,30 +149,35 @@ class AdminAppointmentTrendView(APIView):
         }
 
         if period not in ranges:
-            return Response({"detail": "Invalid period"}, status=400)
-
-        start, end = ranges[period]
-
-        qs = Appointment.objects.filter(date__range=[start, end])
-        result = {}
-
-        for a in qs:
-            result[str(a.date)] = result.get(str(a.date), 0) + 1
+            raise ValueError("Invalid period")
+        return ranges[period]
 
-        return Response(
-            [{"date": d, "count": c} for d, c in sorted(result.items())]
-        )
+    def get(self, request):
+        params = request.query_params
+        try:
+            start, end = self.get_range(params)
+            trend = AppointmentTrendService.trend(
+                start,
+                end,
+                bucket=params.get("bucket", "day"),
+                by_status=params.get("breakdown") == "status",
+                zero_fill=params.get("fill", "true").lower() not in ("0", "false", "no"),
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        return Response(trend)
 
 
 class AdminAppointmentStatusSummaryView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request):
-        qs = Appointment.objects.all()
-        summary = {
-            status: qs.filter(status=status).count()
-            for status, _ in Appointment.STATUS_CHOICES
-        }
+        summary = counts_by_value(
+            Appointment.objects.all(),
+            "status",
+            [value for value, _ in Appointment.STATUS_CHOICES],
+        )
         return Response(summary)
 
 
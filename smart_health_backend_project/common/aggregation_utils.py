@@ -0,0 +1,37 @@
+from django.db.models import Count, Q
+
+
+def conditional_counts(queryset, conditions: dict) -> dict:
+    """
+    Counts several subsets of ``queryset`` in a single query.
+
+    ``conditions`` maps result names to a ``Q`` filter, or to None for an
+    unfiltered count:
+
+        conditional_counts(Appointment.objects.all(), {
+            "total": None,
+            "completed": Q(status="completed"),
+        })
+
+    Each name becomes ``COUNT(*) FILTER (WHERE ...)`` (or ``CASE WHEN`` on
+    backends without FILTER) within one ``aggregate()`` call.
+    """
+    # Positional aliases avoid clashes between result names and model fields
+    aliases = {f"count_{i}": name for i, name in enumerate(conditions)}
+    result = queryset.aggregate(**{
+        alias: Count("pk", filter=conditions[name])
+        for alias, name in aliases.items()
+    })
+    return {name: result[alias] or 0 for alias, name in aliases.items()}
+
+
+def counts_by_value(queryset, field: str, values, total_key=None) -> dict:
+    """
+    ``{value: count}`` for each value of ``field`` in a single query, plus an
+    overall count under ``total_key`` when given.
+    """
+    conditions = {}
+    if total_key:
+        conditions[total_key] = None
+    conditions.update({value: Q(**{field: value}) for value in values})
+    return conditional_counts(queryset, conditions)
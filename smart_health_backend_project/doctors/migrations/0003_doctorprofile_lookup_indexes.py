@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:03
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(django.db.models.functions.text.Lower('location'), models.F('is_verified'), name='doctor_location_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(django.db.models.functions.text.Lower('specialization'), django.db.models.functions.text.Lower('location'), name='doctor_spec_location_ci_idx'),
+        ),
+    ]
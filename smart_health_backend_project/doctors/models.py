@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
@@ -23,6 +24,11 @@ class DoctorProfile(models.Model):
     class Meta:
         verbose_name = "Doctor Profile"
         verbose_name_plural = "Doctor Profiles"
+        indexes = [
+            # Case-insensitive exact lookups used by AI doctor candidate selection
+            models.Index(Lower("location"), "is_verified", name="doctor_location_ci_idx"),
+            models.Index(Lower("specialization"), Lower("location"), name="doctor_spec_location_ci_idx"),
+        ]
 
     def __str__(self):
         return f"Dr. {self.user.get_full_name() or self.user.username}"
@@ -1,17 +1,44 @@
 from django.contrib import admin
-from .models import Report
+from .models import Report, ReportDayChunk, ReportPartition, ReportSchedule
+
+
+class ReportPartitionInline(admin.TabularInline):
+    model = ReportPartition
+    extra = 0
+    can_delete = False
+    fields = ("index", "date_from", "date_to", "status", "rows", "updated_at")
+    readonly_fields = fields
 
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
+    inlines = [ReportPartitionInline]
     list_display = (
         "id",
         "report_type",
+        "file_format",
         "is_ready",
+        "is_failed",
         "generated_by",
         "created_at",
     )
-    list_filter = ("report_type", "is_ready")
+    list_filter = ("report_type", "file_format", "is_ready", "is_failed")
+    search_fields = ("content_hash",)
+
+
+@admin.register(ReportDayChunk)
+class ReportDayChunkAdmin(admin.ModelAdmin):
+    list_display = ("report_type", "file_format", "day", "rows", "updated_at")
+    list_filter = ("report_type", "file_format")
+    date_hierarchy = "day"
+
+
+@admin.register(ReportSchedule)
+class ReportScheduleAdmin(admin.ModelAdmin):
+    list_display = ("report_type", "file_format", "frequency", "is_active", "last_period_end", "last_report")
+    list_filter = ("frequency", "report_type", "is_active")
+    list_editable = ("is_active",)
+    readonly_fields = ("last_period_end", "last_report")
 
 
 
@@ -4,6 +4,9 @@ class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
 
+    def ready(self):
+        import reports.signals  # noqa
+
 
 
 
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_report_file_format'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='file_format',
+            field=models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel'), ('pdf', 'PDF')], default='csv', max_length=10),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_report_pdf_format'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='is_failed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['report_type', 'file_format', 'date_from', 'date_to'], name='report_dedup_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_report_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('date_from', models.DateField()),
+                ('date_to', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/parts/')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='partitions', to='reports.report')),
+            ],
+            options={
+                'ordering': ['report', 'index'],
+                'unique_together': {('report', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+def set_finished_phases(apps, schema_editor):
+    Report = apps.get_model("reports", "Report")
+    Report.objects.filter(is_ready=True).update(phase="done")
+    Report.objects.filter(is_failed=True).update(phase="failed")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0006_reportpartition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='bytes_written',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='phase',
+            field=models.CharField(choices=[('queued', 'Queued'), ('writing', 'Writing rows'), ('merging', 'Merging partitions'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='rows_processed',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='rows_total',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_finished_phases, migrations.RunPython.noop),
+    ]
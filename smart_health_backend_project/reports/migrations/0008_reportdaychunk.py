@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0007_report_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportDayChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(choices=[('appointments', 'Appointments'), ('finance', 'Finance'), ('users', 'Users')], max_length=50)),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel'), ('pdf', 'PDF')], max_length=10)),
+                ('day', models.DateField()),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/days/')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['report_type', 'file_format', 'day'],
+                'unique_together': {('report_type', 'file_format', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_standard_schedules(apps, schema_editor):
+    ReportSchedule = apps.get_model("reports", "ReportSchedule")
+    ReportSchedule.objects.bulk_create([
+        ReportSchedule(report_type=report_type, file_format="csv", frequency=frequency)
+        for report_type in ("appointments", "finance", "users")
+        for frequency in ("daily", "weekly", "monthly")
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0008_reportdaychunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(choices=[('appointments', 'Appointments'), ('finance', 'Finance'), ('users', 'Users')], max_length=50)),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel'), ('pdf', 'PDF')], default='csv', max_length=10)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('last_period_end', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reports.report')),
+            ],
+            options={
+                'ordering': ['report_type', 'file_format', 'frequency'],
+                'unique_together': {('report_type', 'file_format', 'frequency')},
+            },
+        ),
+        migrations.RunPython(create_standard_schedules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0009_reportschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='notify_emails',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0010_report_notify_emails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportdaychunk',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
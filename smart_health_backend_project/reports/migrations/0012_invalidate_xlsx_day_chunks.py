@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def invalidate_xlsx_day_chunks(apps, schema_editor):
+    # XLSX day chunks are now stored as typed CSV parts; stored XLSX ones are
+    # recomputed, and their files go with the next retention run
+    ReportDayChunk = apps.get_model("reports", "ReportDayChunk")
+    ReportDayChunk.objects.filter(file_format="xlsx").update(
+        version=F("version") + 1, rows=0, content_hash="", file="",
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0011_reportdaychunk_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(invalidate_xlsx_day_chunks, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,10 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from .utils.date_utils import previous_period
 
 
 class Report(models.Model):
@@ -9,7 +14,32 @@ class Report(models.Model):
         ("users", "Users"),
     )
 
+    FORMAT_CSV = "csv"
+    FORMAT_XLSX = "xlsx"
+    FORMAT_PDF = "pdf"
+
+    FILE_FORMATS = (
+        (FORMAT_CSV, "CSV"),
+        (FORMAT_XLSX, "Excel"),
+        (FORMAT_PDF, "PDF"),
+    )
+
+    PHASE_QUEUED = "queued"
+    PHASE_WRITING = "writing"
+    PHASE_MERGING = "merging"
+    PHASE_DONE = "done"
+    PHASE_FAILED = "failed"
+
+    PHASES = (
+        (PHASE_QUEUED, "Queued"),
+        (PHASE_WRITING, "Writing rows"),
+        (PHASE_MERGING, "Merging partitions"),
+        (PHASE_DONE, "Done"),
+        (PHASE_FAILED, "Failed"),
+    )
+
     report_type = models.CharField(max_length=50, choices=REPORT_TYPES)
+    file_format = models.CharField(max_length=10, choices=FILE_FORMATS, default=FORMAT_CSV)
     date_from = models.DateField()
     date_to = models.DateField()
 
@@ -27,9 +57,54 @@ class Report(models.Model):
     )
 
     is_ready = models.BooleanField(default=False)
+    is_failed = models.BooleanField(default=False)
+    # Requesters whose identical request was deduplicated onto this report
+    # while it was still being generated; emailed once it is ready
+    notify_emails = models.JSONField(default=list, blank=True)
+
+    # sha256 of the report's rows; reports with equal hashes share one stored file
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    # Progress, updated by the generating task(s)
+    phase = models.CharField(max_length=10, choices=PHASES, default=PHASE_QUEUED)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    rows_total = models.PositiveBigIntegerField(null=True, blank=True)
+    bytes_written = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["report_type", "file_format", "date_from", "date_to"],
+                name="report_dedup_idx",
+            ),
+        ]
+
+    @property
+    def eta_seconds(self):
+        """Seconds left at the average rate so far, or None when it cannot be estimated."""
+        if self.finished_at or not self.started_at or not self.rows_total or not self.rows_processed:
+            return None
+        elapsed = (timezone.now() - self.started_at).total_seconds()
+        remaining = max(self.rows_total - self.rows_processed, 0)
+        return round(elapsed / self.rows_processed * remaining, 1)
+
+    @property
+    def is_lost(self):
+        """Unfinished for longer than REPORT_DEDUP_INFLIGHT_TIMEOUT: its worker is assumed dead."""
+        timeout = getattr(settings, "REPORT_DEDUP_INFLIGHT_TIMEOUT", 3600)
+        return (
+            not self.is_ready and not self.is_failed
+            and self.created_at < timezone.now() - timedelta(seconds=timeout)
+        )
+
+    @property
+    def download_name(self):
+        return f"{self.report_type}_report_{self.id}.{self.file_format}"
+
     def __str__(self):
         return f"{self.report_type} ({self.date_from} → {self.date_to})"
 
@@ -243,3 +318,126 @@ class Report(models.Model):
 
 
 
+
+
+class ReportPartition(models.Model):
+    """One slice of a report's date range, generated by its own task and merged afterwards."""
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name="partitions")
+    index = models.PositiveIntegerField()
+    date_from = models.DateField()
+    date_to = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    rows = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, blank=True)
+
+    # Intermediate output; deleted once the report has been merged
+    file = models.FileField(upload_to="reports/parts/", null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["report", "index"]
+        unique_together = ("report", "index")
+
+    def __str__(self):
+        return f"{self.report_id}#{self.index} ({self.date_from} → {self.date_to})"
+
+
+class ReportDayChunk(models.Model):
+    """
+    One closed day of a report's rows, kept so reports over overlapping
+    windows only compute the days they do not share. An empty
+    ``content_hash`` means the day still has to be computed; writes to the
+    day clear it and bump ``version`` (see reports/signals.py).
+    """
+
+    report_type = models.CharField(max_length=50, choices=Report.REPORT_TYPES)
+    file_format = models.CharField(max_length=10, choices=Report.FILE_FORMATS)
+    day = models.DateField()
+    rows = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, blank=True)
+    file = models.FileField(upload_to="reports/days/", null=True, blank=True)
+    # Bumped by every store and invalidation; a chunk is only stored when it
+    # is unchanged since before its rows were read
+    version = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["report_type", "file_format", "day"]
+        unique_together = ("report_type", "file_format", "day")
+
+    def __str__(self):
+        return f"{self.report_type} {self.day} ({self.file_format})"
+
+
+class ReportSchedule(models.Model):
+    """
+    A standard report generated off-peak for every period that closes, so
+    requests for that period are answered with the pre-built file (see
+    reports.tasks.run_report_schedules_task).
+    """
+
+    FREQUENCY_DAILY = "daily"
+    FREQUENCY_WEEKLY = "weekly"
+    FREQUENCY_MONTHLY = "monthly"
+
+    FREQUENCIES = (
+        (FREQUENCY_DAILY, "Daily"),
+        (FREQUENCY_WEEKLY, "Weekly"),
+        (FREQUENCY_MONTHLY, "Monthly"),
+    )
+
+    report_type = models.CharField(max_length=50, choices=Report.REPORT_TYPES)
+    file_format = models.CharField(max_length=10, choices=Report.FILE_FORMATS, default=Report.FORMAT_CSV)
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES)
+    is_active = models.BooleanField(default=True)
+
+    # End of the latest period a report was started for
+    last_period_end = models.DateField(null=True, blank=True)
+    last_report = models.ForeignKey(
+        Report,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["report_type", "file_format", "frequency"]
+        unique_together = ("report_type", "file_format", "frequency")
+
+    def due_periods(self, today=None):
+        """
+        Periods whose report should be started now: the period of the last
+        report when that report failed or was lost, then the latest closed
+        period unless its report was already started.
+        """
+        periods = []
+        report = self.last_report
+        if report is not None and (report.is_failed or report.is_lost):
+            periods.append((report.date_from, report.date_to))
+
+        start, end = previous_period(self.frequency, today or timezone.localdate())
+        if not self.last_period_end or self.last_period_end < end:
+            periods.append((start, end))
+        return periods
+
+    def __str__(self):
+        return f"{self.get_frequency_display()} {self.report_type} ({self.file_format})"
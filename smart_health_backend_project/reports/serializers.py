@@ -8,6 +8,7 @@ class ReportSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "report_type",
+            "file_format",
             "date_from",
             "date_to",
             "is_ready",
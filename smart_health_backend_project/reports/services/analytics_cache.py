@@ -0,0 +1,151 @@
+import logging
+import threading
+import uuid
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from .analytics_service import AnalyticsService
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsSnapshotCache:
+    """
+    Caches AnalyticsService snapshots (appointments, finance, users).
+
+    Snapshots of closed windows (ending before today) are cached with no
+    expiry; windows that include today expire after
+    ``ANALYTICS_CACHE_TODAY_TTL`` seconds. Writes are invalidated through two
+    version tokens that are part of every key:
+
+    * the *current* version changes on any write and invalidates windows
+      that include today;
+    * the *history* version changes only when a write touches a past date
+      (e.g. editing an old appointment) and invalidates every window.
+
+    A booking made today therefore leaves last month's snapshot untouched.
+
+    Version tokens only reach every process through a shared backend
+    (``CACHE_URL``). On a process-local backend (local memory, dummy)
+    closed windows expire after ``ANALYTICS_CACHE_LOCAL_TTL`` seconds
+    instead, so a write handled elsewhere is picked up eventually.
+    """
+
+    LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+    KEY_PREFIX = "analytics:snapshot:"
+    CURRENT_VERSION_KEY = "analytics:version:current"
+    HISTORY_VERSION_KEY = "analytics:version:history"
+
+    def __init__(self, backend_alias="default", today_ttl=30, enabled=True, local_ttl=300):
+        self.backend_alias = backend_alias
+        self.today_ttl = today_ttl
+        self.enabled = enabled
+        self.local_ttl = local_ttl
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            backend_alias=getattr(settings, "ANALYTICS_CACHE_BACKEND", "default"),
+            today_ttl=getattr(settings, "ANALYTICS_CACHE_TODAY_TTL", 30),
+            enabled=getattr(settings, "ANALYTICS_CACHE_ENABLED", True),
+            local_ttl=getattr(settings, "ANALYTICS_CACHE_LOCAL_TTL", 300),
+        )
+
+    @property
+    def cache(self):
+        return caches[self.backend_alias]
+
+    def closed_ttl(self):
+        """Timeout for closed windows: none on a shared backend, ``local_ttl`` on a per-process one."""
+        return self.local_ttl if isinstance(self.cache, self.LOCAL_BACKENDS) else None
+
+    def _version(self, key):
+        version = self.cache.get(key)
+        if version is None:
+            # add() so concurrent workers agree on one token
+            self.cache.add(key, uuid.uuid4().hex, timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    def make_key(self, period: str, start: date, end: date, today: date) -> str:
+        key = f"{self.KEY_PREFIX}{self._version(self.HISTORY_VERSION_KEY)}:"
+        if end >= today:
+            key += f"{self._version(self.CURRENT_VERSION_KEY)}:"
+        return f"{key}{period}:{start.isoformat()}:{end.isoformat()}"
+
+    @staticmethod
+    def compute(start: date, end: date) -> dict:
+        return {
+            "appointments": AnalyticsService.appointment_stats(start, end),
+            "finance": AnalyticsService.financial_stats(start, end),
+            "users": AnalyticsService.user_activity_stats(start, end),
+        }
+
+    def snapshot(self, period: str, start: date, end: date) -> dict:
+        """Returns the cached snapshot for the window, computing it on a miss."""
+        if not self.enabled:
+            return self.compute(start, end)
+
+        today = timezone.localdate()
+        key = self.make_key(period, start, end, today)
+        data = self.cache.get(key)
+        if data is not None:
+            with self._lock:
+                self.hits += 1
+            return data
+
+        with self._lock:
+            self.misses += 1
+        data = self.compute(start, end)
+        self.cache.set(key, data, timeout=self.today_ttl if end >= today else self.closed_ttl())
+        return data
+
+    def invalidate(self, *moments):
+        """
+        Called on writes with the dates/datetimes the change affects.
+        Past dates drop every snapshot, today's changes only the open windows.
+        """
+        today = timezone.localdate()
+        touches_history = False
+        for moment in moments:
+            if moment is None:
+                continue
+            if hasattr(moment, "hour"):
+                moment = timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+            touches_history = touches_history or moment < today
+
+        try:
+            self.cache.set(self.CURRENT_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            if touches_history:
+                self.cache.set(self.HISTORY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        except Exception:
+            logger.exception("Failed to invalidate analytics snapshots")
+            return
+
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+analytics_cache = AnalyticsSnapshotCache.from_settings()
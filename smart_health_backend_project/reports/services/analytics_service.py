@@ -1,8 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import Q, Sum
 from datetime import date
 
 from appointments.models import Appointment
+from common.aggregation_utils import conditional_counts, counts_by_value
 
 try:
     from payments.models import Payment
@@ -20,12 +21,9 @@ class AnalyticsService:
         if hasattr(Appointment, "created_at"):
             qs = qs.filter(created_at__range=[start, end])
 
-        return {
-            "total": qs.count(),
-            "completed": qs.filter(status="completed").count(),
-            "cancelled": qs.filter(status="cancelled").count(),
-            "pending": qs.filter(status="pending").count(),
-        }
+        return counts_by_value(
+            qs, "status", ["completed", "cancelled", "pending"], total_key="total"
+        )
 
     @staticmethod
     def financial_stats(start: date, end: date) -> dict:
@@ -42,10 +40,10 @@ class AnalyticsService:
 
     @staticmethod
     def user_activity_stats(start: date, end: date) -> dict:
-        return {
-            "new_users": User.objects.filter(date_joined__range=[start, end]).count(),
-            "active_users": User.objects.filter(last_login__range=[start, end]).count(),
-        }
+        return conditional_counts(User.objects.all(), {
+            "new_users": Q(date_joined__range=[start, end]),
+            "active_users": Q(last_login__range=[start, end]),
+        })
 
 
 
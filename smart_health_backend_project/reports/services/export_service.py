@@ -0,0 +1,153 @@
+import csv
+import zlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from appointments.models import Appointment
+from doctors.models import Diagnosis
+from .report_datasets import REPORT_COLUMNS
+
+User = get_user_model()
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+class ExportError(ValueError):
+    pass
+
+
+class CSVExportService:
+    """
+    Row sources and filters for the streaming CSV export endpoint.
+
+    Filters mirror the Django admin list views of each model:
+    ``list_filter`` fields as exact-match query parameters, ``search_fields``
+    through ``search``, and a ``date_from``/``date_to`` range on the
+    dataset's date field.
+    """
+
+    DATASETS = {
+        "appointments": {
+            "queryset": lambda: Appointment.objects.all(),
+            "columns": REPORT_COLUMNS["appointments"],
+            "filters": {"status": "status", "doctor": "doctor_id", "patient": "patient_id"},
+            "search_fields": ("patient__user__username", "doctor__user__username"),
+            "date_field": "date",
+        },
+        "diagnoses": {
+            "queryset": lambda: Diagnosis.objects.all(),
+            "columns": [
+                ("id", "ID"),
+                ("appointment_id", "Appointment"),
+                ("appointment__date", "Appointment Date"),
+                ("appointment__doctor__user__username", "Doctor"),
+                ("appointment__patient__user__username", "Patient"),
+                ("diagnosis", "Diagnosis"),
+                ("notes", "Notes"),
+                ("created_at", "Created At"),
+            ],
+            "filters": {"doctor": "appointment__doctor_id", "patient": "appointment__patient_id"},
+            "search_fields": ("diagnosis", "notes", "appointment__patient__user__username"),
+            "date_field": "created_at__date",
+        },
+        "users": {
+            "queryset": lambda: User.objects.all(),
+            "columns": REPORT_COLUMNS["users"],
+            "filters": {"role": "role", "is_staff": "is_staff", "is_active": "is_active"},
+            "search_fields": ("email", "username"),
+            "date_field": "date_joined__date",
+        },
+    }
+
+    BOOLEAN_VALUES = {"1": True, "true": True, "yes": True, "0": False, "false": False, "no": False}
+
+    @classmethod
+    def get_dataset(cls, name):
+        try:
+            return cls.DATASETS[name]
+        except KeyError:
+            raise ExportError(f"Unknown dataset. Allowed: {', '.join(cls.DATASETS)}.")
+
+    @classmethod
+    def filtered_queryset(cls, name, params):
+        dataset = cls.get_dataset(name)
+        qs = dataset["queryset"]()
+
+        for param, lookup in dataset["filters"].items():
+            value = params.get(param)
+            if value in (None, ""):
+                continue
+            if param.startswith("is_"):
+                if value.lower() not in cls.BOOLEAN_VALUES:
+                    raise ExportError(f"{param} must be true or false.")
+                value = cls.BOOLEAN_VALUES[value.lower()]
+            elif lookup.endswith("_id"):
+                try:
+                    value = int(value)
+                except ValueError:
+                    raise ExportError(f"{param} must be an id.")
+            qs = qs.filter(**{lookup: value})
+
+        for param, lookup in (("date_from", "gte"), ("date_to", "lte")):
+            value = params.get(param)
+            if not value:
+                continue
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                raise ExportError(f"{param} must be YYYY-MM-DD.")
+            qs = qs.filter(**{f"{dataset['date_field']}__{lookup}": day})
+
+        search = params.get("search", "").strip()
+        if search:
+            condition = Q()
+            for field in dataset["search_fields"]:
+                condition |= Q(**{f"{field}__icontains": search})
+            qs = qs.filter(condition)
+
+        return qs.order_by("pk")
+
+    @classmethod
+    def iter_csv(cls, name, qs, chunk_size=None):
+        """
+        Yields the header line, then one CSV line per row of ``qs`` (from
+        ``filtered_queryset``) read through a server-side cursor.
+        """
+        if chunk_size is None:
+            chunk_size = getattr(settings, "REPORT_ITERATOR_CHUNK_SIZE", 2000)
+
+        dataset = cls.get_dataset(name)
+        fields = [field for field, _ in dataset["columns"]]
+        writer = csv.writer(_Echo())
+
+        yield writer.writerow([header for _, header in dataset["columns"]])
+        for row in qs.values_list(*fields).iterator(chunk_size=chunk_size):
+            yield writer.writerow(row)
+
+    @staticmethod
+    def gzip_stream(chunks, level=6, min_flush=64 * 1024):
+        """Compresses an iterable of str chunks into gzip bytes on the fly."""
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        pending = 0
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode("utf-8"))
+            pending += len(chunk)
+            if data:
+                yield data
+            if pending >= min_flush:
+                # Push buffered output so the client keeps receiving bytes
+                flushed = compressor.flush(zlib.Z_SYNC_FLUSH)
+                pending = 0
+                if flushed:
+                    yield flushed
+        yield compressor.flush()
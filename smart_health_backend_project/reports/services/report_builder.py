@@ -0,0 +1,493 @@
+import csv
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from itertools import chain
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from reports.models import ReportDayChunk, ReportPartition
+from reports.utils.date_utils import split_date_range
+from reports.utils.export_utils import write_csv_rows, write_pdf_rows, write_xlsx_rows
+from .analytics_service import AnalyticsService
+from .report_datasets import report_column_loaders, report_headers, report_rows
+
+logger = logging.getLogger("reports")
+
+# report_type -> (summary template, analytics function filling its context)
+REPORT_TEMPLATES = {
+    "appointments": ("reporting/report_summary.html", AnalyticsService.appointment_stats),
+    "finance": ("reporting/financial_report.html", AnalyticsService.financial_stats),
+    "users": ("reporting/user_activity_report.html", AnalyticsService.user_activity_stats),
+}
+
+
+class _TemplateText(HTMLParser):
+    """Collects the heading and paragraph text of a rendered summary template."""
+
+    def __init__(self):
+        super().__init__()
+        self.title = ""
+        self.lines = []
+        self._tag = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("h1", "h2", "p"):
+            self._tag = tag
+            if tag == "p":
+                self.lines.append("")
+
+    def handle_endtag(self, tag):
+        if tag == self._tag:
+            self._tag = None
+
+    def handle_data(self, data):
+        if self._tag == "p":
+            self.lines[-1] += data.strip()
+        elif self._tag and not self.title:
+            self.title = data.strip()
+
+
+def report_summary(report):
+    """
+    Renders the report type's summary template and returns its title and
+    lines, so the PDF header shows the same figures as the HTML version.
+    """
+    template, stats = REPORT_TEMPLATES[report.report_type]
+    context = {
+        **stats(report.date_from, report.date_to),
+        "start_date": report.date_from,
+        "end_date": report.date_to,
+    }
+    parser = _TemplateText()
+    parser.feed(render_to_string(template, context))
+    period = f"Period: {report.date_from} to {report.date_to}"
+    return parser.title, [period] + [line for line in parser.lines if line]
+
+
+def write_report(report, path, on_progress=None, digest=None) -> int:
+    """
+    Writes the report's rows to ``path`` in its format; returns the row count.
+    When ``digest`` (a hashlib object) is given it is fed the format,
+    headers and every row as they are written.
+    """
+    headers = report_headers(report.report_type)
+    rows = report_rows(report.report_type, report.date_from, report.date_to)
+    if digest is not None:
+        digest.update(repr((report.file_format, headers)).encode("utf-8"))
+        rows = _hashed_rows(rows, digest)
+
+    if report.file_format == "xlsx":
+        return write_xlsx_rows(
+            path, headers, rows,
+            sheet_name=report.report_type.title(), on_progress=on_progress,
+        )
+
+    if report.file_format == "pdf":
+        title, summary = report_summary(report)
+        if digest is not None:
+            digest.update(repr((title, summary)).encode("utf-8"))
+        return write_pdf_rows(
+            path, headers, rows,
+            title=title, summary=summary, on_progress=on_progress,
+        )
+
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        return write_csv_rows(fh, headers, rows, on_progress=on_progress)
+
+
+def _hashed_rows(rows, digest):
+    for row in rows:
+        digest.update(repr(row).encode("utf-8"))
+        digest.update(b"\n")
+        yield row
+
+
+def _with_size(on_progress, path):
+    # Adapts on_progress(rows, bytes) to the writers' on_progress(rows);
+    # the size lags behind by whatever the writer still buffers
+    if on_progress is None:
+        return None
+    return lambda rows: on_progress(rows, os.path.getsize(path))
+
+
+def content_file_name(content_hash, file_format) -> str:
+    """Storage name (under the field's upload_to) shared by every report with this content."""
+    return f"sha256/{content_hash[:2]}/{content_hash}.{file_format}"
+
+
+def store_report_file(report, path):
+    """
+    Stores the finished file at ``path`` on ``report.file`` (not saved to
+    the database) under its content address, reusing an already stored
+    file with the same ``report.content_hash``.
+    """
+    name = content_file_name(report.content_hash, report.file_format)
+    stored_name = report.file.field.generate_filename(report, name)
+
+    if report.file.storage.exists(stored_name):
+        report.file.name = stored_name
+        logger.info("Report %s reuses stored file %s", report.id, stored_name)
+    else:
+        with open(path, "rb") as fh:
+            report.file.save(name, File(fh), save=False)
+
+
+def build_report_file(report, on_progress=None) -> int:
+    """
+    Generates the report (CSV, XLSX or PDF) into a temporary file and stores it on
+    ``report.file`` (not saved to the database). Only one chunk of rows is
+    in memory at a time. Returns the number of data rows.
+
+    ``on_progress(rows, bytes_written)`` is called periodically while rows
+    are written and once more when the file is complete.
+
+    Files are content-addressed: the name is the sha256 of the report's
+    rows, and when a file with that name is already stored the report
+    points at it instead of storing a second copy. Hashing rows rather
+    than file bytes keeps XLSX and PDF output, which embed creation
+    timestamps, shareable.
+    """
+    suffix = f".{report.file_format}"
+    fd, path = tempfile.mkstemp(prefix="report_", suffix=suffix)
+    os.close(fd)
+    digest = hashlib.sha256()
+    try:
+        rows = write_report(report, path, on_progress=_with_size(on_progress, path), digest=digest)
+        if on_progress:
+            on_progress(rows, os.path.getsize(path))
+        report.content_hash = digest.hexdigest()
+        store_report_file(report, path)
+    finally:
+        os.unlink(path)
+
+    logger.info("Report %s written: %s rows", report.id, rows)
+    return rows
+
+
+# -----------------------------
+# Partitioned generation
+# -----------------------------
+# Long CSV/XLSX reports are split into month (or week) partitions that are
+# written by separate tasks in parallel, then concatenated in order.
+# Partitioned output is ordered by partition, then by primary key, and its
+# content hash is taken over the partitions' hashes. Parts of XLSX reports
+# are CSV files of str(value) (None as \N), parsed back with the dataset's
+# column loaders, so the merged cells match a single-pass build; reading
+# an XLSX part would turn dates into datetimes and decimals into floats.
+
+# Marks None in XLSX parts; a string value starting with a backslash gets one more
+PART_NULL = "\\N"
+
+
+def part_suffix(file_format) -> str:
+    return ".xlsx.csv" if file_format == "xlsx" else f".{file_format}"
+
+def partition_report(report):
+    """
+    Replaces the report's partitions with one per month/week of its date
+    range and returns them, or returns [] when the report should be
+    generated in a single task (short ranges, PDF output).
+    """
+    min_days = getattr(settings, "REPORT_PARTITION_MIN_DAYS", 62)
+    if report.file_format == "pdf" or (report.date_to - report.date_from).days + 1 < min_days:
+        return []
+
+    ranges = split_date_range(
+        report.date_from, report.date_to, getattr(settings, "REPORT_PARTITION_UNIT", "month")
+    )
+    if len(ranges) < 2:
+        return []
+
+    # A retried task starts over
+    for partition in report.partitions.exclude(file=""):
+        partition.file.delete(save=False)
+    report.partitions.all().delete()
+
+    return ReportPartition.objects.bulk_create([
+        ReportPartition(report=report, index=index, date_from=start, date_to=end)
+        for index, (start, end) in enumerate(ranges)
+    ])
+
+
+def _write_part(report_type, file_format, start, end, path, on_progress=None):
+    """
+    Writes the rows between ``start`` and ``end`` to ``path`` as a part
+    for ``merge_partition_files``: CSV without a header row, with typed
+    values for XLSX reports. Returns the row count and the rows' content
+    hash.
+    """
+    digest = hashlib.sha256()
+    rows = _hashed_rows(report_rows(report_type, start, end), digest)
+    callback = _with_size(on_progress, path)
+    if file_format == "xlsx":
+        rows = (_dump_part_row(row) for row in rows)
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        count = write_csv_rows(fh, None, rows, on_progress=callback)
+    if on_progress:
+        on_progress(count, os.path.getsize(path))
+    return count, digest.hexdigest()
+
+
+def build_partition_file(partition, on_progress=None) -> int:
+    """
+    Writes one partition's rows and stores them on ``partition.file`` with
+    the row count and content hash (not saved to the database).
+    ``on_progress`` works as in ``build_report_file``. Returns the number
+    of rows.
+    """
+    report = partition.report
+    suffix = part_suffix(report.file_format)
+    fd, path = tempfile.mkstemp(prefix="report_part_", suffix=suffix)
+    os.close(fd)
+    try:
+        count, content_hash = _write_part(
+            report.report_type, report.file_format, partition.date_from, partition.date_to, path, on_progress
+        )
+        with open(path, "rb") as fh:
+            partition.file.save(f"{report.id}_{partition.index}{suffix}", File(fh), save=False)
+    finally:
+        os.unlink(path)
+
+    partition.rows = count
+    partition.content_hash = content_hash
+    return count
+
+
+def merge_partition_files(report, partitions) -> int:
+    """
+    Concatenates the partition files, in order, into the report's file and
+    stores it on ``report.file`` (not saved to the database). CSV parts are
+    copied byte for byte after one header row; XLSX parts are parsed back
+    row by row into a new write-only workbook. Parts without rows may have
+    no file. Returns the number of rows.
+    """
+    headers = report_headers(report.report_type)
+    digest = hashlib.sha256(repr((report.file_format, headers)).encode("utf-8"))
+    for partition in partitions:
+        digest.update(partition.content_hash.encode("ascii"))
+
+    suffix = f".{report.file_format}"
+    fd, path = tempfile.mkstemp(prefix="report_", suffix=suffix)
+    os.close(fd)
+    try:
+        if report.file_format == "xlsx":
+            loaders = report_column_loaders(report.report_type)
+            rows = write_xlsx_rows(
+                path, headers, chain.from_iterable(_load_part_rows(p, loaders) for p in partitions if p.rows),
+                sheet_name=report.report_type.title(),
+            )
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as fh:
+                write_csv_rows(fh, headers, [])
+            with open(path, "ab") as out:
+                for partition in partitions:
+                    if not partition.rows:
+                        continue
+                    with partition.file.open("rb") as part:
+                        shutil.copyfileobj(part, out, 1024 * 1024)
+            rows = sum(partition.rows for partition in partitions)
+
+        report.content_hash = digest.hexdigest()
+        store_report_file(report, path)
+    finally:
+        os.unlink(path)
+
+    logger.info("Report %s merged from %s partitions: %s rows", report.id, len(partitions), rows)
+    return rows
+
+
+def _dump_part_row(row):
+    return [_dump_part_value(value) for value in row]
+
+
+def _dump_part_value(value):
+    if value is None:
+        return PART_NULL
+    if isinstance(value, str):
+        return "\\" + value if value.startswith("\\") else value
+    return str(value)
+
+
+def _load_part_rows(part, loaders):
+    with part.file.open("rb") as fh:
+        for row in csv.reader(io.TextIOWrapper(fh, encoding="utf-8", newline="")):
+            yield tuple(_load_part_value(value, load) for value, load in zip(row, loaders))
+
+
+def _load_part_value(value, load):
+    if value == PART_NULL:
+        return None
+    if value.startswith("\\"):
+        return value[1:]
+    return load(value)
+
+
+# -----------------------------
+# Incremental generation
+# -----------------------------
+# Each closed day of a CSV/XLSX report is stored once as a ReportDayChunk,
+# keyed by report type, format and day, and shared by every later report
+# covering that day. Only days without a fresh chunk, and days that are not
+# over yet, are queried. Writes bump the version of the chunks of the days
+# they touch (reports/signals.py); a chunk is only stored if its version is
+# unchanged since before its rows were read, so a write racing with the
+# read cannot leave a stale chunk behind. Chunks older than
+# REPORT_DAY_CHUNK_MAX_AGE are recomputed, which also bounds how long
+# changes to related rows (e.g. a renamed doctor) go unnoticed. A replaced
+# chunk file may still be read by a merge under way, so it is left for
+# purge_expired_reports to delete. Output is ordered by day, then by
+# primary key.
+
+def use_incremental(report) -> bool:
+    return getattr(settings, "REPORT_INCREMENTAL_ENABLED", True) and report.file_format != "pdf"
+
+
+def build_incremental_report_file(report, on_progress=None) -> int:
+    """
+    Stitches the report from per-day chunks into ``report.file`` (not
+    saved to the database), computing only the days that have no fresh
+    stored chunk. Days before today are stored as chunks for later reports;
+    today and later days are written to temporary parts and discarded.
+    ``on_progress`` works as in ``build_report_file``. Returns the number
+    of rows.
+    """
+    today = timezone.localdate()
+    fresh_after = timezone.now() - timedelta(seconds=getattr(settings, "REPORT_DAY_CHUNK_MAX_AGE", 24 * 3600))
+    suffix = part_suffix(report.file_format)
+    chunks = {
+        chunk.day: chunk
+        for chunk in ReportDayChunk.objects.filter(
+            report_type=report.report_type, file_format=report.file_format,
+            day__range=[report.date_from, report.date_to],
+        )
+    }
+
+    parts, open_parts = [], []
+    rows = computed = size = 0
+    try:
+        day = report.date_from
+        while day <= report.date_to:
+            chunk = chunks.get(day)
+            if chunk is not None and chunk.content_hash and chunk.updated_at >= fresh_after:
+                part = chunk
+                size += chunk.file.size if chunk.file else 0
+            else:
+                if chunk is None and day < today:
+                    # Exists before the rows are read, so a write from now on bumps its version
+                    chunk, _ = ReportDayChunk.objects.get_or_create(
+                        report_type=report.report_type, file_format=report.file_format, day=day
+                    )
+                fd, path = tempfile.mkstemp(prefix="report_day_", suffix=suffix)
+                os.close(fd)
+                count, content_hash = _write_part(report.report_type, report.file_format, day, day, path)
+                size += os.path.getsize(path)
+                part = None
+                if day < today:
+                    try:
+                        part = _store_day_chunk(chunk, path, count, content_hash)
+                    except Exception:
+                        os.unlink(path)
+                        raise
+                if part is None:
+                    part = _OpenDayPart(path, count, content_hash)
+                    open_parts.append(part)
+                else:
+                    os.unlink(path)
+                computed += 1
+            parts.append(part)
+            rows += part.rows
+            if on_progress:
+                # The output is only written by the merge; its parts so far approximate it
+                on_progress(rows, size)
+            day += timedelta(days=1)
+
+        merge_partition_files(report, parts)
+    finally:
+        for part in open_parts:
+            part.close()
+
+    if on_progress:
+        on_progress(rows, report.file.size)
+    logger.info("Report %s stitched from %s days (%s computed): %s rows", report.id, len(parts), computed, rows)
+    return rows
+
+
+class _OpenDayPart:
+    """A day held in a temporary file for the merge only: not over yet, or changed while it was read."""
+
+    def __init__(self, path, rows, content_hash):
+        self.path = path
+        self.rows = rows
+        self.content_hash = content_hash
+        self.file = File(open(path, "rb"), name=path)
+
+    def close(self):
+        self.file.close()
+        os.unlink(self.path)
+
+
+def _store_day_chunk(chunk, path, rows, content_hash):
+    """
+    Stores the day's file on ``chunk`` unless its version moved on since
+    ``chunk`` was read (a write touched the day, or another report stored
+    it). Returns the stored chunk, or None when the rows may be stale.
+    The file it replaces is left for the retention pass.
+    """
+    storage = chunk.file.storage
+    name = ""
+    if rows:
+        with open(path, "rb") as fh:
+            name = storage.save(
+                chunk.file.field.generate_filename(
+                    chunk, f"{chunk.report_type}_{chunk.day:%Y%m%d}{part_suffix(chunk.file_format)}"
+                ),
+                File(fh),
+            )
+
+    now = timezone.now()
+    stored = ReportDayChunk.objects.filter(pk=chunk.pk, version=chunk.version).update(
+        version=F("version") + 1, rows=rows, content_hash=content_hash, file=name, updated_at=now,
+    )
+    if not stored:
+        if name:
+            storage.delete(name)
+        return None
+
+    chunk.version += 1
+    chunk.rows, chunk.content_hash, chunk.file.name, chunk.updated_at = rows, content_hash, name, now
+    return chunk
+
+
+def invalidate_day_chunks(report_type, *values):
+    """
+    Marks the stored chunks, in every format, for the days of ``values``
+    (dates or datetimes; None is ignored) as missing and bumps their
+    version, so the next report recomputes them and a computation already
+    under way does not store its rows. Their files are deleted once the
+    write commits; a rolled back write keeps them.
+    """
+    days = set()
+    for value in values:
+        if isinstance(value, datetime):
+            value = timezone.localdate(value) if timezone.is_aware(value) else value.date()
+        if value is not None:
+            days.add(value)
+    if not days:
+        return
+
+    chunks = ReportDayChunk.objects.filter(report_type=report_type, day__in=days)
+    names = list(chunks.exclude(file="").values_list("file", flat=True))
+    chunks.update(version=F("version") + 1, rows=0, content_hash="", file="", updated_at=timezone.now())
+    storage = ReportDayChunk._meta.get_field("file").storage
+    transaction.on_commit(lambda: [storage.delete(name) for name in names])
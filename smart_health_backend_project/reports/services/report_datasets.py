@@ -0,0 +1,113 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from appointments.models import Appointment
+from .analytics_service import Payment
+
+User = get_user_model()
+
+
+# report_type -> [(values_list field, column header), ...]
+REPORT_COLUMNS = {
+    "appointments": [
+        ("id", "ID"),
+        ("date", "Date"),
+        ("time", "Time"),
+        ("status", "Status"),
+        ("doctor__user__username", "Doctor"),
+        ("doctor__specialization", "Specialization"),
+        ("patient__user__username", "Patient"),
+        ("created_at", "Booked At"),
+    ],
+    "finance": [
+        ("id", "ID"),
+        ("amount", "Amount"),
+        ("timestamp", "Timestamp"),
+    ],
+    "users": [
+        ("id", "ID"),
+        ("username", "Username"),
+        ("email", "Email"),
+        ("role", "Role"),
+        ("is_active", "Active"),
+        ("date_joined", "Joined"),
+        ("last_login", "Last Login"),
+    ],
+}
+
+
+# Model field type -> parser for the value's str(); other types stay strings
+FIELD_LOADERS = {
+    "AutoField": int,
+    "BigAutoField": int,
+    "IntegerField": int,
+    "BigIntegerField": int,
+    "SmallIntegerField": int,
+    "PositiveIntegerField": int,
+    "PositiveSmallIntegerField": int,
+    "FloatField": float,
+    "DecimalField": Decimal,
+    "BooleanField": lambda value: value == "True",
+    "DateField": date.fromisoformat,
+    "DateTimeField": datetime.fromisoformat,
+    "TimeField": time.fromisoformat,
+}
+
+
+def report_queryset(report_type: str, start: date, end: date):
+    """Rows of the report ordered by primary key, or None when the source model is missing."""
+    if report_type == "appointments":
+        qs = Appointment.objects.filter(date__range=[start, end])
+    elif report_type == "users":
+        qs = User.objects.filter(date_joined__date__range=[start, end])
+    elif report_type == "finance":
+        if Payment is None:
+            return None
+        qs = Payment.objects.filter(timestamp__date__range=[start, end])
+    else:
+        raise ValueError(f"Unknown report type: {report_type}")
+    return qs.order_by("pk")
+
+
+def report_headers(report_type: str) -> list:
+    return [header for _, header in REPORT_COLUMNS[report_type]]
+
+
+def report_column_loaders(report_type: str) -> list:
+    """
+    One parser per column turning ``str(value)`` back into the value the
+    database returned, found from the model field behind the column.
+    """
+    source = {"appointments": Appointment, "users": User, "finance": Payment}[report_type]
+    loaders = []
+    for path, _ in REPORT_COLUMNS[report_type]:
+        model, field = source, None
+        for name in path.split("__"):
+            if model is None:
+                break
+            field = model._meta.get_field(name)
+            model = field.related_model
+        loaders.append(FIELD_LOADERS.get(field.get_internal_type(), str) if field else str)
+    return loaders
+
+
+def report_rows(report_type: str, start: date, end: date, chunk_size=None):
+    """
+    Yields report rows as tuples straight from the database cursor.
+
+    ``values_list`` skips model instantiation and ``iterator`` fetches
+    ``chunk_size`` rows at a time (a server-side cursor on PostgreSQL), so
+    memory use does not depend on the size of the report.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, "REPORT_ITERATOR_CHUNK_SIZE", 2000)
+
+    qs = report_queryset(report_type, start, end)
+    if qs is None:
+        return iter(())
+
+    fields = [field for field, _ in REPORT_COLUMNS[report_type]]
+    return qs.values_list(*fields).iterator(chunk_size=chunk_size)
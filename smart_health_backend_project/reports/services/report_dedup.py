@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from reports.models import Report
+
+
+def is_closed_period(date_to) -> bool:
+    """A period that ended before today; its rows are not expected to change."""
+    return date_to < timezone.localdate()
+
+
+def find_reusable_report(report_type, file_format, date_from, date_to, exclude=None, ready_only=False):
+    """
+    Returns an existing report with the same type, format and closed period
+    that is either ready or still being generated, so a new request can
+    point at it instead of generating the same file again.
+
+    In-flight reports older than ``REPORT_DEDUP_INFLIGHT_TIMEOUT`` seconds
+    are ignored, in case their worker died without marking them failed.
+    Returns None when deduplication is disabled or nothing matches.
+    """
+    if not getattr(settings, "REPORT_DEDUP_ENABLED", True) or not is_closed_period(date_to):
+        return None
+
+    qs = Report.objects.filter(
+        report_type=report_type,
+        file_format=file_format,
+        date_from=date_from,
+        date_to=date_to,
+        is_failed=False,
+    )
+    if exclude is not None:
+        qs = qs.exclude(pk=exclude)
+
+    ready = qs.filter(is_ready=True).exclude(file="").order_by("-created_at").first()
+    if ready or ready_only:
+        return ready
+
+    timeout = getattr(settings, "REPORT_DEDUP_INFLIGHT_TIMEOUT", 3600)
+    return (
+        qs.filter(is_ready=False, created_at__gte=timezone.now() - timedelta(seconds=timeout))
+        .order_by("created_at")
+        .first()
+    )
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMessage
+from django.utils import timezone
+
+_SALT = "reports.download"
+
+
+def make_download_token(report) -> str:
+    """Signed, timestamped token naming the report; see ``read_download_token``."""
+    return signing.TimestampSigner(salt=_SALT).sign(str(report.id))
+
+
+def read_download_token(token) -> int:
+    """
+    Returns the report id in ``token``. Raises ``signing.SignatureExpired``
+    once the token is older than ``REPORT_LINK_MAX_AGE`` seconds and
+    ``signing.BadSignature`` when it was tampered with.
+    """
+    max_age = getattr(settings, "REPORT_LINK_MAX_AGE", 7 * 24 * 3600)
+    return int(signing.TimestampSigner(salt=_SALT).unsign(token, max_age=max_age))
+
+
+def download_link(report) -> str:
+    base_url = getattr(settings, "REPORT_LINK_BASE_URL", "http://localhost:8000").rstrip("/")
+    return f"{base_url}/api/reports/download/{make_download_token(report)}/"
+
+
+def build_report_email(report, email) -> EmailMessage:
+    """
+    Reports up to ``REPORT_EMAIL_ATTACHMENT_MAX_BYTES`` are attached;
+    larger ones get a signed link that expires after ``REPORT_LINK_MAX_AGE``
+    seconds, so big files are never read into memory or pushed through
+    the mail server.
+    """
+    max_bytes = getattr(settings, "REPORT_EMAIL_ATTACHMENT_MAX_BYTES", 5 * 1024 * 1024)
+    size = report.file.size
+
+    if size <= max_bytes:
+        msg = EmailMessage(
+            subject="Your report is ready",
+            body="Please find your report attached.",
+            to=[email],
+        )
+        with report.file.open("rb") as fh:
+            msg.attach(report.download_name, fh.read())
+        return msg
+
+    max_age = getattr(settings, "REPORT_LINK_MAX_AGE", 7 * 24 * 3600)
+    expires = timezone.localtime(timezone.now() + timedelta(seconds=max_age))
+    return EmailMessage(
+        subject="Your report is ready",
+        body=(
+            f"Your report ({report.download_name}, {size / 1024 / 1024:.1f} MB) is too large "
+            f"to attach. Download it here:\n\n{download_link(report)}\n\n"
+            f"The link expires on {expires:%Y-%m-%d %H:%M %Z}."
+        ),
+        to=[email],
+    )
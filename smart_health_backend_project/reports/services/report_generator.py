@@ -1,10 +1,14 @@
 import pandas as pd
 from django.template.loader import render_to_string
 from weasyprint import HTML
+from django.core.files import File
 from django.core.files.base import ContentFile
-from io import BytesIO
+from itertools import chain
 import logging
-from typing import List, Dict
+import tempfile
+from typing import Dict, Iterable, List
+
+from reports.utils.export_utils import write_xlsx_rows
 
 logger = logging.getLogger(__name__)
 
@@ -34,24 +38,35 @@ class ReportGenerator:
             raise RuntimeError(f"PDF generation failed: {e}") from e
 
     @staticmethod
-    def generate_excel(data: List[Dict], sheet_name: str = "Sheet1") -> ContentFile:
+    def generate_excel(data: Iterable[Dict], sheet_name: str = "Sheet1") -> File:
         """
-        Generates an Excel file from a list of dictionaries.
+        Generates an Excel file from an iterable of dictionaries.
+
+        Rows are streamed through a write-only workbook into a temporary
+        file, so ``data`` can be a generator and memory does not grow with
+        the number of rows. Sheets are split at Excel's row limit.
 
         Args:
-            data (List[Dict]): Data for Excel.
+            data (Iterable[Dict]): Data for Excel; the first row's keys are the headers.
             sheet_name (str): Optional sheet name.
 
         Returns:
-            ContentFile: Excel file content.
+            File: Excel file (positioned at the start) ready to save in a FileField.
         """
+        rows = iter(data)
+        first = next(rows, None)
+        headers = list(first) if first else []
+        output = tempfile.TemporaryFile()
         try:
-            df = pd.DataFrame(data)
-            with BytesIO() as output:
-                with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                    df.to_excel(writer, index=False, sheet_name=sheet_name)
-                return ContentFile(output.getvalue())
+            write_xlsx_rows(
+                output, headers,
+                ([row.get(h) for h in headers] for row in chain([first] if first else [], rows)),
+                sheet_name=sheet_name,
+            )
+            output.seek(0)
+            return File(output, name=f"{sheet_name}.xlsx")
         except Exception as e:
+            output.close()
             logger.error(f"Failed to generate Excel file: {e}")
             raise RuntimeError(f"Excel generation failed: {e}") from e
 
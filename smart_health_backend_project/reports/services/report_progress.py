@@ -0,0 +1,84 @@
+from django.db.models import F
+from django.utils import timezone
+
+from reports.models import Report, ReportPartition
+from .report_datasets import report_queryset
+
+PROGRESS_FIELDS = ["phase", "rows_processed", "rows_total", "bytes_written", "started_at", "finished_at"]
+
+
+def mark_started(report):
+    """Resets the progress counters and records the expected row count (one COUNT query)."""
+    qs = report_queryset(report.report_type, report.date_from, report.date_to)
+    report.phase = Report.PHASE_WRITING
+    report.rows_processed = 0
+    report.rows_total = qs.count() if qs is not None else 0
+    report.bytes_written = 0
+    report.started_at = timezone.now()
+    report.finished_at = None
+    report.save(update_fields=PROGRESS_FIELDS)
+
+
+def mark_phase(report_id, phase):
+    Report.objects.filter(id=report_id).update(phase=phase)
+
+
+def mark_finished(report, rows):
+    """Sets the final counters on ``report``; the caller saves PROGRESS_FIELDS."""
+    report.phase = Report.PHASE_DONE
+    report.rows_processed = rows
+    report.bytes_written = report.file.size if report.file else 0
+    report.finished_at = timezone.now()
+    if report.started_at is None:
+        report.started_at = report.finished_at
+
+
+def mark_failed(report_id):
+    Report.objects.filter(id=report_id).update(
+        is_failed=True, phase=Report.PHASE_FAILED, finished_at=timezone.now()
+    )
+
+
+class ProgressTracker:
+    """
+    ``on_progress(rows, bytes_written)`` callback for the report builder.
+
+    Adds what was written since its previous call to the report's
+    counters with F() updates, so several partition tasks can report into
+    the same report concurrently. With ``partition_id`` the partition's own
+    row count is kept current too.
+    """
+
+    def __init__(self, report_id, partition_id=None):
+        self.report_id = report_id
+        self.partition_id = partition_id
+        self.rows = 0
+        self.bytes = 0
+
+    def __call__(self, rows, bytes_written):
+        Report.objects.filter(id=self.report_id).update(
+            rows_processed=F("rows_processed") + (rows - self.rows),
+            bytes_written=F("bytes_written") + (bytes_written - self.bytes),
+        )
+        if self.partition_id is not None:
+            ReportPartition.objects.filter(id=self.partition_id).update(rows=rows)
+        self.rows, self.bytes = rows, bytes_written
+
+
+def progress_data(report) -> dict:
+    percent = None
+    if report.rows_total:
+        percent = round(min(report.rows_processed / report.rows_total, 1) * 100, 1)
+    elif report.phase == Report.PHASE_DONE:
+        percent = 100.0
+
+    return {
+        "phase": report.phase,
+        "rows_processed": report.rows_processed,
+        "rows_total": report.rows_total,
+        "percent": percent,
+        "bytes_written": report.bytes_written,
+        "started_at": report.started_at,
+        "finished_at": report.finished_at,
+        "eta_seconds": report.eta_seconds,
+    }
@@ -0,0 +1,100 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from reports.models import Report, ReportDayChunk, ReportPartition, ReportSchedule
+
+logger = logging.getLogger(__name__)
+
+
+def purge_expired_reports(now=None) -> dict:
+    """
+    Deletes reports created more than ``REPORT_RETENTION_DAYS`` ago, except
+    the latest report of each schedule, together with their partitions.
+    Report files are content-addressed and shared, so a file is only
+    removed once no remaining report points at it. Day chunks not
+    refreshed for ``REPORT_DAY_CHUNK_RETENTION_DAYS`` are dropped too; the
+    next report over those days recomputes them. Day chunk files no chunk
+    points at any more (replaced by a newer computation of the day) are
+    deleted once no report that could have read them is still running.
+
+    A report being generated can point at an existing stored file before
+    its row is saved (``store_report_file`` and the reuse path of
+    ``generate_report_task``), where no query can see it. Reports of a
+    type and format that is being generated are therefore left for a
+    later run, and the check is repeated just before files are deleted.
+
+    Returns how many reports, files and day chunks were deleted.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=getattr(settings, "REPORT_RETENTION_DAYS", 30))
+
+    keep = ReportSchedule.objects.exclude(last_report=None).values("last_report")
+    expired = Report.objects.filter(created_at__lt=cutoff).exclude(pk__in=keep)
+    for report_type, file_format in _in_flight(now):
+        expired = expired.exclude(report_type=report_type, file_format=file_format)
+    expired = list(expired.values_list("pk", "report_type", "file_format", "file"))
+    expired_ids = [pk for pk, _, _, _ in expired]
+
+    names = {name: (report_type, file_format) for _, report_type, file_format, name in expired if name}
+    part_names = list(
+        ReportPartition.objects.filter(report__in=expired_ids).exclude(file="").values_list("file", flat=True)
+    )
+    Report.objects.filter(pk__in=expired_ids).delete()
+
+    for name in Report.objects.filter(file__in=names).values_list("file", flat=True):
+        names.pop(name, None)
+    # Generation may have started meanwhile; such files stay (unreferenced) rather than vanish under it
+    in_flight = _in_flight(now)
+    names = [name for name, kind in names.items() if kind not in in_flight]
+    storage = Report._meta.get_field("file").storage
+    for name in [*names, *part_names]:
+        storage.delete(name)
+
+    chunk_cutoff = now - timedelta(days=getattr(settings, "REPORT_DAY_CHUNK_RETENTION_DAYS", 90))
+    chunks = ReportDayChunk.objects.filter(updated_at__lt=chunk_cutoff)
+    for chunk in chunks.exclude(file=""):
+        chunk.file.delete(save=False)
+    day_chunks, _ = chunks.delete()
+    orphans = _purge_replaced_day_files(now)
+
+    result = {
+        "reports": len(expired_ids),
+        "files": len(names) + len(part_names) + orphans,
+        "day_chunks": day_chunks,
+    }
+    logger.info("Report retention: %s", result)
+    return result
+
+
+def _in_flight(now):
+    """(report_type, file_format) pairs of reports still being generated."""
+    timeout = getattr(settings, "REPORT_DEDUP_INFLIGHT_TIMEOUT", 3600)
+    return set(
+        Report.objects.filter(
+            is_ready=False, is_failed=False, created_at__gte=now - timedelta(seconds=timeout)
+        ).values_list("report_type", "file_format")
+    )
+
+
+def _purge_replaced_day_files(now):
+    """Deletes day chunk files that no chunk references and no running report can still be merging."""
+    field = ReportDayChunk._meta.get_field("file")
+    storage = field.storage
+    directory = field.upload_to.rstrip("/")
+    if not storage.exists(directory):
+        return 0
+
+    grace = timedelta(seconds=getattr(settings, "REPORT_DEDUP_INFLIGHT_TIMEOUT", 3600))
+    _, files = storage.listdir(directory)
+    candidates = [f"{directory}/{name}" for name in files]
+    referenced = set(ReportDayChunk.objects.filter(file__in=candidates).values_list("file", flat=True))
+    deleted = 0
+    for name in candidates:
+        if name in referenced or storage.get_modified_time(name) > now - grace:
+            continue
+        storage.delete(name)
+        deleted += 1
+    return deleted
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from appointments.models import Appointment
+from .services.analytics_cache import analytics_cache
+from .services.analytics_service import Payment
+from .services.report_builder import invalidate_day_chunks
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_on_appointment_change(sender, instance, **kwargs):
+    analytics_cache.invalidate(instance.created_at)
+    # Appointment reports are by appointment date; a moved appointment
+    # leaves its old day too (remembered by appointments.signals)
+    previous = getattr(instance, "_previous_rollup_key", None)
+    invalidate_day_chunks("appointments", instance.date, previous[0] if previous else None)
+
+
+@receiver(pre_save, sender=User)
+def remember_last_login(sender, instance, update_fields=None, **kwargs):
+    """Keeps the stored last_login so post_save knows which window a login leaves."""
+    instance._previous_last_login = None
+    if instance.pk and (update_fields is None or "last_login" in update_fields):
+        instance._previous_last_login = (
+            User.objects.filter(pk=instance.pk).values_list("last_login", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_on_user_save(sender, instance, created, **kwargs):
+    # User stats depend on date_joined and last_login. A login moves
+    # last_login to now, so the user stops counting as active in the window
+    # of their previous login; that window is invalidated too.
+    previous = getattr(instance, "_previous_last_login", None)
+    analytics_cache.invalidate(
+        instance.date_joined if created else None,
+        previous if previous != instance.last_login else None,
+    )
+    # User report rows include last_login, so any save changes the joining day's rows
+    invalidate_day_chunks("users", instance.date_joined)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_on_user_delete(sender, instance, **kwargs):
+    analytics_cache.invalidate(instance.date_joined, instance.last_login)
+    invalidate_day_chunks("users", instance.date_joined)
+
+
+if Payment is not None:
+    @receiver(post_save, sender=Payment)
+    @receiver(post_delete, sender=Payment)
+    def invalidate_on_payment_change(sender, instance, **kwargs):
+        analytics_cache.invalidate(instance.timestamp)
+        invalidate_day_chunks("finance", instance.timestamp)
@@ -44,13 +44,31 @@
 
 # reports/tasks.py
 import logging
-from celery import shared_task
-from django.core.files.base import ContentFile
-from django.core.mail import EmailMessage
-from django.utils import timezone
+from celery import chord, group, shared_task
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
-from .models import Report
+from .models import Report, ReportPartition, ReportSchedule
+from .services.report_builder import (
+    build_incremental_report_file,
+    build_partition_file,
+    build_report_file,
+    merge_partition_files,
+    partition_report,
+    use_incremental,
+)
+from .services.report_dedup import find_reusable_report
+from .services.report_delivery import build_report_email
+from .services.report_progress import (
+    PROGRESS_FIELDS,
+    ProgressTracker,
+    mark_failed,
+    mark_finished,
+    mark_phase,
+    mark_started,
+)
+from .services.report_retention import purge_expired_reports
 
 logger = logging.getLogger("reports")
 
@@ -63,37 +81,36 @@ def generate_report_task(self, report_id, report_type, start_date, end_date, ema
     try:
         report = Report.objects.get(id=report_id)
 
-        # Simulated report content (replace with real CSV/PDF generation later)
-        content = (
-            f"Report type: {report_type}\n"
-            f"From: {start_date}\n"
-            f"To: {end_date}\n"
-            f"Generated at: {timezone.now()}\n"
+        # An identical closed-period report finished while this one was queued
+        existing = find_reusable_report(
+            report.report_type, report.file_format, report.date_from, report.date_to,
+            exclude=report.id, ready_only=True,
         )
-
-        # Save report content to file field
-        filename = f"{report_type}_report_{report_id}.txt"
-        report.file.save(filename, ContentFile(content.encode("utf-8")), save=False)
+        if existing:
+            report.file.name = existing.file.name
+            report.content_hash = existing.content_hash
+            rows = existing.rows_processed
+            logger.info(f"Report {report_id} reuses the file of report {existing.id}")
+        else:
+            mark_started(report)
+
+            # Long ranges are generated partition by partition on several workers
+            partitions = partition_report(report)
+            if partitions:
+                start_partitioned_report(report, partitions, email)
+                return f"Report {report_id} split into {len(partitions)} partitions."
+
+            if use_incremental(report):
+                # Stitched from stored per-day chunks; only missing days are queried
+                rows = build_incremental_report_file(report, on_progress=ProgressTracker(report.id))
+            else:
+                # Rows are streamed from the database into a temp file, then stored
+                rows = build_report_file(report, on_progress=ProgressTracker(report.id))
         report.is_ready = True
-        report.save(update_fields=["file", "is_ready"])
-
-        # Send email if provided
-        if email:
-            try:
-                msg = EmailMessage(
-                    subject="Your report is ready",
-                    body="Please find your report attached.",
-                    to=[email],
-                )
-                # Reset file pointer before attaching
-                report.file.open(mode="rb")
-                msg.attach(report.file.name, report.file.read())
-                report.file.close()
-                msg.send()
-                logger.info(f"Report {report_id} sent to {email}")
-            except Exception as e:
-                logger.error(f"Failed to send report {report_id} to {email}: {e}")
+        mark_finished(report, rows)
+        report.save(update_fields=["file", "content_hash", "is_ready", *PROGRESS_FIELDS])
 
+        deliver_finished_report(report, email)
         return f"Report {report_id} generated successfully."
 
     except Report.DoesNotExist:
@@ -102,9 +119,191 @@ def generate_report_task(self, report_id, report_type, start_date, end_date, ema
 
     except Exception as e:
         logger.exception(f"Error generating report {report_id}")
+        if self.request.retries >= self.max_retries:
+            # Out of retries: stop deduplication from handing out this report
+            mark_failed(report_id)
+        raise self.retry(exc=e)
+
+
+def start_partitioned_report(report, partitions, email=None):
+    """
+    Runs one task per partition and merges them when all have finished
+    (a Celery chord). Without a reachable broker the partitions run inline,
+    as single reports do.
+    """
+    header = group(generate_report_partition_task.s(partition.id) for partition in partitions)
+    callback = merge_report_partitions_task.s(report.id, email)
+    try:
+        chord(header)(callback)
+    except Exception as e:
+        logger.warning("Failed to enqueue report %s partitions, running synchronously: %s", report.id, e)
+        rows = [generate_report_partition_task.run(partition.id) for partition in partitions]
+        merge_report_partitions_task.run(rows, report.id, email)
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={"max_retries": 3})
+def generate_report_partition_task(self, partition_id):
+    """Writes one partition of a report; returns its row count."""
+    partition = ReportPartition.objects.select_related("report").get(id=partition_id)
+    if partition.status == ReportPartition.STATUS_DONE:
+        # Redelivered after it already finished
+        return partition.rows
+
+    partition.status = ReportPartition.STATUS_RUNNING
+    partition.save(update_fields=["status", "updated_at"])
+    try:
+        build_partition_file(partition, on_progress=ProgressTracker(partition.report_id, partition.id))
+    except Exception as e:
+        logger.exception(f"Error generating partition {partition.index} of report {partition.report_id}")
+        if self.request.retries >= self.max_retries:
+            partition.status = ReportPartition.STATUS_FAILED
+            partition.save(update_fields=["status", "updated_at"])
+            mark_failed(partition.report_id)
+        raise self.retry(exc=e)
+
+    partition.status = ReportPartition.STATUS_DONE
+    partition.save(update_fields=["status", "rows", "content_hash", "file", "updated_at"])
+    return partition.rows
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={"max_retries": 3})
+def merge_report_partitions_task(self, partition_rows, report_id, email=None):
+    """Chord callback: concatenates the partitions into the report file and marks it ready."""
+    try:
+        mark_phase(report_id, Report.PHASE_MERGING)
+        report = Report.objects.get(id=report_id)
+        partitions = list(report.partitions.all())
+        rows = merge_partition_files(report, partitions)
+        report.is_ready = True
+        mark_finished(report, rows)
+        report.save(update_fields=["file", "content_hash", "is_ready", *PROGRESS_FIELDS])
+
+        # Partition files are only intermediate output
+        for partition in partitions:
+            partition.file.delete(save=True)
+
+        deliver_finished_report(report, email)
+        return f"Report {report_id} generated successfully."
+
+    except Report.DoesNotExist:
+        logger.error(f"Report with id {report_id} does not exist.")
+        return f"Report {report_id} not found."
+
+    except Exception as e:
+        logger.exception(f"Error merging report {report_id}")
+        if self.request.retries >= self.max_retries:
+            mark_failed(report_id)
+        raise self.retry(exc=e)
+
+
+def add_report_recipient(report, email):
+    """
+    Emails ``report`` to ``email`` as well: straight away when it is ready,
+    otherwise once it finishes. The row lock keeps this from racing with
+    the task that marks the report ready.
+    """
+    if not email:
+        return
+    with transaction.atomic():
+        report = Report.objects.select_for_update().get(pk=report.pk)
+        if not report.is_ready:
+            if email not in report.notify_emails:
+                report.notify_emails.append(email)
+                report.save(update_fields=["notify_emails"])
+            return
+    deliver_report(report, email)
+
+
+def deliver_finished_report(report, email):
+    """Emails the requester and everyone added by ``add_report_recipient`` meanwhile."""
+    report.refresh_from_db(fields=["notify_emails"])
+    for recipient in dict.fromkeys([email, *report.notify_emails]):
+        deliver_report(report, recipient)
+
+
+def deliver_report(report, email):
+    """Hands the email to its own task, so a generation retry never sends it twice."""
+    if not email:
+        return
+    try:
+        deliver_report_task.delay(report.id, email)
+    except Exception as e:
+        logger.warning("Failed to enqueue report delivery, running synchronously: %s", e)
+        try:
+            deliver_report_task.run(report.id, email)
+        except Exception:
+            # Already logged by the task; the report itself is fine
+            pass
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={"max_retries": 3})
+def deliver_report_task(self, report_id, email):
+    """Emails a ready report: attached when small, as a signed download link otherwise."""
+    try:
+        report = Report.objects.get(id=report_id, is_ready=True)
+        build_report_email(report, email).send()
+        logger.info(f"Report {report_id} sent to {email}")
+        return f"Report {report_id} sent."
+
+    except Report.DoesNotExist:
+        logger.error(f"Report with id {report_id} does not exist or is not ready.")
+        return f"Report {report_id} not found."
+
+    except Exception as e:
+        logger.error(f"Failed to send report {report_id} to {email}: {e}")
         raise self.retry(exc=e)
 
 
+@shared_task
+def run_report_schedules_task():
+    """
+    Celery beat entry point (off-peak, see CELERY_BEAT_SCHEDULE): starts
+    the report of every active schedule whose latest period has closed
+    since its previous run, and starts again a schedule's last report if
+    it failed or was lost. A report for the same period that already
+    exists is reused, and later requests for the period are answered with
+    the pre-built file by GenerateReportView's deduplication.
+    """
+    started = 0
+    today = timezone.localdate()
+    for schedule in ReportSchedule.objects.filter(is_active=True).select_related("last_report"):
+        for start, end in schedule.due_periods(today):
+            report = find_reusable_report(schedule.report_type, schedule.file_format, start, end)
+            if report is None:
+                report = Report.objects.create(
+                    report_type=schedule.report_type, file_format=schedule.file_format,
+                    date_from=start, date_to=end,
+                )
+                start_scheduled_report(report)
+                started += 1
+
+            # A failed or lost report is started again on the next run
+            schedule.last_period_end = max(end, schedule.last_period_end or end)
+            schedule.last_report = report
+            schedule.save(update_fields=["last_period_end", "last_report", "updated_at"])
+
+    return f"Started {started} scheduled reports."
+
+
+def start_scheduled_report(report):
+    args = (report.id, report.report_type, str(report.date_from), str(report.date_to))
+    try:
+        generate_report_task.delay(*args)
+    except Exception as e:
+        logger.warning("Failed to enqueue scheduled report %s, running synchronously: %s", report.id, e)
+        try:
+            generate_report_task.run(*args)
+        except Exception:
+            # Already logged by the task; marked failed so the schedule tries again
+            mark_failed(report.id)
+
+
+@shared_task
+def cleanup_reports_task():
+    """Celery beat entry point: applies the report retention settings."""
+    return purge_expired_reports()
+
+
 
 
 
@@ -1,13 +1,71 @@
-from django.test import TestCase
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
-from datetime import date
-
-from .models import Report
+from django.utils import timezone
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+import csv
+import gzip
+import re
+import shutil
+import tempfile
+import zlib
+
+from appointments.models import Appointment
+from common.aggregation_utils import conditional_counts, counts_by_value
+from doctors.models import DoctorProfile
+from patients.models import PatientProfile
+from openpyxl import Workbook, load_workbook
+
+from .models import Report, ReportDayChunk, ReportSchedule
+from .services import report_builder
+from .services.report_builder import build_incremental_report_file, build_report_file, report_summary
+from .services.report_datasets import report_rows
+from .services.report_retention import purge_expired_reports
+from .tasks import generate_report_task, run_report_schedules_task
+from .services.analytics_cache import AnalyticsSnapshotCache
+from .services.analytics_service import Payment
+from .utils.date_utils import previous_period, split_date_range
+from .utils.export_utils import export_to_xlsx, write_pdf_rows, write_xlsx_rows
 
 User = get_user_model()
 
 
+def read_pdf(data):
+    """
+    Checks the structure of a PDF written by reportlab and returns its
+    page count and each page's decoded content stream, in page order.
+    """
+    assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF"), "not a complete PDF"
+    startxref = int(re.search(rb"startxref\s+(\d+)\s+%%EOF\s*$", data).group(1))
+    assert data[startxref:startxref + 4] == b"xref", "startxref does not point at the xref table"
+
+    objects = {}
+    for match in re.finditer(rb"(\d+) 0 obj\s*<<(.*?)>>\s*(stream\r?\n)?", data, re.S):
+        number, dictionary, stream = int(match.group(1)), match.group(2), match.group(3)
+        if stream:
+            length = int(re.search(rb"/Length (\d+)", dictionary).group(1))
+            body = data[match.end():match.end() + length]
+            assert re.match(rb"\s*endstream", data[match.end() + length:]), f"bad /Length on object {number}"
+            if b"/FlateDecode" in dictionary:
+                body = zlib.decompress(body)
+            objects[number] = body
+        else:
+            objects[number] = dictionary
+
+    page_tree = next(body for body in objects.values() if re.search(rb"/Type /Pages\b", body))
+    kids = [int(n) for n in re.findall(rb"(\d+) 0 R", re.search(rb"/Kids \[(.*?)\]", page_tree, re.S).group(1))]
+    assert int(re.search(rb"/Count (\d+)", page_tree).group(1)) == len(kids)
+    contents = [objects[int(re.search(rb"/Contents (\d+) 0 R", objects[kid]).group(1))] for kid in kids]
+    return len(kids), contents
+
+
 class ReportAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -47,6 +105,810 @@ class ReportAPITest(TestCase):
         self.assertIn("report_status", response.data)
 
 
+class ReportDedupTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="dadmin", email="dadmin@test.com", password="admin123")
+        self.client.force_authenticate(self.admin)
+        self.last_week = {
+            "report_type": "users",
+            "date_from": date.today() - timedelta(days=7),
+            "date_to": date.today() - timedelta(days=1),
+        }
+
+    def generate(self, **data):
+        response = self.client.post("/api/reports/generate/", {**self.last_week, **data}, format="json")
+        report = Report.objects.filter(pk=response.data["report_id"]).first()
+        if report:
+            self.addCleanup(lambda: report.file.delete(save=False))
+        return response
+
+    def test_closed_period_reuses_ready_report(self):
+        first = self.generate()
+        second = self.generate()
+
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.data["deduplicated"])
+        self.assertEqual(second.data["report_id"], first.data["report_id"])
+        self.assertEqual(Report.objects.count(), 1)
+
+        # Another format is a different report
+        self.assertEqual(self.generate(file_format="xlsx").status_code, 202)
+        self.assertEqual(Report.objects.count(), 2)
+
+    def test_in_flight_and_failed_reports(self):
+        pending = Report.objects.create(generated_by=self.admin, **self.last_week)
+        response = self.generate()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["report_id"], pending.id)
+
+        pending.is_failed = True
+        pending.save()
+        self.assertNotEqual(self.generate().data["report_id"], pending.id)
+
+    @patch("reports.views.generate_report_task.delay", side_effect=ConnectionError("broker down"))
+    def test_failed_inline_run_is_not_handed_out_again(self, _):
+        with patch("reports.tasks.mark_started", side_effect=RuntimeError("disk full")):
+            failed = self.generate()
+        self.assertEqual(failed.status_code, 500)
+        self.assertTrue(Report.objects.get(pk=failed.data["report_id"]).is_failed)
+
+        retried = self.generate()
+        self.assertEqual(retried.status_code, 202)
+        self.assertNotIn("deduplicated", retried.data)
+        self.assertNotEqual(retried.data["report_id"], failed.data["report_id"])
+        self.assertTrue(Report.objects.get(pk=retried.data["report_id"]).is_ready)
+
+    def test_identical_content_shares_one_file(self):
+        reports = [Report.objects.create(generated_by=self.admin, **self.last_week) for _ in range(2)]
+        for report in reports:
+            build_report_file(report)
+        self.addCleanup(lambda: reports[0].file.delete(save=False))
+
+        self.assertEqual(reports[0].file.name, reports[1].file.name)
+        self.assertEqual(reports[0].file.name, f"reports/sha256/{reports[0].content_hash[:2]}/{reports[0].content_hash}.csv")
+
+
+class ReportProgressTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="gadmin", email="gadmin@test.com", password="admin123")
+        self.client.force_authenticate(self.admin)
+        for i in range(3):
+            User.objects.create_user(username=f"pg{i}", email=f"pg{i}@test.com", password="pw")
+
+    def test_progress_is_recorded(self):
+        response = self.client.post("/api/reports/generate/", {
+            "report_type": "users", "date_from": date.today(), "date_to": date.today(),
+        }, format="json")
+        report = Report.objects.get(pk=response.data["report_id"])
+        self.addCleanup(lambda: report.file.delete(save=False))
+
+        progress = self.client.get(f"/api/reports/{report.id}/status/").data["progress"]
+        self.assertEqual(progress["phase"], "done")
+        self.assertEqual(progress["rows_processed"], 4)
+        self.assertEqual(progress["rows_total"], 4)
+        self.assertEqual(progress["percent"], 100.0)
+        self.assertEqual(progress["bytes_written"], report.file.size)
+        self.assertIsNone(progress["eta_seconds"])
+
+    def test_eta(self):
+        report = Report(rows_total=1000, rows_processed=250, started_at=timezone.now() - timedelta(seconds=10))
+        self.assertAlmostEqual(report.eta_seconds, 30, delta=1)
+
+    @override_settings(REPORT_WAIT_POLL_INTERVAL=0.01)
+    def test_long_poll(self):
+        report = Report.objects.create(
+            report_type="users", date_from=date.today(), date_to=date.today(), generated_by=self.admin,
+        )
+        url = f"/api/reports/{report.id}/wait/"
+
+        response = self.client.get(url, {"timeout": "0.05"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["report_status"], "pending")
+
+        # Returns straight away when progress differs from what the client saw
+        Report.objects.filter(pk=report.pk).update(rows_processed=10)
+        response = self.client.get(url, {"timeout": "5", "since": "0"})
+        self.assertEqual(response.data["progress"]["rows_processed"], 10)
+
+        self.assertEqual(self.client.get(url, {"timeout": "soon"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"timeout": "nan"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"timeout": "inf"}).status_code, 400)
+
+
+class ReportDownloadTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="dladmin", email="dladmin@test.com", password="admin123")
+        self.client.force_authenticate(self.admin)
+        for i in range(5):
+            User.objects.create_user(username=f"dl{i}", email=f"dl{i}@test.com", password="pw")
+        self.report = Report.objects.create(
+            report_type="users", date_from=date.today(), date_to=date.today(), generated_by=self.admin,
+        )
+        build_report_file(self.report)
+        self.report.is_ready = True
+        self.report.save()
+        self.addCleanup(lambda: self.report.file.delete(save=False))
+        self.url = f"/api/reports/{self.report.id}/download/"
+        with self.report.file.open("rb") as fh:
+            self.content = fh.read()
+
+    def test_full_download_and_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn(f"users_report_{self.report.id}.csv", response["Content-Disposition"])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_follows_the_stored_bytes(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.addCleanup(self.report.file.storage.delete, self.report.file.name)
+
+        # Same rows (content_hash), different bytes: the old validator must not resume into it
+        self.report.file.save("users_regenerated.csv", ContentFile(self.content + b"\n"), save=True)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[:10])
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{len(self.content)}")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+
+        # A stale If-Range validator gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(REPORT_DOWNLOAD_OFFLOAD="nginx", REPORT_DOWNLOAD_ACCEL_PREFIX="/protected-media/")
+    def test_nginx_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.report.file.name}")
+        self.assertEqual(response.content, b"")
+
+
+class ReportDeliveryTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="madmin", email="madmin@test.com", password="admin123")
+        self.client.force_authenticate(self.admin)
+
+    def generate(self):
+        response = self.client.post("/api/reports/generate/", {
+            "report_type": "users", "date_from": date.today(), "date_to": date.today(),
+        }, format="json")
+        report = Report.objects.get(pk=response.data["report_id"])
+        self.addCleanup(lambda: report.file.delete(save=False))
+        return report
+
+    def test_small_report_is_attached(self):
+        report = self.generate()
+
+        self.assertEqual(len(mail.outbox), 1)
+        name, content, _ = mail.outbox[0].attachments[0]
+        self.assertEqual(name, report.download_name)
+        with report.file.open("rb") as fh:
+            self.assertEqual(content.encode("utf-8"), fh.read())
+
+    @override_settings(REPORT_EMAIL_ATTACHMENT_MAX_BYTES=10, REPORT_LINK_BASE_URL="https://health.example.com")
+    def test_large_report_gets_signed_link(self):
+        report = self.generate()
+
+        message = mail.outbox[0]
+        self.assertEqual(message.attachments, [])
+        link = re.search(r"https://health\.example\.com(/api/reports/download/\S+/)", message.body).group(1)
+
+        anonymous = APIClient()
+        response = anonymous.get(link)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(report.download_name, response["Content-Disposition"])
+
+        self.assertEqual(anonymous.get(link.replace(":", "x", 1)).status_code, 404)
+        with override_settings(REPORT_LINK_MAX_AGE=-1):
+            self.assertEqual(anonymous.get(link).status_code, 410)
+
+
+    def test_deduplicated_requesters_are_emailed(self):
+        other = User.objects.create_superuser(username="madmin2", email="madmin2@test.com", password="admin123")
+        last_week = {"report_type": "users", "date_from": date.today() - timedelta(days=7), "date_to": date.today() - timedelta(days=1)}
+
+        # In flight: the second requester is emailed when the report finishes
+        pending = Report.objects.create(generated_by=self.admin, **last_week)
+        self.addCleanup(lambda: pending.file.delete(save=False))
+        self.client.force_authenticate(other)
+        self.client.post("/api/reports/generate/", last_week, format="json")
+        self.assertEqual(len(mail.outbox), 0)
+        generate_report_task.run(pending.id, "users", str(last_week["date_from"]), str(last_week["date_to"]), self.admin.email)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["madmin2@test.com", "madmin@test.com"])
+
+        # Ready: sent straight away
+        mail.outbox.clear()
+        self.client.force_authenticate(self.admin)
+        response = self.client.post("/api/reports/generate/", last_week, format="json")
+        self.assertEqual(response.data["report_id"], pending.id)
+        self.assertEqual([m.to for m in mail.outbox], [["madmin@test.com"]])
+
+
+class ReportScheduleTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="sadmin", email="sadmin@test.com", password="admin123")
+        self.client.force_authenticate(self.admin)
+        # Only the daily users schedule of the standard set stays active
+        ReportSchedule.objects.exclude(report_type="users", frequency="daily").update(is_active=False)
+        self.schedule = ReportSchedule.objects.get(report_type="users", file_format="csv", frequency="daily")
+
+    def test_previous_period(self):
+        today = date(2024, 3, 13)  # Wednesday
+        self.assertEqual(previous_period("daily", today), (date(2024, 3, 12), date(2024, 3, 12)))
+        self.assertEqual(previous_period("weekly", today), (date(2024, 3, 4), date(2024, 3, 10)))
+        self.assertEqual(previous_period("monthly", today), (date(2024, 2, 1), date(2024, 2, 29)))
+
+    def test_schedule_prebuilds_report_once_per_period(self):
+        run_report_schedules_task()
+        run_report_schedules_task()
+
+        self.schedule.refresh_from_db()
+        report = self.schedule.last_report
+        self.addCleanup(lambda: report.file.delete(save=False))
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.assertEqual((report.date_from, report.date_to), (yesterday, yesterday))
+        self.assertTrue(report.is_ready)
+        self.assertEqual(self.schedule.last_period_end, yesterday)
+        self.assertEqual(Report.objects.count(), 1)
+
+        # A request for the same period gets the pre-built file straight away
+        response = self.client.post("/api/reports/generate/", {
+            "report_type": "users", "date_from": yesterday, "date_to": yesterday,
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["report_id"], report.id)
+
+    def test_failed_scheduled_report_is_started_again(self):
+        with patch("reports.tasks.build_incremental_report_file", side_effect=RuntimeError("disk full")):
+            run_report_schedules_task()
+        self.schedule.refresh_from_db()
+        self.assertTrue(self.schedule.last_report.is_failed)
+
+        run_report_schedules_task()
+        self.schedule.refresh_from_db()
+        report = self.schedule.last_report
+        self.addCleanup(lambda: report.file.delete(save=False))
+        self.assertTrue(report.is_ready)
+        self.assertEqual(Report.objects.count(), 2)
+
+    def test_retention_keeps_shared_files_and_latest_scheduled_report(self):
+        period = {"report_type": "users", "date_from": date(2024, 1, 1), "date_to": date(2024, 1, 1)}
+        old, shared, scheduled = [Report.objects.create(is_ready=True, **period) for _ in range(3)]
+        for report in (old, shared, scheduled):
+            report.file.save("r.csv", ContentFile(b"ID\n"), save=True)
+            self.addCleanup(lambda report=report: report.file.delete(save=False))
+        shared.file.name = old.file.name
+        shared.save()
+        self.schedule.last_report = scheduled
+        self.schedule.save()
+        Report.objects.filter(pk__in=[old.pk, scheduled.pk]).update(created_at=timezone.now() - timedelta(days=31))
+
+        result = purge_expired_reports()
+
+        self.assertEqual(result["reports"], 1)
+        self.assertEqual(set(Report.objects.values_list("pk", flat=True)), {shared.pk, scheduled.pk})
+        self.assertTrue(shared.file.storage.exists(shared.file.name))
+
+        Report.objects.filter(pk=shared.pk).update(created_at=timezone.now() - timedelta(days=31))
+
+        # A users CSV being generated could adopt the file before its row is saved
+        in_flight = Report.objects.create(**period)
+        self.assertEqual(purge_expired_reports()["reports"], 0)
+        in_flight.delete()
+
+        self.assertEqual(purge_expired_reports()["files"], 1)
+        self.assertFalse(shared.file.storage.exists(shared.file.name))
+
+
+class ReportGenerationTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="radmin", email="radmin@test.com", password="admin123")
+        doctor_user = User.objects.create_user(username="gdoc", email="gdoc@test.com", password="pw", role="doctor")
+        patient_user = User.objects.create_user(username="gpat", email="gpat@test.com", password="pw")
+        doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        patient, _ = PatientProfile.objects.get_or_create(user=patient_user)
+        self.day = date.today() + timedelta(days=1)
+        for hour in (9, 10, 11):
+            Appointment.objects.create(patient=patient, doctor=doctor, date=self.day, time=time(hour))
+
+    def make_report(self, **kwargs):
+        report = Report.objects.create(
+            report_type="appointments", date_from=self.day, date_to=self.day,
+            generated_by=self.admin, **kwargs
+        )
+        self.addCleanup(lambda: report.file.delete(save=False))
+        return report
+
+    def test_csv_report_streams_rows(self):
+        report = self.make_report()
+
+        with self.assertNumQueries(1):
+            rows = build_report_file(report)
+
+        self.assertEqual(rows, 3)
+        with report.file.open("rb") as fh:
+            lines = fh.read().decode("utf-8").splitlines()
+        self.assertEqual(lines[0], "ID,Date,Time,Status,Doctor,Specialization,Patient,Booked At")
+        self.assertEqual(len(lines), 4)
+        self.assertIn(",gdoc,", lines[1])
+
+    def test_xlsx_report_uses_write_only_workbook(self):
+        report = self.make_report(file_format=Report.FORMAT_XLSX)
+        build_report_file(report)
+
+        with report.file.open("rb") as fh:
+            sheet = load_workbook(fh, read_only=True).active
+            values = list(sheet.values)
+        self.assertEqual(values[0][:3], ("ID", "Date", "Time"))
+        self.assertEqual(len(values), 4)
+
+    def test_pdf_report_renders_summary_template(self):
+        report = self.make_report(file_format=Report.FORMAT_PDF)
+        title, summary = report_summary(report)
+        self.assertEqual(title, "Appointment Summary Report")
+        self.assertEqual(summary[1:], ["Total: 0", "Completed: 0", "Cancelled: 0", "Pending: 0"])
+
+        self.assertEqual(build_report_file(report), 3)
+        with report.file.open("rb") as fh:
+            self.assertTrue(fh.read().startswith(b"%PDF"))
+
+    def test_pdf_splits_rows_into_page_tables(self):
+        with tempfile.TemporaryFile() as fh:
+            written = write_pdf_rows(fh, ["n", "label"], ((i, f"row {i}") for i in range(200)), title="Rows")
+            fh.seek(0)
+            pages, contents = read_pdf(fh.read())
+
+        self.assertEqual(written, 200)
+        self.assertEqual(pages, 5)
+        self.assertEqual(len(contents), 5)
+        page_rows = [[int(n) for n in re.findall(rb"\(row (\d+)\) Tj", page)] for page in contents]
+        self.assertEqual([n for rows in page_rows for n in rows], list(range(200)))
+        # 45 rows fit under the header on a landscape A4 page, fewer under the title
+        self.assertEqual([len(rows) for rows in page_rows], [43, 45, 45, 45, 22])
+        self.assertTrue(all(b"(label) Tj" in page and f"(Page {i}) Tj".encode() in page
+                            for i, page in enumerate(contents, 1)))
+
+    def test_xlsx_splits_sheets_at_row_limit(self):
+        with tempfile.TemporaryFile() as fh:
+            written = write_xlsx_rows(fh, ["n"], ((i,) for i in range(7)), sheet_name="Data", max_rows_per_sheet=3)
+            fh.seek(0)
+            wb = load_workbook(fh, read_only=True)
+            sheets = {ws.title: [row[0] for row in ws.values] for ws in wb.worksheets}
+
+        self.assertEqual(written, 7)
+        self.assertEqual(sheets, {
+            "Data": ["n", 0, 1], "Data (2)": ["n", 2, 3], "Data (3)": ["n", 4, 5], "Data (4)": ["n", 6],
+        })
+
+
+    def test_export_to_xlsx_uses_a_write_only_workbook(self):
+        data = [{"ID": 1, "Day": date(2024, 1, 2)}, {"Day": date(2024, 1, 3)}]
+        with patch("reports.utils.export_utils.Workbook", wraps=Workbook) as workbook:
+            content = export_to_xlsx(data, ["ID", "Day"])
+        workbook.assert_called_once_with(write_only=True)
+
+        rows = list(load_workbook(BytesIO(content), read_only=True).active.values)
+        self.assertEqual(rows, [("ID", "Day"), (1, datetime(2024, 1, 2)), (None, datetime(2024, 1, 3))])
+
+
+class StreamingExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="eadmin", email="eadmin@test.com", password="admin123")
+        self.client.force_authenticate(self.admin)
+        doctor_user = User.objects.create_user(username="edoc", email="edoc@test.com", password="pw", role="doctor")
+        patient_user = User.objects.create_user(username="epat", email="epat@test.com", password="pw")
+        doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        patient, _ = PatientProfile.objects.get_or_create(user=patient_user)
+        day = date.today() + timedelta(days=1)
+        for hour, status in ((9, "pending"), (10, "completed"), (11, "completed")):
+            Appointment.objects.create(patient=patient, doctor=doctor, date=day, time=time(hour), status=status)
+
+    def read_lines(self, response):
+        return b"".join(response.streaming_content).decode("utf-8").splitlines()
+
+    def test_filters_and_search(self):
+        response = self.client.get("/api/reports/export/appointments/", {"status": "completed", "search": "epat"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(self.read_lines(response)), 3)
+
+        response = self.client.get("/api/reports/export/users/", {"role": "doctor"})
+        lines = self.read_lines(response)
+        self.assertEqual(lines[0], "ID,Username,Email,Role,Active,Joined,Last Login")
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["edoc"])
+
+    def test_gzip(self):
+        response = self.client.get("/api/reports/export/appointments/", {"gzip": "1"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn('.csv.gz"', response["Content-Disposition"])
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get("/api/reports/export/payments/").status_code, 400)
+        response = self.client.get("/api/reports/export/appointments/", {"date_from": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("date_from", response.data["detail"])
+        response = self.client.get("/api/reports/export/diagnoses/", {"doctor": "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("doctor", response.data["detail"])
+
+
+class PartitionedReportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="padmin", email="padmin@test.com", password="admin123")
+        self.client.force_authenticate(self.admin)
+        doctor_user = User.objects.create_user(username="pdoc", email="pdoc@test.com", password="pw", role="doctor")
+        patient_user = User.objects.create_user(username="ppat", email="ppat@test.com", password="pw")
+        doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        patient, _ = PatientProfile.objects.get_or_create(user=patient_user)
+        self.start = date.today() + timedelta(days=1)
+        for offset in (0, 35, 70, 71):
+            Appointment.objects.create(patient=patient, doctor=doctor, date=self.start + timedelta(days=offset), time=time(9))
+
+    def generate(self, file_format):
+        response = self.client.post("/api/reports/generate/", {
+            "report_type": "appointments", "file_format": file_format,
+            "date_from": self.start, "date_to": self.start + timedelta(days=100),
+        }, format="json")
+        report = Report.objects.get(pk=response.data["report_id"])
+        self.addCleanup(lambda: report.file.delete(save=False))
+        return report
+
+    def test_csv_partitions_are_merged_in_order(self):
+        report = self.generate("csv")
+
+        self.assertTrue(report.is_ready)
+        partitions = list(report.partitions.all())
+        self.assertGreaterEqual(len(partitions), 4)
+        self.assertTrue(all(p.status == "done" and not p.file for p in partitions))
+        self.assertEqual(sum(p.rows for p in partitions), 4)
+
+        with report.file.open("rb") as fh:
+            lines = fh.read().decode("utf-8").splitlines()
+        self.assertEqual(lines[0], "ID,Date,Time,Status,Doctor,Specialization,Patient,Booked At")
+        self.assertEqual(len(lines), 5)
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], sorted(line.split(",")[1] for line in lines[1:]))
+
+        response = self.client.get(f"/api/reports/{report.id}/status/")
+        self.assertEqual(response.data["report_status"], "ready")
+        self.assertEqual(response.data["partitions"]["done"], len(partitions))
+        self.assertEqual(response.data["partitions"]["rows"], 4)
+
+    def test_xlsx_partitions_are_merged(self):
+        report = self.generate("xlsx")
+
+        with report.file.open("rb") as fh:
+            values = list(load_workbook(fh, read_only=True).active.values)
+        self.assertEqual(values[0][:2], ("ID", "Date"))
+        self.assertEqual(len(values), 5)
+
+    def test_xlsx_partitions_match_a_single_pass_build(self):
+        partitioned = self.generate("xlsx")
+        self.assertGreaterEqual(partitioned.partitions.count(), 4)
+        single = Report.objects.create(
+            report_type="appointments", file_format="xlsx",
+            date_from=partitioned.date_from, date_to=partitioned.date_to,
+        )
+        build_report_file(single)
+        self.addCleanup(lambda: single.file.delete(save=False))
+
+        def cells(report):
+            with report.file.open("rb") as fh:
+                sheet = load_workbook(fh, read_only=True).active
+                return [[(cell.value, cell.number_format) for cell in row] for row in sheet.iter_rows()]
+
+        self.assertEqual(cells(partitioned), cells(single))
+
+    def test_typed_parts_round_trip(self):
+        loaders = [int, date.fromisoformat, Decimal, lambda value: value == "True", str, str, str]
+        row = (7, date(2024, 1, 2), Decimal("10.10"), False, "", "\\N", None)
+        buffer = StringIO()
+        csv.writer(buffer).writerow(report_builder._dump_part_row(row))
+        part = SimpleNamespace(file=ContentFile(buffer.getvalue().encode("utf-8")))
+
+        self.assertEqual(list(report_builder._load_part_rows(part, loaders)), [row])
+
+    def test_split_date_range(self):
+        self.assertEqual(split_date_range(date(2024, 1, 20), date(2024, 3, 5)), [
+            (date(2024, 1, 20), date(2024, 1, 31)),
+            (date(2024, 2, 1), date(2024, 2, 29)),
+            (date(2024, 3, 1), date(2024, 3, 5)),
+        ])
+        # 2024-01-03 is a Wednesday
+        self.assertEqual(split_date_range(date(2024, 1, 3), date(2024, 1, 10), "week"), [
+            (date(2024, 1, 3), date(2024, 1, 7)),
+            (date(2024, 1, 8), date(2024, 1, 10)),
+        ])
+
+
+class IncrementalReportTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.admin = User.objects.create_superuser(username="iadmin", email="iadmin@test.com", password="admin123")
+        doctor_user = User.objects.create_user(username="idoc", email="idoc@test.com", password="pw", role="doctor")
+        patient_user = User.objects.create_user(username="ipat", email="ipat@test.com", password="pw")
+        self.doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        self.patient, _ = PatientProfile.objects.get_or_create(user=patient_user)
+        # Appointments cannot be booked in the past, so the builds pretend
+        # "today" is five days ahead
+        self.start = timezone.localdate() + timedelta(days=1)
+        self.today = self.start + timedelta(days=5)
+        self.appointments = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.start + timedelta(days=offset), time=time(hour))
+            for offset, hour in ((0, 9), (2, 9), (2, 10), (5, 9))
+        ]
+
+    def build(self, days):
+        report = Report.objects.create(
+            report_type="appointments", date_from=self.start, date_to=self.start + timedelta(days=days - 1),
+            generated_by=self.admin,
+        )
+        self.addCleanup(lambda: report.file.delete(save=False))
+        with patch("reports.services.report_builder.report_rows", wraps=report_rows) as rows_mock, \
+                patch("reports.services.report_builder.timezone.localdate", return_value=self.today):
+            rows = build_incremental_report_file(report)
+        with report.file.open("rb") as fh:
+            lines = fh.read().decode("utf-8").splitlines()
+        self.assertEqual(len(lines), rows + 1)
+        return lines, sorted(call.args[1] for call in rows_mock.call_args_list)
+
+    def test_closed_days_are_computed_once(self):
+        self.addCleanup(lambda: [c.file.delete(save=False) for c in ReportDayChunk.objects.all()])
+        day = lambda offset: self.start + timedelta(days=offset)
+
+        lines, computed = self.build(4)
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(computed, [day(0), day(1), day(2), day(3)])
+        self.assertEqual(ReportDayChunk.objects.count(), 4)
+
+        # Overlapping window: only the new closed day and today are queried
+        lines, computed = self.build(6)
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(computed, [day(4), day(5)])
+        self.assertEqual(ReportDayChunk.objects.count(), 5)
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], [str(day(n)) for n in (0, 2, 2, 5)])
+
+    def test_writes_invalidate_their_days(self):
+        self.addCleanup(lambda: [c.file.delete(save=False) for c in ReportDayChunk.objects.all()])
+        self.build(4)
+
+        # Moving an appointment touches the day it leaves and the day it lands on
+        appointment = self.appointments[1]
+        appointment.date = self.start + timedelta(days=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+
+        lines, computed = self.build(4)
+        self.assertEqual(computed, [self.start + timedelta(days=2), self.start + timedelta(days=3)])
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], [str(self.start + timedelta(days=n)) for n in (0, 2, 3)])
+
+    def test_write_during_read_keeps_chunk_from_being_stored(self):
+        self.addCleanup(lambda: [c.file.delete(save=False) for c in ReportDayChunk.objects.exclude(file="")])
+        write_part = report_builder._write_part
+
+        def racing_write_part(report_type, file_format, start, end, path, on_progress=None):
+            result = write_part(report_type, file_format, start, end, path, on_progress)
+            # A write lands after the rows were read but before the chunk is stored
+            report_builder.invalidate_day_chunks(report_type, start)
+            return result
+
+        with patch("reports.services.report_builder._write_part", side_effect=racing_write_part):
+            lines, _ = self.build(3)
+        self.assertEqual(len(lines), 4)
+        self.assertFalse(ReportDayChunk.objects.exclude(content_hash="").exists())
+
+        _, computed = self.build(3)
+        self.assertEqual(len(computed), 3)
+
+    def test_progress_reports_bytes_while_stitching(self):
+        self.build(3)
+        report = Report.objects.create(
+            report_type="appointments", date_from=self.start, date_to=self.start + timedelta(days=3),
+            generated_by=self.admin,
+        )
+        self.addCleanup(lambda: report.file.delete(save=False))
+        progress = []
+        with patch("reports.services.report_builder.timezone.localdate", return_value=self.today):
+            build_incremental_report_file(report, on_progress=lambda rows, size: progress.append((rows, size)))
+
+        self.assertTrue(all(size > 0 for rows, size in progress if rows))
+        self.assertEqual(progress[-1], (3, report.file.size))
+
+    def test_rolled_back_write_keeps_chunk_files(self):
+        self.build(3)
+        chunk = ReportDayChunk.objects.get(day=self.start)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.appointments[0].delete()
+                    raise RuntimeError("rolled back")
+            except RuntimeError:
+                pass
+
+        chunk.refresh_from_db()
+        self.assertTrue(chunk.content_hash)
+        self.assertTrue(chunk.file.storage.exists(chunk.file.name))
+        _, computed = self.build(3)
+        self.assertEqual(computed, [])
+
+    def test_replaced_chunk_files_are_left_for_retention(self):
+        self.build(3)
+        old_name = ReportDayChunk.objects.get(day=self.start).file.name
+        ReportDayChunk.objects.filter(day=self.start).update(updated_at=timezone.now() - timedelta(days=2))
+        self.build(3)
+        storage = ReportDayChunk._meta.get_field("file").storage
+        self.assertNotEqual(ReportDayChunk.objects.get(day=self.start).file.name, old_name)
+        self.assertTrue(storage.exists(old_name))
+
+        # A report started before the replacement may still be merging it
+        self.assertEqual(purge_expired_reports()["files"], 0)
+        self.assertEqual(purge_expired_reports(now=timezone.now() + timedelta(hours=2))["files"], 1)
+        self.assertFalse(storage.exists(old_name))
+        self.assertTrue(all(storage.exists(c.file.name) for c in ReportDayChunk.objects.exclude(file="")))
+
+    def test_old_chunks_are_recomputed(self):
+        self.addCleanup(lambda: [c.file.delete(save=False) for c in ReportDayChunk.objects.exclude(file="")])
+        self.build(3)
+        ReportDayChunk.objects.filter(day=self.start).update(updated_at=timezone.now() - timedelta(days=2))
+
+        _, computed = self.build(3)
+        self.assertEqual(computed, [self.start])
+
+
+class ConditionalCountsTest(TestCase):
+    def test_counts_subsets_in_one_query(self):
+        for i, role in enumerate(["patient", "patient", "doctor"]):
+            User.objects.create_user(username=f"u{i}", email=f"u{i}@test.com", password="pw", role=role)
+
+        with self.assertNumQueries(1):
+            counts = counts_by_value(User.objects.all(), "role", ["patient", "doctor", "admin"], total_key="all")
+
+        self.assertEqual(counts, {"all": 3, "patient": 2, "doctor": 1, "admin": 0})
+        self.assertEqual(conditional_counts(User.objects.none(), {"any": None}), {"any": 0})
+
+
+class AnalyticsSnapshotCacheTest(TestCase):
+    def setUp(self):
+        self.cache = AnalyticsSnapshotCache(today_ttl=30)
+        self.cache.cache.clear()
+        doctor_user = User.objects.create_user(username="cdoc", email="cdoc@test.com", password="pw", role="doctor")
+        patient_user = User.objects.create_user(username="cpat", email="cpat@test.com", password="pw")
+        self.doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+        self.patient, _ = PatientProfile.objects.get_or_create(user=patient_user)
+        self.today = date.today()
+        self.last_week = (self.today - timedelta(days=7), self.today - timedelta(days=1))
+
+    def book(self, hour):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor,
+            date=self.today + timedelta(days=1), time=time(hour),
+        )
+
+    def test_todays_writes_keep_closed_windows_cached(self):
+        # Version tokens live in the shared cache, so the signal handlers'
+        # invalidations reach this instance too
+        self.cache.snapshot("closed", *self.last_week)
+        self.cache.snapshot("open", self.today, self.today)
+        self.book(9)
+
+        with self.assertNumQueries(0):
+            self.cache.snapshot("closed", *self.last_week)
+        self.cache.snapshot("open", self.today, self.today)
+
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["hit_ratio"], 0.25)
+
+    def test_editing_old_records_invalidates_closed_windows(self):
+        appointment = self.book(10)
+        Appointment.objects.filter(pk=appointment.pk).update(created_at=timezone.now() - timedelta(days=3))
+        appointment.refresh_from_db()
+
+        self.assertEqual(self.cache.snapshot("closed", *self.last_week)["appointments"]["cancelled"], 0)
+        appointment.status = Appointment.STATUS_CANCELLED
+        appointment.save()
+        self.assertEqual(self.cache.snapshot("closed", *self.last_week)["appointments"]["cancelled"], 1)
+
+    def test_closed_windows_expire_only_on_local_backends(self):
+        # The test cache is local memory, which other processes cannot invalidate
+        with patch.object(self.cache.cache, "set") as mock_set:
+            self.cache.snapshot("closed", *self.last_week)
+        self.assertEqual(mock_set.call_args.kwargs["timeout"], self.cache.local_ttl)
+
+        self.cache.cache.clear()
+        with patch.object(self.cache.cache, "set") as mock_set, \
+                patch.object(AnalyticsSnapshotCache, "LOCAL_BACKENDS", ()):
+            self.cache.snapshot("closed", *self.last_week)
+        self.assertIsNone(mock_set.call_args.kwargs["timeout"])
+
+    def test_login_invalidates_the_window_of_the_previous_login(self):
+        user = User.objects.get(username="cpat")
+        User.objects.filter(pk=user.pk).update(last_login=timezone.now() - timedelta(days=3))
+        self.assertEqual(self.cache.snapshot("closed", *self.last_week)["users"]["active_users"], 1)
+
+        user.refresh_from_db()
+        user.last_login = timezone.now()
+        user.save(update_fields=["last_login"])
+        self.assertEqual(self.cache.snapshot("closed", *self.last_week)["users"]["active_users"], 0)
+
+
+class DashboardQueryCountTest(TestCase):
+    """Dashboard endpoints must not issue more queries as statuses, roles or rows grow."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username="admin",
+            email="admin@test.com",
+            password="admin123",
+        )
+        self.client.force_authenticate(self.admin)
+
+        for i in range(3):
+            doctor_user = User.objects.create_user(username=f"doc{i}", email=f"doc{i}@test.com", password="pw", role="doctor")
+            patient_user = User.objects.create_user(username=f"pat{i}", email=f"pat{i}@test.com", password="pw")
+            doctor, _ = DoctorProfile.objects.get_or_create(user=doctor_user)
+            patient, _ = PatientProfile.objects.get_or_create(user=patient_user)
+            for day, status in enumerate(["pending", "approved", "cancelled", "completed"], start=1):
+                Appointment.objects.create(
+                    patient=patient, doctor=doctor,
+                    date=date.today() + timedelta(days=day), time=time(9 + i), status=status,
+                )
+
+    def test_appointment_status_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/appointments/admin/appointments/status-summary/")
+        self.assertEqual(response.data, {"pending": 3, "approved": 3, "cancelled": 3, "completed": 3})
+
+    def test_appointment_trend(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/appointments/admin/appointments/trend/", {"period": "last_30_days"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_analytics(self):
+        # appointments + users; finance adds one more once a Payment model exists
+        expected = 2 if Payment is None else 3
+        with self.assertNumQueries(expected):
+            response = self.client.get("/api/reports/analytics/")
+        self.assertEqual(set(response.data["appointments"]), {"total", "completed", "cancelled", "pending"})
+
+    def test_admin_analytics_repeat_is_served_from_cache(self):
+        self.client.get("/api/reports/analytics/", {"period": "last_month"})
+        with self.assertNumQueries(0):
+            self.client.get("/api/reports/analytics/", {"period": "last_month"})
+
+    def test_admin_user_stats(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/auth/admin/users/stats/")
+        self.assertEqual(response.data, {"total_users": 7, "patients": 3, "doctors": 3, "admins": 1})
+
+
 
 
 
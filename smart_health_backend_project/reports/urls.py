@@ -2,15 +2,23 @@ from django.urls import path
 from .views import (
     GenerateReportView,
     DownloadReportView,
+    SignedReportDownloadView,
     ReportStatusView,
+    ReportWaitView,
     AdminAnalyticsView,
+    AdminAnalyticsCacheStatsView,
+    StreamingExportView,
 )
 
 urlpatterns = [
     path("generate/", GenerateReportView.as_view()),
     path("<int:pk>/download/", DownloadReportView.as_view()),
+    path("download/<str:token>/", SignedReportDownloadView.as_view()),
     path("<int:pk>/status/", ReportStatusView.as_view()),
+    path("<int:pk>/wait/", ReportWaitView.as_view()),
     path("analytics/", AdminAnalyticsView.as_view()),
+    path("analytics/cache/", AdminAnalyticsCacheStatsView.as_view()),
+    path("export/<str:dataset>/", StreamingExportView.as_view()),
 ]
 
 
@@ -8,6 +8,10 @@ def get_date_range(period: str):
     if period == "today":
         return today, today
 
+    if period == "yesterday":
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+
     if period == "last_7_days":
         return today - timedelta(days=6), today
 
@@ -18,10 +22,51 @@ def get_date_range(period: str):
         start = today.replace(day=1)
         return start, today
 
+    if period == "last_month":
+        last_day = today.replace(day=1) - timedelta(days=1)
+        return last_day.replace(day=1), last_day
+
     # fallback (safe default)
     return today - timedelta(days=29), today
 
 
+def split_date_range(start: date, end: date, unit: str = "month"):
+    """
+    Splits the inclusive range [start, end] into consecutive inclusive
+    (start, end) pieces that break on calendar months or ISO weeks.
+    """
+    if unit not in ("month", "week"):
+        raise ValueError("unit must be 'month' or 'week'")
+
+    pieces = []
+    current = start
+    while current <= end:
+        if unit == "month":
+            next_start = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+        else:
+            next_start = current + timedelta(days=7 - current.weekday())
+        pieces.append((current, min(next_start - timedelta(days=1), end)))
+        current = next_start
+    return pieces
+
+
+def previous_period(frequency: str, today: date):
+    """
+    The last complete day, ISO week (Monday to Sunday) or calendar month
+    before ``today``, as an inclusive (start, end) pair.
+    """
+    if frequency == "daily":
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+    if frequency == "weekly":
+        end = today - timedelta(days=today.weekday() + 1)
+        return end - timedelta(days=6), end
+    if frequency == "monthly":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    raise ValueError("frequency must be 'daily', 'weekly' or 'monthly'")
+
+
 
 
 
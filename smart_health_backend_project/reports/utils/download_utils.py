@@ -0,0 +1,153 @@
+import hashlib
+import mimetypes
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.encoding import escape_uri_path
+from django.utils.http import parse_etags, quote_etag
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def report_etag(report) -> str:
+    """
+    Strong ETag of the stored file: its name, size and modification time.
+    ``content_hash`` is not used because it hashes the rows, and XLSX/PDF
+    files with the same rows differ byte for byte, so a regenerated copy
+    must not validate an ``If-Range`` resume of the old one.
+    """
+    storage = report.file.storage
+    name = report.file.name
+    try:
+        modified = storage.get_modified_time(name).timestamp()
+    except NotImplementedError:
+        modified = ""
+    validator = f"{name}:{report.file.size}:{modified}"
+    return quote_etag(hashlib.sha256(validator.encode("utf-8")).hexdigest()[:32])
+
+
+def parse_range(header, size):
+    """
+    Parses a single-range ``Range`` header into an inclusive ``(start, end)``.
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges; the whole file is served then, as RFC 9110 allows. Raises
+    ValueError when the range cannot be satisfied.
+    """
+    match = _RANGE_RE.match((header or "").replace(" ", ""))
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class FileRange:
+    """Iterates over ``length`` bytes of an open file starting at ``start``; closes it when done."""
+
+    block_size = 64 * 1024
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.start = start
+        self.length = length
+
+    def __iter__(self):
+        self.fileobj.seek(self.start)
+        remaining = self.length
+        while remaining > 0:
+            data = self.fileobj.read(min(self.block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def offload_response(report, filename, content_type):
+    """
+    Empty response telling the front proxy to send the file itself
+    (``REPORT_DOWNLOAD_OFFLOAD`` = "nginx" or "apache"), or None when
+    offloading is off or the storage has no local path. The proxy then
+    handles Range and conditional requests and sends the bytes with
+    sendfile, so no app worker is held for the transfer.
+    """
+    mode = getattr(settings, "REPORT_DOWNLOAD_OFFLOAD", "")
+    response = HttpResponse(content_type=content_type)
+
+    if mode == "nginx":
+        prefix = getattr(settings, "REPORT_DOWNLOAD_ACCEL_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = escape_uri_path(prefix.rstrip("/") + "/" + report.file.name)
+    elif mode == "apache":
+        try:
+            response["X-Sendfile"] = report.file.path
+        except NotImplementedError:
+            return None
+    else:
+        return None
+
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def serve_report_file(request, report, filename):
+    """
+    Response for downloading ``report.file``: 304 when ``If-None-Match``
+    matches, a proxy offload when configured, 206 for a satisfiable
+    ``Range`` (honouring ``If-Range``), 416 for an unsatisfiable one, and
+    the whole file otherwise.
+    """
+    etag = report_etag(report)
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag in if_none_match or "*" in if_none_match:
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response = offload_response(report, filename, content_type)
+    if response is not None:
+        response["ETag"] = etag
+        return response
+
+    size = report.file.size
+    byte_range = None
+    if request.headers.get("If-Range", etag) == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(report.file.open("rb"), as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            FileRange(report.file.open("rb"), start, end - start + 1),
+            status=206, content_type=content_type,
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    return response
@@ -1,9 +1,13 @@
 import csv
+import tempfile
 from io import StringIO, BytesIO
 from openpyxl import Workbook
-from reportlab.platypus import SimpleDocTemplate, Table
-from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfdoc import PDFName, PDFStream, PDFZCompress
+from reportlab.pdfgen.canvas import Canvas
 
 
 # -----------------------------
@@ -27,18 +31,13 @@ def export_to_csv(data, headers):
 def export_to_xlsx(data, headers):
     """
     Exports list of dictionaries to an XLSX file.
-    Returns file bytes.
+    Returns file bytes. The workbook is streamed to a temporary file by
+    ``write_xlsx_rows`` rather than built in memory.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.append(headers)
-
-    for row in data:
-        ws.append([row.get(h) for h in headers])
-
-    output = BytesIO()
-    wb.save(output)
-    return output.getvalue()
+    with tempfile.TemporaryFile() as fh:
+        write_xlsx_rows(fh, headers, ([row.get(h) for h in headers] for row in data))
+        fh.seek(0)
+        return fh.read()
 
 
 # -----------------------------
@@ -69,3 +68,224 @@ def export_to_pdf(data, headers):
     pdf = buffer.getvalue()
     buffer.close()
     return pdf
+
+
+# -----------------------------
+# 4. STREAMING WRITERS
+# -----------------------------
+# The writers below consume a row iterator (tuples in header order) and write
+# straight to a file, so memory stays flat however many rows there are.
+
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def write_csv_rows(fileobj, headers, rows, on_progress=None, progress_every=10000):
+    """
+    Writes ``headers`` (skipped when None) and every row of ``rows`` to an
+    open text file. ``on_progress(count)`` is called every
+    ``progress_every`` rows. Returns the number of data rows written.
+    """
+    writer = csv.writer(fileobj)
+    if headers is not None:
+        writer.writerow(headers)
+
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if on_progress and count % progress_every == 0:
+            on_progress(count)
+    return count
+
+
+def write_xlsx_rows(path, headers, rows, sheet_name="Report", on_progress=None,
+                    progress_every=10000, max_rows_per_sheet=EXCEL_MAX_ROWS):
+    """
+    Writes rows to an XLSX file with a write-only workbook, which streams
+    cells to disk instead of keeping them in memory. ``path`` may be a file
+    path or a binary file object.
+
+    Once a sheet holds ``max_rows_per_sheet`` rows (header included) the
+    remaining rows continue on "<sheet_name> (2)", "<sheet_name> (3)", ...
+    each starting with the header row again.
+    Returns the number of data rows written.
+    """
+    if max_rows_per_sheet < 2:
+        raise ValueError("max_rows_per_sheet must leave room for the header and one row.")
+
+    headers = list(headers)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=_sheet_title(sheet_name, 1))
+    ws.append(headers)
+    sheets, sheet_rows = 1, 1
+
+    count = 0
+    for row in rows:
+        if sheet_rows == max_rows_per_sheet:
+            sheets += 1
+            ws = wb.create_sheet(title=_sheet_title(sheet_name, sheets))
+            ws.append(headers)
+            sheet_rows = 1
+        ws.append(_xlsx_cells(row))
+        sheet_rows += 1
+        count += 1
+        if on_progress and count % progress_every == 0:
+            on_progress(count)
+
+    wb.save(path)
+    return count
+
+
+def _sheet_title(name, number):
+    # Excel caps sheet titles at 31 characters
+    suffix = f" ({number})" if number > 1 else ""
+    return name[:31 - len(suffix)] + suffix
+
+
+def _xlsx_cells(row):
+    # Excel has no timezone support; store aware datetimes as naive UTC
+    return [
+        value.replace(tzinfo=None) if getattr(value, "tzinfo", None) else value
+        for value in row
+    ]
+
+
+PDF_FONT_SIZE = 7
+PDF_ROW_HEIGHT = 11
+
+PDF_TABLE_STYLE = [
+    ('BACKGROUND', (0,0), (-1,0), colors.grey),
+    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+    ('GRID', (0,0), (-1,-1), 0.25, colors.black),
+    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0,0), (-1,-1), PDF_FONT_SIZE),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('TOPPADDING', (0,0), (-1,-1), 1),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 1),
+]
+
+
+def write_pdf_rows(path, headers, rows, title="", summary=(), on_progress=None, progress_every=10000):
+    """
+    Writes rows to a PDF file as a sequence of page-sized tables, each
+    repeating the header row, preceded by ``title`` and ``summary`` lines.
+
+    reportlab lays out a single table in time that grows faster than its
+    row count, so rows are cut into tables of one page each and handed to
+    the document one at a time as it asks for more. Layout cost per page
+    stays constant and only the current chunk of rows is held as cells.
+    Returns the number of data rows written.
+    """
+    headers = list(headers)
+    doc = _StreamingDocTemplate(
+        path, pagesize=landscape(A4), title=title,
+        leftMargin=28, rightMargin=28, topMargin=28, bottomMargin=28,
+    )
+    col_width = doc.width / max(len(headers), 1)
+    # Cells are cut rather than wrapped so every row has the same height
+    max_chars = max(int(col_width / (PDF_FONT_SIZE * 0.5)), 4)
+    rows_per_table = int(doc.height // PDF_ROW_HEIGHT) - 1
+
+    styles = getSampleStyleSheet()
+    intro = [Paragraph(title, styles["Heading2"])] if title else []
+    intro += [Paragraph(line, styles["Normal"]) for line in summary]
+
+    count = 0
+
+    def flowables():
+        nonlocal count
+        yield from intro
+        if intro:
+            yield Spacer(1, 12)
+        chunk = []
+        for row in rows:
+            chunk.append([_pdf_cell(value, max_chars) for value in row])
+            count += 1
+            if on_progress and count % progress_every == 0:
+                on_progress(count)
+            if len(chunk) == rows_per_table:
+                yield _pdf_table(headers, chunk, col_width)
+                chunk = []
+        if chunk or not count:
+            yield _pdf_table(headers, chunk, col_width)
+
+    doc.build_from(
+        flowables(), canvasmaker=_CompactCanvas,
+        onFirstPage=_pdf_page_number, onLaterPages=_pdf_page_number,
+    )
+    return count
+
+
+class _StreamingDocTemplate(SimpleDocTemplate):
+    """
+    Takes its flowables from an iterator as the layout consumes them,
+    through the ``filterFlowables`` hook reportlab calls before handling
+    each flowable, so only the next couple of tables exist at a time.
+    """
+
+    def build_from(self, source, **kwargs):
+        self._source = iter(source)
+        self._story = []
+        self._top_up()
+        self.build(self._story, **kwargs)
+
+    def filterFlowables(self, flowables):
+        super().filterFlowables(flowables)
+        # Also called for reportlab's own page-start actions
+        if flowables is self._story:
+            self._top_up()
+
+    def _top_up(self):
+        # One flowable beyond the current keeps the build loop going
+        while len(self._story) < 2:
+            flowable = next(self._source, None)
+            if flowable is None:
+                return
+            self._story.append(flowable)
+
+
+class _CompactCanvas(Canvas):
+    """
+    reportlab keeps every finished page's drawing commands as text until
+    the file is saved. Compressing each page as soon as it is finished cuts
+    what is held per page roughly tenfold.
+
+    This reaches into reportlab internals (the document's page list and a
+    page's pending stream); if those are missing the page is left for
+    reportlab to write as usual. ReportGenerationTest checks the output
+    parses with the expected pages and rows.
+    """
+
+    def showPage(self):
+        super().showPage()
+        pages = getattr(getattr(self._doc, "Pages", None), "pages", None)
+        page = pages[-1] if pages else None
+        if isinstance(getattr(page, "stream", None), str):
+            contents = PDFStream(content=PDFZCompress.encode(page.stream))
+            # Tells reportlab the content is already encoded
+            contents.dictionary["Filter"] = PDFName("FlateDecode")
+            contents.__Comment__ = "page stream"
+            page.Contents, page.stream = contents, None
+
+
+def _pdf_table(headers, chunk, col_width):
+    return Table(
+        [headers] + chunk, colWidths=col_width, rowHeights=PDF_ROW_HEIGHT,
+        repeatRows=1, style=PDF_TABLE_STYLE,
+    )
+
+
+def _pdf_cell(value, max_chars):
+    if value is None:
+        return ""
+    if getattr(value, "tzinfo", None):
+        value = value.replace(tzinfo=None, microsecond=0)
+    text = str(value)
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def _pdf_page_number(canvas, doc):
+    canvas.saveState()
+    canvas.setFont("Helvetica", PDF_FONT_SIZE)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 14, f"Page {doc.page}")
+    canvas.restoreState()
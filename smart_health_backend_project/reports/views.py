@@ -2,16 +2,31 @@ from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
-from django.http import FileResponse
+from rest_framework.permissions import AllowAny
+from django.conf import settings
+from django.core import signing
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from asgiref.sync import sync_to_async
 from datetime import datetime
+import asyncio
 import logging
+import math
+import time
 
-from .models import Report
+from common.views import AsyncAPIViewMixin
+
+from .models import Report, ReportPartition
 from .serializers import ReportSerializer
 from .permissions import IsAdminUserForReports
-from .tasks import generate_report_task
-from .services.analytics_service import AnalyticsService
+from .tasks import add_report_recipient, generate_report_task
+from .services.analytics_cache import analytics_cache
+from .services.export_service import CSVExportService, ExportError
+from .services.report_dedup import find_reusable_report
+from .services.report_delivery import read_download_token
+from .services.report_progress import mark_failed, progress_data
 from .utils.date_utils import get_date_range
+from .utils.download_utils import serve_report_file
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +55,24 @@ class GenerateReportView(generics.CreateAPIView):
         except ValueError:
             raise ValidationError("Invalid date format. Use YYYY-MM-DD.")
 
+        # Same closed period already generated or being generated: hand out that report
+        existing = find_reusable_report(
+            report_type, serializer.validated_data.get("file_format", Report.FORMAT_CSV),
+            start_date, end_date,
+        )
+        if existing:
+            # The requester still gets the report by email, now or once it is ready
+            add_report_recipient(existing, request.user.email)
+            return Response(
+                {
+                    "detail": "An identical report already exists",
+                    "report_id": existing.id,
+                    "report_status": "ready" if existing.is_ready else "pending",
+                    "deduplicated": True,
+                },
+                status=status.HTTP_200_OK if existing.is_ready else status.HTTP_202_ACCEPTED,
+            )
+
         report = serializer.save(generated_by=request.user)
 
         # Try to enqueue the Celery task; if broker is unavailable (e.g., in dev/test),
@@ -55,7 +88,20 @@ class GenerateReportView(generics.CreateAPIView):
         except Exception as e:
             logger.warning("Failed to enqueue report task, running synchronously: %s", e)
             # Run synchronously as a fallback without invoking Celery internals
-            generate_report_task.run(report.id, report_type, start_date, end_date, request.user.email)
+            try:
+                generate_report_task.run(report.id, report_type, start_date, end_date, request.user.email)
+            except Exception:
+                # Already logged by the task; without retries left it has to be
+                # marked failed here, or deduplication would keep handing it out
+                mark_failed(report.id)
+                return Response(
+                    {
+                        "detail": "Report generation failed",
+                        "report_id": report.id,
+                        "report_status": "failed",
+                    },
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
 
         return Response(
             {
@@ -86,11 +132,30 @@ class DownloadReportView(generics.RetrieveAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        return FileResponse(
-            report.file.open("rb"),
-            as_attachment=True,
-            filename=report.file.name,
-        )
+        return serve_report_file(request, report, report.download_name)
+
+
+class SignedReportDownloadView(APIView):
+    """
+    GET /api/reports/download/<token>/ serves a report to whoever holds a
+    signed link from the report email, without logging in, until the link
+    expires (``REPORT_LINK_MAX_AGE``).
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, token):
+        try:
+            report_id = read_download_token(token)
+        except signing.SignatureExpired:
+            return Response({"detail": "This download link has expired."}, status=status.HTTP_410_GONE)
+        except signing.BadSignature:
+            return Response({"detail": "Invalid download link."}, status=status.HTTP_404_NOT_FOUND)
+
+        report = Report.objects.filter(id=report_id, is_ready=True).exclude(file="").first()
+        if report is None:
+            return Response({"detail": "Report not found."}, status=status.HTTP_404_NOT_FOUND)
+        return serve_report_file(request, report, report.download_name)
 
 
 class ReportStatusView(generics.RetrieveAPIView):
@@ -98,23 +163,116 @@ class ReportStatusView(generics.RetrieveAPIView):
     permission_classes = [IsAdminUserForReports]
 
     def get(self, request, *args, **kwargs):
-        report = self.get_object()
+        return Response(self.status_data(self.get_object()))
 
+    def status_data(self, report):
         if report.is_ready and report.file:
             status_ = "ready"
-        elif report.is_ready:
+        elif report.is_ready or report.is_failed:
             status_ = "error"
         else:
             status_ = "pending"
 
-        return Response(
-            {
-                "report_id": report.id,
-                "report_type": report.report_type,
-                "report_status": status_,
-                "created_at": report.created_at,
+        data = {
+            "report_id": report.id,
+            "report_type": report.report_type,
+            "report_status": status_,
+            "created_at": report.created_at,
+            "progress": progress_data(report),
+        }
+
+        partitions = list(report.partitions.all())
+        if partitions:
+            data["partitions"] = {
+                "total": len(partitions),
+                "done": sum(p.status == ReportPartition.STATUS_DONE for p in partitions),
+                "rows": sum(p.rows for p in partitions),
+                "items": [
+                    {
+                        "index": p.index,
+                        "date_from": p.date_from,
+                        "date_to": p.date_to,
+                        "status": p.status,
+                        "rows": p.rows,
+                    }
+                    for p in partitions
+                ],
             }
-        )
+
+        return data
+
+
+class ReportWaitView(AsyncAPIViewMixin, ReportStatusView):
+    """
+    GET /api/reports/<pk>/wait/ long-polls the report status.
+
+    Answers as soon as the report is ready or failed, or, with
+    ``?since=<rows_processed>``, as soon as more rows have been written
+    than the client last saw; otherwise after ``timeout`` seconds (capped
+    at ``REPORT_WAIT_MAX_TIMEOUT``). The body is the same as the status
+    endpoint's. The handler is async, so under ASGI a waiting client does
+    not hold a worker thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        max_timeout = getattr(settings, "REPORT_WAIT_MAX_TIMEOUT", 30)
+        interval = getattr(settings, "REPORT_WAIT_POLL_INTERVAL", 1.0)
+        try:
+            timeout = float(request.query_params.get("timeout", max_timeout))
+            if not math.isfinite(timeout):
+                # nan would never compare past the deadline
+                raise ValueError(timeout)
+            timeout = min(max(timeout, 0), max_timeout)
+            since = request.query_params.get("since")
+            since = int(since) if since not in (None, "") else None
+        except ValueError:
+            return Response(
+                {"detail": "timeout and since must be numbers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        report = await sync_to_async(self.get_object)()
+        deadline = time.monotonic() + timeout
+        while True:
+            finished = report.is_ready or report.is_failed
+            moved = since is not None and report.rows_processed != since
+            if finished or moved or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(interval)
+            await sync_to_async(report.refresh_from_db)()
+
+        return Response(await sync_to_async(self.status_data)(report))
+
+
+class StreamingExportView(APIView):
+    """
+    GET /api/reports/export/<dataset>/ streams appointments, diagnoses or
+    users as CSV. Filters follow the admin list views (see
+    CSVExportService); ``gzip=1`` compresses the stream on the fly.
+    """
+    permission_classes = [IsAdminUserForReports]
+
+    def get(self, request, dataset):
+        try:
+            qs = CSVExportService.filtered_queryset(dataset, request.query_params)
+        except ExportError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = CSVExportService.iter_csv(dataset, qs)
+        filename = f"{dataset}_{timezone.now():%Y%m%d_%H%M%S}.csv"
+
+        if request.query_params.get("gzip", "").lower() in ("1", "true", "yes"):
+            response = StreamingHttpResponse(
+                CSVExportService.gzip_stream(lines), content_type="application/gzip"
+            )
+            filename += ".gz"
+        else:
+            response = StreamingHttpResponse(lines, content_type="text/csv; charset=utf-8")
+
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        # Let nginx pass rows through as they are produced
+        response["X-Accel-Buffering"] = "no"
+        return response
 
 
 class AdminAnalyticsView(APIView):
@@ -125,14 +283,14 @@ class AdminAnalyticsView(APIView):
 
         start, end = get_date_range(period)
 
-        return Response(
-            {
-                "period": period,
-                "appointments": AnalyticsService.appointment_stats(start, end),
-                "finance": AnalyticsService.financial_stats(start, end),
-                "users": AnalyticsService.user_activity_stats(start, end),
-            }
-        )
+        return Response({"period": period, **analytics_cache.snapshot(period, start, end)})
+
+
+class AdminAnalyticsCacheStatsView(APIView):
+    permission_classes = [IsAdminUserForReports]
+
+    def get(self, request):
+        return Response(analytics_cache.stats())
 
 
 
@@ -0,0 +1,155 @@
+"""
+Load benchmark: how many AI requests can one worker hold in flight?
+
+Starts a local stub of the Gemini REST API that answers every
+generateContent call after a fixed delay, then fires the same burst of
+requests through:
+
+  * sync mode  - call_gemini() on a fixed pool of worker threads, the way a
+                 WSGI worker (gunicorn --threads N) serves requests
+  * async mode - call_gemini_async() on a single event loop, the way one
+                 ASGI worker serves requests
+
+and reports wall time, throughput and the peak number of requests the
+stub saw in flight at once.
+
+Usage:
+    python scripts/benchmark_ai_concurrency.py --requests 200 --latency 0.5 --threads 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import django
+
+# Ensure project root is on PYTHONPATH so settings can be imported
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class StubState:
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    latency = 0.5
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.in_flight = 0
+            cls.peak = 0
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        with StubState.lock:
+            StubState.in_flight += 1
+            StubState.peak = max(StubState.peak, StubState.in_flight)
+        try:
+            time.sleep(StubState.latency)
+        finally:
+            with StubState.lock:
+                StubState.in_flight -= 1
+
+        body = json.dumps({
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": "stub analysis"}]},
+                "finishReason": "STOP",
+            }]
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Default backlog of 5 would reset connections during the async burst
+    request_queue_size = 1024
+
+
+def start_stub_server():
+    server = StubServer(("127.0.0.1", 0), StubGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_sync(call_gemini, total, threads):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(
+            lambda i: call_gemini(f"sync benchmark prompt {i}", use_cache=False),
+            range(total),
+        ))
+    return results
+
+
+async def run_async(call_gemini_async, total):
+    return await asyncio.gather(*(
+        call_gemini_async(f"async benchmark prompt {i}", use_cache=False)
+        for i in range(total)
+    ))
+
+
+def report(mode, started, results):
+    elapsed = time.perf_counter() - started
+    ok = sum(1 for r in results if r == "stub analysis")
+    print(
+        f"{mode:<6} requests={len(results):<5} ok={ok:<5} "
+        f"wall={elapsed:7.2f}s  throughput={len(results) / elapsed:8.1f} req/s  "
+        f"peak_in_flight={StubState.peak}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="burst size per mode")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub model latency in seconds")
+    parser.add_argument("--threads", type=int, default=4, help="threads of the simulated sync worker")
+    args = parser.parse_args()
+
+    StubState.latency = args.latency
+    server = start_stub_server()
+    host, port = server.server_address
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smart_health_backend_project.settings")
+    os.environ["GEMINI_API_KEY"] = "benchmark-key"
+    os.environ["GEMINI_BASE_URL"] = f"http://{host}:{port}/"
+    os.environ["GEMINI_CACHE_ENABLED"] = "False"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["GEMINI_HTTP_POOL_SIZE"] = str(max(args.requests, args.threads))
+    django.setup()
+
+    from ai.gemini_utils import call_gemini, call_gemini_async
+
+    print(f"stub model at http://{host}:{port}/ latency={args.latency}s")
+
+    StubState.reset()
+    started = time.perf_counter()
+    report("sync", started, run_sync(call_gemini, args.requests, args.threads))
+
+    StubState.reset()
+    started = time.perf_counter()
+    report("async", started, asyncio.run(run_async(call_gemini_async, args.requests)))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: doctor candidate selection for AI doctor recommendations.
+
+Seeds a throwaway test database with synthetic verified doctors spread over
+a handful of cities and specializations, then compares:
+
+  * legacy  - location__icontains scan, every matching doctor's name goes
+              into the prompt (the original AIDoctorRecommendationView)
+  * indexed - ai.candidates.select_doctor_candidates(): indexed
+              case-insensitive lookup, ranked in SQL, top-K only
+
+and reports query latency, number of doctors in the prompt and prompt size.
+
+Usage:
+    python scripts/benchmark_doctor_candidates.py --doctors 10000 --top-k 10
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import django
+
+# Ensure project root is on PYTHONPATH so settings can be imported
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+CITIES = ["Kigali", "Musanze", "Huye", "Rubavu", "Nyagatare", "Muhanga", "Rusizi", "Karongi"]
+SPECIALIZATIONS = [
+    "Cardiology", "Dermatology", "Neurology", "Pediatrics", "Orthopedics",
+    "Gastroenterology", "Pulmonology", "General", "Psychiatry", "ENT",
+]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def seed(count):
+    from datetime import time as dt_time
+    from django.contrib.auth import get_user_model
+    from doctors.models import Availability, DoctorProfile
+
+    User = get_user_model()
+    rng = random.Random(42)
+
+    User.objects.bulk_create([
+        User(username=f"bench_doc_{i}", email=f"bench_doc_{i}@example.com", role="doctor")
+        for i in range(count)
+    ], batch_size=2000)
+    # Re-read to get primary keys on backends that don't return them from bulk_create
+    users = list(User.objects.filter(username__startswith="bench_doc_").order_by("pk"))
+    DoctorProfile.objects.bulk_create([
+        DoctorProfile(
+            user=user,
+            specialization=rng.choice(SPECIALIZATIONS),
+            location=rng.choice(CITIES),
+            years_of_experience=rng.randint(0, 40),
+            rating=round(rng.uniform(1, 5), 2),
+            is_verified=rng.random() < 0.9,
+        )
+        for user in users
+    ], batch_size=2000, ignore_conflicts=True)
+
+    doctors = list(DoctorProfile.objects.values_list("pk", flat=True))
+    Availability.objects.bulk_create([
+        Availability(doctor_id=pk, day_of_week=day, start_time=dt_time(9), end_time=dt_time(17))
+        for pk in doctors
+        for day in rng.sample(DAYS, 2)
+    ], batch_size=5000)
+
+
+def legacy(location, specialization):
+    from doctors.models import DoctorProfile
+
+    doctors = DoctorProfile.objects.select_related("user").filter(
+        location__icontains=location, is_verified=True
+    )
+    return [doc.user.get_full_name() or doc.user.username for doc in doctors]
+
+
+def indexed(location, specialization, top_k):
+    from ai.candidates import describe_candidate, select_doctor_candidates
+
+    return [describe_candidate(doc) for doc in select_doctor_candidates(location, specialization, limit=top_k)]
+
+
+def measure(name, fn, queries):
+    timings, sizes, counts = [], [], []
+    for location, specialization in queries:
+        started = time.perf_counter()
+        names = fn(location, specialization)
+        timings.append((time.perf_counter() - started) * 1000)
+        prompt = f"Recommend the best doctors for symptoms 'chest pain' from this list: {names}"
+        sizes.append(len(prompt))
+        counts.append(len(names))
+    timings.sort()
+    print(
+        f"{name:<8} p50={statistics.median(timings):8.2f}ms  "
+        f"p95={timings[int(len(timings) * 0.95) - 1]:8.2f}ms  "
+        f"doctors/prompt={statistics.mean(counts):7.0f}  prompt_chars={statistics.mean(sizes):9.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, default=10000, help="synthetic doctors to seed")
+    parser.add_argument("--top-k", type=int, default=10, help="doctors sent to the model")
+    parser.add_argument("--queries", type=int, default=50, help="lookups per strategy")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smart_health_backend_project.settings")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    django.setup()
+
+    from django.db import connection
+
+    # Never touch the real database: migrate a throwaway test database instead
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        started = time.perf_counter()
+        seed(args.doctors)
+        print(f"seeded {args.doctors} doctors in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(7)
+        queries = [(rng.choice(CITIES), rng.choice(SPECIALIZATIONS)) for _ in range(args.queries)]
+
+        measure("legacy", legacy, queries)
+        measure("indexed", lambda loc, spec: indexed(loc, spec, args.top_k), queries)
+
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM doctors_doctorprofile "
+                    "WHERE LOWER(location) = %s AND is_verified", ["kigali"],
+                )
+                print("plan:", "; ".join(row[-1] for row in cursor.fetchall()))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
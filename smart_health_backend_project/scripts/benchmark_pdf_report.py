@@ -0,0 +1,96 @@
+"""
+Throughput and memory benchmark: paginated PDF report engine.
+
+Builds synthetic appointment-like rows and writes them with
+reports.utils.export_utils.write_pdf_rows (page-sized tables pulled from a
+generator, written to a file). For comparison, export_to_pdf (one table of
+every row, rendered into a BytesIO) is run for sizes up to --baseline-max;
+above that it takes too long to be useful. Each run happens in a fresh
+child process so the reported peak RSS belongs to that engine alone.
+
+Usage:
+    python scripts/benchmark_pdf_report.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH so settings can be imported
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+HEADERS = ["ID", "Date", "Time", "Status", "Doctor", "Specialization", "Patient", "Booked At"]
+STATUSES = ["pending", "approved", "cancelled", "completed"]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def generate_rows(count):
+    start = date(2024, 1, 1)
+    booked = datetime(2023, 12, 1, 8, 30)
+    for i in range(count):
+        yield (
+            i + 1, start + timedelta(days=i // 1000), f"{9 + i % 8:02d}:00", STATUSES[i % 4],
+            f"doctor_{i % 1000}", "General Medicine", f"patient_{i % 5000}", booked,
+        )
+
+
+def run_engine(engine, rows):
+    from reports.utils.export_utils import export_to_pdf, write_pdf_rows
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if engine == "single-table":
+        data = [dict(zip(HEADERS, row)) for row in generate_rows(rows)]
+        size = len(export_to_pdf(data, HEADERS))
+    else:
+        with tempfile.TemporaryFile() as fh:
+            write_pdf_rows(
+                fh, HEADERS, generate_rows(rows), title="Appointment Summary Report",
+                summary=[f"Total: {rows}"],
+            )
+            size = fh.tell()
+    elapsed = time.perf_counter() - started
+    print(f"{engine},{rows},{elapsed:.2f},{baseline:.1f},{peak_rss_mb():.1f},{size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--baseline-max", type=int, default=10_000,
+                        help="largest size to run export_to_pdf for")
+    parser.add_argument("--engine", choices=["single-table", "paginated"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        run_engine(args.engine, args.rows[0])
+        return
+
+    print(f"{'engine':<12} {'rows':>9} {'seconds':>8} {'rows/s':>9} {'peak rss':>10} {'growth':>9} {'file':>9}")
+    for rows in args.rows:
+        engines = ("single-table", "paginated") if rows <= args.baseline_max else ("paginated",)
+        for engine in engines:
+            out = subprocess.run(
+                [sys.executable, __file__, "--engine", engine, "--rows", str(rows)],
+                capture_output=True, text=True, check=True, env={**os.environ, "PYTHONPATH": str(ROOT)},
+            ).stdout.strip().splitlines()[-1]
+            _, _, elapsed, baseline, peak, size = out.split(",")
+            elapsed, baseline, peak = float(elapsed), float(baseline), float(peak)
+            print(
+                f"{engine:<12} {rows:>9} {elapsed:>8.1f} {rows / elapsed:>9,.0f} "
+                f"{peak:>7.1f} MB {peak - baseline:>6.1f} MB {int(size) / 1024 / 1024:>6.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Memory benchmark: streaming appointment report generation.
+
+Seeds a throwaway on-disk SQLite database with synthetic appointments, then
+generates the appointments report through reports.services.report_builder
+(values_list + iterator into a CSV or write-only XLSX file) while sampling
+the process RSS. Flat RSS from the first to the last milestone shows that
+memory does not grow with the number of rows.
+
+Usage:
+    python scripts/benchmark_report_streaming.py --rows 5000000 --format csv
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as dt_time
+from pathlib import Path
+
+import django
+
+# Ensure project root is on PYTHONPATH so settings can be imported
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+DOCTORS = 1000
+
+
+def rss_mb():
+    """Current resident set size (Linux), falling back to the peak."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def seed(rows, start_day):
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from appointments.models import Appointment
+    from doctors.models import DoctorProfile
+    from patients.models import PatientProfile
+
+    User = get_user_model()
+    User.objects.bulk_create(
+        [User(username=f"bench_doc_{i}", email=f"bench_doc_{i}@example.com", role="doctor") for i in range(DOCTORS)]
+        + [User(username=f"bench_pat_{i}", email=f"bench_pat_{i}@example.com") for i in range(DOCTORS)],
+        batch_size=2000,
+    )
+    doctor_users = User.objects.filter(username__startswith="bench_doc_").order_by("pk")
+    patient_users = User.objects.filter(username__startswith="bench_pat_").order_by("pk")
+    DoctorProfile.objects.bulk_create(
+        [DoctorProfile(user=u, specialization="General", location="Kigali") for u in doctor_users],
+        ignore_conflicts=True,
+    )
+    PatientProfile.objects.bulk_create([PatientProfile(user=u) for u in patient_users], ignore_conflicts=True)
+    doctors = list(DoctorProfile.objects.order_by("pk").values_list("pk", flat=True))
+    patients = list(PatientProfile.objects.order_by("pk").values_list("pk", flat=True))
+
+    statuses = ["pending", "approved", "cancelled", "completed"]
+    table = Appointment._meta.db_table
+    sql = (
+        f"INSERT INTO {table} (doctor_id, patient_id, date, time, status, reason_for_visit, created_at, updated_at) "
+        f"VALUES (%s, %s, %s, %s, %s, '', %s, %s)"
+    )
+    ops = connection.ops
+    now = ops.adapt_datetimefield_value(timezone.now())
+    hours = [ops.adapt_timefield_value(dt_time(h)) for h in range(24)]
+
+    def batches():
+        batch = []
+        for i in range(rows):
+            # One slot per doctor/patient pair keeps both unique constraints satisfied
+            slot = i // DOCTORS
+            batch.append((
+                doctors[i % DOCTORS], patients[i % DOCTORS],
+                ops.adapt_datefield_value(start_day + timedelta(days=slot // 24)), hours[slot % 24],
+                statuses[i % 4], now, now,
+            ))
+            if len(batch) == 50000:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # Raw executemany in one transaction: bulk_create would take minutes for 5M rows
+    with transaction.atomic(), connection.cursor() as cursor:
+        for batch in batches():
+            cursor.executemany(sql, batch)
+
+    return start_day + timedelta(days=(rows // DOCTORS) // 24)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000, help="appointments in the report")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smart_health_backend_project.settings")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["REPORT_ITERATOR_CHUNK_SIZE"] = str(args.chunk_size)
+    django.setup()
+
+    from django.db import connection
+    from reports.models import Report
+    from reports.services.report_builder import write_report
+
+    workdir = tempfile.mkdtemp(prefix="report_bench_")
+    # On-disk database so the seeded rows don't count towards this process's RSS
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "bench.sqlite3")
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        started = time.perf_counter()
+        start_day = date(2020, 1, 1)
+        end_day = seed(args.rows, start_day)
+        print(f"seeded {args.rows} appointments in {time.perf_counter() - started:.1f}s")
+
+        report = Report(id=0, report_type="appointments", file_format=args.format,
+                        date_from=start_day, date_to=end_day)
+        path = os.path.join(workdir, f"report.{args.format}")
+
+        baseline = rss_mb()
+        samples = []
+        every = max(args.rows // 10, 1)
+
+        def on_progress(count):
+            if count % every == 0:
+                samples.append((count, rss_mb()))
+
+        started = time.perf_counter()
+        written = write_report(report, path, on_progress=on_progress)
+        elapsed = time.perf_counter() - started
+
+        print(f"baseline rss={baseline:.1f} MB")
+        for count, rss in samples:
+            print(f"  rows={count:>9}  rss={rss:7.1f} MB")
+        print(
+            f"{args.format}: {written} rows in {elapsed:.1f}s ({written / elapsed:,.0f} rows/s), "
+            f"file={os.path.getsize(path) / 1024 / 1024:.1f} MB, peak rss={peak_rss_mb():.1f} MB"
+        )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        for name in os.listdir(workdir):
+            os.unlink(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
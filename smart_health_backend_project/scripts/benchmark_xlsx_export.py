@@ -0,0 +1,89 @@
+"""
+Memory benchmark: in-memory vs write-only XLSX export.
+
+Builds synthetic appointment-like rows and exports them with
+reports.utils.export_utils.export_to_xlsx (fed a list of dicts, returns the
+file as bytes; the workbook itself is write-only) and with write_xlsx_rows
+(write-only workbook fed from a generator, written to a temporary file). Each run happens in a fresh child
+process so the reported peak RSS belongs to that engine alone.
+
+Usage:
+    python scripts/benchmark_xlsx_export.py --rows 10000 100000 500000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH so settings can be imported
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+HEADERS = ["ID", "Date", "Time", "Status", "Doctor", "Specialization", "Patient", "Booked At"]
+STATUSES = ["pending", "approved", "cancelled", "completed"]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def generate_rows(count):
+    start = date(2024, 1, 1)
+    booked = datetime(2023, 12, 1, 8, 30)
+    for i in range(count):
+        yield (
+            i + 1, start + timedelta(days=i // 1000), f"{9 + i % 8:02d}:00", STATUSES[i % 4],
+            f"doctor_{i % 1000}", "General Medicine", f"patient_{i % 5000}", booked,
+        )
+
+
+def run_engine(engine, rows):
+    from reports.utils.export_utils import export_to_xlsx, write_xlsx_rows
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if engine == "in-memory":
+        data = [dict(zip(HEADERS, row)) for row in generate_rows(rows)]
+        size = len(export_to_xlsx(data, HEADERS))
+    else:
+        with tempfile.TemporaryFile() as fh:
+            write_xlsx_rows(fh, HEADERS, generate_rows(rows))
+            size = fh.tell()
+    elapsed = time.perf_counter() - started
+    print(f"{engine},{rows},{elapsed:.2f},{baseline:.1f},{peak_rss_mb():.1f},{size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--engine", choices=["in-memory", "write-only"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        run_engine(args.engine, args.rows[0])
+        return
+
+    print(f"{'engine':<11} {'rows':>9} {'seconds':>8} {'rows/s':>9} {'peak rss':>10} {'growth':>9} {'file':>9}")
+    for rows in args.rows:
+        for engine in ("in-memory", "write-only"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--engine", engine, "--rows", str(rows)],
+                capture_output=True, text=True, check=True, env={**os.environ, "PYTHONPATH": str(ROOT)},
+            ).stdout.strip().splitlines()[-1]
+            _, _, elapsed, baseline, peak, size = out.split(",")
+            elapsed, baseline, peak = float(elapsed), float(baseline), float(peak)
+            print(
+                f"{engine:<11} {rows:>9} {elapsed:>8.1f} {rows / elapsed:>9,.0f} "
+                f"{peak:>7.1f} MB {peak - baseline:>6.1f} MB {int(size) / 1024 / 1024:>6.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
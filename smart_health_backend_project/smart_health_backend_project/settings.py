@@ -3,6 +3,7 @@ from pathlib import Path
 import os
 from datetime import timedelta
 import logging
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # --------------------------------------------------
@@ -111,6 +112,22 @@ if "test" in sys.argv:
     CELERY_TASK_ALWAYS_EAGER = True
     CELERY_TASK_EAGER_PROPAGATES = True
 
+# --------------------------------------------------
+# CACHE
+# --------------------------------------------------
+# Shared by every web and Celery process (analytics snapshots, AI prompt
+# cache, throttling). Without CACHE_URL each process keeps its own
+# local-memory cache, which writes in other processes cannot invalidate.
+# CACHE_URL is a redis:// URL (uses the redis package from requirements.txt).
+CACHE_URL = os.getenv("CACHE_URL", "")
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+
 # --------------------------------------------------
 # AUTH
 # --------------------------------------------------
@@ -216,6 +233,53 @@ TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 # --------------------------------------------------
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# Optional override for the API endpoint (regional proxy, local stub server, ...)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+
+# Prompt -> response cache (in-process LRU, optionally mirrored to a Django cache alias)
+GEMINI_CACHE_ENABLED = os.getenv("GEMINI_CACHE_ENABLED", "True").lower() in ("true", "1", "yes")
+GEMINI_CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", "3600"))
+GEMINI_CACHE_MAX_SIZE = int(os.getenv("GEMINI_CACHE_MAX_SIZE", "1024"))
+GEMINI_CACHE_BACKEND = os.getenv("GEMINI_CACHE_BACKEND") or None
+
+# Pooled HTTP client shared by all Gemini calls in a process (seconds for timeouts)
+GEMINI_HTTP_POOL_SIZE = int(os.getenv("GEMINI_HTTP_POOL_SIZE", "10"))
+GEMINI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_HTTP_KEEPALIVE_EXPIRY", "30"))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "60"))
+
+# Single-flight: concurrent identical prompts share one upstream call.
+# The distributed mode coordinates workers through a Django cache lock.
+GEMINI_SINGLEFLIGHT_ENABLED = os.getenv("GEMINI_SINGLEFLIGHT_ENABLED", "True").lower() in ("true", "1", "yes")
+GEMINI_SINGLEFLIGHT_DISTRIBUTED = os.getenv("GEMINI_SINGLEFLIGHT_DISTRIBUTED", "False").lower() in ("true", "1", "yes")
+GEMINI_SINGLEFLIGHT_BACKEND = os.getenv("GEMINI_SINGLEFLIGHT_BACKEND", "default")
+GEMINI_SINGLEFLIGHT_LOCK_TIMEOUT = int(os.getenv("GEMINI_SINGLEFLIGHT_LOCK_TIMEOUT", "60"))
+
+# Failure policy: overall deadline per call (seconds), bounded retries with
+# jittered backoff, a retry budget (ratio of traffic) and a circuit breaker
+GEMINI_CALL_DEADLINE = float(os.getenv("GEMINI_CALL_DEADLINE", "30"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BUDGET_RATIO = float(os.getenv("GEMINI_RETRY_BUDGET_RATIO", "0.2"))
+GEMINI_RETRY_BUDGET_MAX = float(os.getenv("GEMINI_RETRY_BUDGET_MAX", "10"))
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("GEMINI_BREAKER_FAILURE_THRESHOLD", "5"))
+GEMINI_BREAKER_RECOVERY_TIMEOUT = float(os.getenv("GEMINI_BREAKER_RECOVERY_TIMEOUT", "30"))
+GEMINI_BREAKER_HALF_OPEN_CALLS = int(os.getenv("GEMINI_BREAKER_HALF_OPEN_CALLS", "1"))
+
+# Batch summaries: items per request, items packed into one prompt, parallel upstream calls
+AI_BATCH_MAX_ITEMS = int(os.getenv("AI_BATCH_MAX_ITEMS", "50"))
+AI_BATCH_PACK_SIZE = int(os.getenv("AI_BATCH_PACK_SIZE", "5"))
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "4"))
+
+# Doctors sent to the model per recommendation prompt
+AI_DOCTOR_CANDIDATES_TOP_K = int(os.getenv("AI_DOCTOR_CANDIDATES_TOP_K", "10"))
+
+# Local symptom index answers clear-cut cases before calling Gemini
+AI_LOCAL_TRIAGE_ENABLED = os.getenv("AI_LOCAL_TRIAGE_ENABLED", "True").lower() in ("true", "1", "yes")
+AI_LOCAL_TRIAGE_MIN_SCORE = float(os.getenv("AI_LOCAL_TRIAGE_MIN_SCORE", "3"))
+AI_LOCAL_TRIAGE_MIN_SHARE = float(os.getenv("AI_LOCAL_TRIAGE_MIN_SHARE", "0.6"))
+
+# AI jobs (prompts and results hold patient data) are deleted after this many days
+AI_JOB_RETENTION_DAYS = int(os.getenv("AI_JOB_RETENTION_DAYS", "7"))
 
 if not GEMINI_API_KEY:
     logging.warning("GEMINI_API_KEY is not set. AI features will not work.")
@@ -230,6 +294,81 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
+# --------------------------------------------------
+# ANALYTICS CACHE
+# --------------------------------------------------
+# Closed periods are cached until a write touches them; windows including today expire after the TTL
+ANALYTICS_CACHE_ENABLED = os.getenv("ANALYTICS_CACHE_ENABLED", "True").lower() in ("true", "1", "yes")
+ANALYTICS_CACHE_BACKEND = os.getenv("ANALYTICS_CACHE_BACKEND", "default")
+ANALYTICS_CACHE_TODAY_TTL = int(os.getenv("ANALYTICS_CACHE_TODAY_TTL", "30"))
+# Closed periods on a process-local cache backend expire after this many
+# seconds, since invalidations from other processes never reach them
+ANALYTICS_CACHE_LOCAL_TTL = int(os.getenv("ANALYTICS_CACHE_LOCAL_TTL", "300"))
+
+# --------------------------------------------------
+# REPORTS
+# --------------------------------------------------
+# Rows fetched per database round-trip while streaming report rows
+REPORT_ITERATOR_CHUNK_SIZE = int(os.getenv("REPORT_ITERATOR_CHUNK_SIZE", "2000"))
+
+# Requests for a closed period that is already ready or in flight reuse that report
+REPORT_DEDUP_ENABLED = os.getenv("REPORT_DEDUP_ENABLED", "True").lower() in ("true", "1", "yes")
+# Unfinished reports older than this (seconds) are assumed lost and not reused
+REPORT_DEDUP_INFLIGHT_TIMEOUT = int(os.getenv("REPORT_DEDUP_INFLIGHT_TIMEOUT", "3600"))
+
+# CSV/XLSX reports spanning at least this many days are split into partitions
+# ("month" or "week") that are generated by parallel tasks and then merged
+REPORT_PARTITION_MIN_DAYS = int(os.getenv("REPORT_PARTITION_MIN_DAYS", "62"))
+REPORT_PARTITION_UNIT = os.getenv("REPORT_PARTITION_UNIT", "month")
+
+# Shorter CSV/XLSX reports are stitched from stored per-day chunks; only days
+# that are missing, were touched by a write, or are not over yet are queried
+REPORT_INCREMENTAL_ENABLED = os.getenv("REPORT_INCREMENTAL_ENABLED", "True").lower() in ("true", "1", "yes")
+# Stored day chunks older than this (seconds) are recomputed, which bounds how
+# long changes to related rows (e.g. a renamed doctor) go unnoticed
+REPORT_DAY_CHUNK_MAX_AGE = int(os.getenv("REPORT_DAY_CHUNK_MAX_AGE", str(24 * 3600)))
+
+# Long-poll status endpoint: longest wait a client may ask for, and how often
+# the report row is re-read meanwhile (seconds)
+REPORT_WAIT_MAX_TIMEOUT = int(os.getenv("REPORT_WAIT_MAX_TIMEOUT", "30"))
+REPORT_WAIT_POLL_INTERVAL = float(os.getenv("REPORT_WAIT_POLL_INTERVAL", "1.0"))
+
+# Report emails attach files up to this size; larger reports get a signed
+# download link that expires after REPORT_LINK_MAX_AGE seconds
+REPORT_EMAIL_ATTACHMENT_MAX_BYTES = int(os.getenv("REPORT_EMAIL_ATTACHMENT_MAX_BYTES", str(5 * 1024 * 1024)))
+REPORT_LINK_MAX_AGE = int(os.getenv("REPORT_LINK_MAX_AGE", str(7 * 24 * 3600)))
+# Public origin the links in report emails point at
+REPORT_LINK_BASE_URL = os.getenv("REPORT_LINK_BASE_URL", "http://localhost:8000")
+
+# Who sends report downloads: "" (Django), "nginx" (X-Accel-Redirect) or "apache" (X-Sendfile)
+REPORT_DOWNLOAD_OFFLOAD = os.getenv("REPORT_DOWNLOAD_OFFLOAD", "").lower()
+# nginx `internal` location aliased to MEDIA_ROOT, used with REPORT_DOWNLOAD_OFFLOAD=nginx
+REPORT_DOWNLOAD_ACCEL_PREFIX = os.getenv("REPORT_DOWNLOAD_ACCEL_PREFIX", "/protected-media/")
+
+# Report schedules (ReportSchedule) start their reports at this local hour,
+# off-peak; retention cleanup runs half an hour later
+REPORT_SCHEDULE_HOUR = int(os.getenv("REPORT_SCHEDULE_HOUR", "2"))
+# Reports are deleted after this many days, except each schedule's latest;
+# shared files go once no remaining report uses them
+REPORT_RETENTION_DAYS = int(os.getenv("REPORT_RETENTION_DAYS", "30"))
+# Day chunks of incremental reports not refreshed for this many days are dropped
+REPORT_DAY_CHUNK_RETENTION_DAYS = int(os.getenv("REPORT_DAY_CHUNK_RETENTION_DAYS", "90"))
+
+CELERY_BEAT_SCHEDULE = {
+    "run-report-schedules": {
+        "task": "reports.tasks.run_report_schedules_task",
+        "schedule": crontab(hour=REPORT_SCHEDULE_HOUR, minute=0),
+    },
+    "cleanup-reports": {
+        "task": "reports.tasks.cleanup_reports_task",
+        "schedule": crontab(hour=REPORT_SCHEDULE_HOUR, minute=30),
+    },
+    "purge-ai-jobs": {
+        "task": "ai.tasks.purge_ai_jobs_task",
+        "schedule": crontab(hour=REPORT_SCHEDULE_HOUR, minute=45),
+    },
+}
+
 # --------------------------------------------------
 # LOGGING (ENHANCED FOR DEBUGGING)
 # --------------------------------------------------
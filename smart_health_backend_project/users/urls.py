@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import RegisterView, LoginView, PasswordResetView, PasswordResetConfirmView
+from .views import RegisterView, LoginView, PasswordResetView, PasswordResetConfirmView, AdminUserStatsView
 
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register"),
@@ -8,6 +8,7 @@ urlpatterns = [
     path("password-reset/", PasswordResetView.as_view(), name="password_reset"),
     path("password-reset-confirm/", PasswordResetConfirmView.as_view(), name="password_reset_confirm"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("admin/users/stats/", AdminUserStatsView.as_view(), name="admin_user_stats"),
 ]
 
 
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db.models import Q
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from .serializers import (
     RegisterSerializer,
@@ -12,6 +13,7 @@ from .serializers import (
     PasswordResetConfirmSerializer,
     UserSerializer,
 )
+from common.aggregation_utils import conditional_counts
 from .models import User
 
 # Registration
@@ -102,12 +104,12 @@ class AdminUserStatsView(APIView):
     def get(self, request):
         if request.user.role != "admin":
             return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-        return Response({
-            "total_users": User.objects.count(),
-            "patients": User.objects.filter(role="patient").count(),
-            "doctors": User.objects.filter(role="doctor").count(),
-            "admins": User.objects.filter(role="admin").count(),
-        })
+        return Response(conditional_counts(User.objects.all(), {
+            "total_users": None,
+            "patients": Q(role="patient"),
+            "doctors": Q(role="doctor"),
+            "admins": Q(role="admin"),
+        }))
 
 
 